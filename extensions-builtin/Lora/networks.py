@@ -3,6 +3,7 @@ import gradio as gr
 import logging
 import os
 import re
+import time
 
 import lora_patches
 import functools
@@ -11,7 +12,7 @@ import network
 import torch
 from typing import Union
 
-from modules import shared, sd_models, errors, scripts
+from modules import shared, sd_models, errors, scripts, metrics
 from ldm_patched.modules.utils import load_torch_file
 from ldm_patched.modules.sd import load_lora_for_models
 
@@ -21,6 +22,9 @@ def load_lora_state_dict(filename):
     return load_torch_file(filename, safe_load=True)
 
 
+metrics.track_lru_cache("lora_state_dict", load_lora_state_dict)
+
+
 def convert_diffusers_name_to_compvis(key, is_sd2):
     pass
 
@@ -89,8 +93,12 @@ def load_networks(names, te_multipliers=None, unet_multipliers=None, dyn_dims=No
     compiled_lora_targets_hash = str(compiled_lora_targets)
 
     if current_sd.current_lora_hash == compiled_lora_targets_hash:
+        metrics.cache_hit("lora")
         return
 
+    metrics.cache_hit("lora", False)
+    lora_patch_start = time.perf_counter()
+
     current_sd.current_lora_hash = compiled_lora_targets_hash
     current_sd.forge_objects.unet = current_sd.forge_objects_original.unet
     current_sd.forge_objects.clip = current_sd.forge_objects_original.clip
@@ -102,6 +110,7 @@ def load_networks(names, te_multipliers=None, unet_multipliers=None, dyn_dims=No
             filename=filename)
 
     current_sd.forge_objects_after_applying_lora = current_sd.forge_objects.shallow_copy()
+    metrics.observe("lora_patch", time.perf_counter() - lora_patch_start)
     return
 
 
@@ -4,6 +4,7 @@ import PIL.Image
 
 import modules.upscaler
 from modules import devices, errors, modelloader, script_callbacks, shared, upscaler_utils
+from modules_forge import upscaler_pool
 
 
 class UpscalerScuNET(modules.upscaler.Upscaler):
@@ -61,7 +62,7 @@ class UpscalerScuNET(modules.upscaler.Upscaler):
             filename = modelloader.load_file_from_url(self.model_url, model_dir=self.model_download_path, file_name=f"{self.name}.pth")
         else:
             filename = path
-        return modelloader.load_spandrel_model(filename, device=device, expected_architecture='SCUNet')
+        return upscaler_pool.load_model(filename, device=device, expected_architecture='SCUNet')
 
 
 def on_ui_settings():
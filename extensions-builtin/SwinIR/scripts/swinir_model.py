@@ -6,6 +6,7 @@ from PIL import Image
 
 from modules import devices, modelloader, script_callbacks, shared, upscaler_utils
 from modules.upscaler import Upscaler, UpscalerData
+from modules_forge import upscaler_pool
 from modules_forge.forge_util import prepare_free_memory
 
 SWINIR_MODEL_URL = "https://github.com/JingyunLiang/SwinIR/releases/download/v0.0/003_realSR_BSRGAN_DFOWMFC_s64w8_SwinIR-L_x4_GAN.pth"
@@ -15,8 +16,6 @@ logger = logging.getLogger(__name__)
 
 class UpscalerSwinIR(Upscaler):
     def __init__(self, dirname):
-        self._cached_model = None           # keep the model when SWIN_torch_compile is on to prevent re-compile every runs
-        self._cached_model_config = None    # to clear '_cached_model' when changing model (v1/v2) or settings
         self.name = "SwinIR"
         self.model_url = SWINIR_MODEL_URL
         self.model_name = "SwinIR 4x"
@@ -36,18 +35,12 @@ class UpscalerSwinIR(Upscaler):
     def do_upscale(self, img: Image.Image, model_file: str) -> Image.Image:
         prepare_free_memory()
 
-        current_config = (model_file, shared.opts.SWIN_tile)
-
-        if self._cached_model_config == current_config:
-            model = self._cached_model
-        else:
-            try:
-                model = self.load_model(model_file)
-            except Exception as e:
-                print(f"Failed loading SwinIR model {model_file}: {e}", file=sys.stderr)
-                return img
-            self._cached_model = model
-            self._cached_model_config = current_config
+        # the upscaler pool keeps the model, compiled or not, so it is not re-compiled on every run
+        try:
+            model = self.load_model(model_file)
+        except Exception as e:
+            print(f"Failed loading SwinIR model {model_file}: {e}", file=sys.stderr)
+            return img
 
         img = upscaler_utils.upscale_2(
             img,
@@ -70,18 +63,23 @@ class UpscalerSwinIR(Upscaler):
         else:
             filename = path
 
-        model_descriptor = modelloader.load_spandrel_model(
+        torch_compile = getattr(shared.opts, 'SWIN_torch_compile', False)
+
+        def compile_model(model_descriptor):
+            if torch_compile:
+                try:
+                    model_descriptor.model.compile()
+                except Exception:
+                    logger.warning("Failed to compile SwinIR model, fallback to JIT", exc_info=True)
+
+        return upscaler_pool.load_model(
             filename,
             device=self._get_device(),
+            on_load=compile_model,
+            variant=torch_compile,
             prefer_half=(devices.dtype == torch.float16),
             expected_architecture="SwinIR",
         )
-        if getattr(shared.opts, 'SWIN_torch_compile', False):
-            try:
-                model_descriptor.model.compile()
-            except Exception:
-                logger.warning("Failed to compile SwinIR model, fallback to JIT", exc_info=True)
-        return model_descriptor
 
     def _get_device(self):
         return devices.get_device_for('swinir')
@@ -117,4 +117,7 @@ for name, data in legacy_preprocessors.items():
     # Invert should not match any particular model.
     if "invert" in name:
         p.model_filename_filters = []
+    # Shuffle is random (seeded per generation), so its output cannot be reused.
+    if "shuffle" in name:
+        p.cache_outputs = False
     add_supported_preprocessor(p)
@@ -28,6 +28,7 @@ class PreprocessorMarigold(Preprocessor):
         self.do_not_need_model = False
         self.sorting_priority = 100  # higher goes to top in the list
         self.diffusers_patcher = None
+        self.cache_outputs = False  # sampled from noise, depends on the seed
 
     def load_model(self):
         if self.model_patcher is not None:
@@ -2,6 +2,8 @@ import torch
 
 from modules_forge.supported_preprocessor import Preprocessor, PreprocessorParameter
 from modules_forge.shared import add_supported_preprocessor
+from modules_forge import embedding_cache
+from modules import sd_vae
 from ldm_patched.modules.samplers import sampling_function
 import ldm_patched.ldm.modules.attention as attention
 
@@ -60,7 +62,9 @@ class PreprocessorReference(Preprocessor):
         vae = process.sd_model.forge_objects.vae
         # This is a powerful VAE with integrated memory management, bf16, and tiled fallback.
 
-        latent_image = vae.encode(cond.movedim(1, -1))
+        # keyed on the checkpoint and external VAE, so re-using the same reference image skips the VAE encode
+        encoder = f"vae-{process.sd_model.sd_checkpoint_info.filename}-{sd_vae.loaded_vae_file}"
+        latent_image = embedding_cache.cached(encoder, ('reference_latent',), cond, lambda: vae.encode(cond.movedim(1, -1)))
         latent_image = process.sd_model.forge_objects.unet.model.latent_format.process_in(latent_image)
 
         gen_seed = process.seeds[0] + 1
@@ -1,5 +1,10 @@
 import torch
 import torch.nn.functional as F
+from ldm_patched.modules.samplers import set_fused_variant
+
+def signed_sqrt_(t: torch.Tensor) -> torch.Tensor:
+    """sqrt(|t|) * sign(t), written into t"""
+    return torch.copysign(t.abs().sqrt_(), t, out=t)
 
 class Mahiro:
     @classmethod
@@ -29,7 +34,20 @@ class Mahiro:
             simsc = 2 * (sim+1)
             wm = (simsc*cfg + (4-simsc)*leap) / 4
             return wm
-        m.set_model_sampler_post_cfg_function(mahiro_normd)
+        def mahiro_normd_fused(args):
+            scale: float = args['cond_scale']
+            cond_p: torch.Tensor = args['cond_denoised']
+            cfg: torch.Tensor = args["denoised"]
+            # cosine similarity ignores positive factors: sqrt(scale) on the uncond leap (only its sign stays) and 1/sqrt(2) on the merge
+            normu = signed_sqrt_(args['uncond_denoised'].clone())
+            normm = signed_sqrt_(torch.add(cfg, cond_p, alpha=scale))
+            sim = F.cosine_similarity(normu, normm).mean()
+            if scale <= 0:
+                sim = -sim if scale < 0 else torch.zeros_like(sim)
+            del normu, normm
+            simsc = 2 * (sim+1)
+            return cfg.mul_(simsc / 4).addcmul_(cond_p, (4-simsc) * (scale / 4))
+        m.set_model_sampler_post_cfg_function(set_fused_variant(mahiro_normd, mahiro_normd_fused))
         return (m, )
 
 NODE_CLASS_MAPPINGS = {
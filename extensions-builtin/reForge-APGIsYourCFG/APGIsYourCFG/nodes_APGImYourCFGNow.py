@@ -1,4 +1,5 @@
 from ldm_patched.modules.model_patcher import ModelPatcher
+from ldm_patched.modules.samplers import set_fused_variant
 import torch
 
 
@@ -11,6 +12,13 @@ class MomentumBuffer:
         new_average = self.momentum * self.running_average
         self.running_average = update_value + new_average
 
+    def update_(self, update_value: torch.Tensor):
+        """update, reusing the running average's memory once there is one"""
+        if torch.is_tensor(self.running_average) and self.running_average.shape == update_value.shape:
+            self.running_average.mul_(self.momentum).add_(update_value)
+        else:
+            self.update(update_value)
+
 
 def project(
     v0: torch.Tensor,
@@ -48,6 +56,37 @@ def normalized_guidance(
     return pred_guided
 
 
+def normalized_guidance_denoised(
+    x: torch.Tensor,
+    cond_denoised: torch.Tensor,
+    uncond_denoised: torch.Tensor,
+    guidance_scale: float,
+    momentum_buffer: MomentumBuffer = None,
+    eta: float = 1.0,
+    norm_threshold: float = 0.0,
+):
+    """
+    normalized_guidance taking and returning denoised predictions instead of x - denoised, with the temporaries
+    written in place. The momentum average is kept the same way, so both can share a MomentumBuffer.
+    """
+    # (x - cond) - (x - uncond)
+    diff = uncond_denoised - cond_denoised
+    if momentum_buffer is not None:
+        momentum_buffer.update_(diff)
+        diff = momentum_buffer.running_average
+    if norm_threshold > 0:
+        diff_norm = diff.norm(p=2, dim=[-1, -2, -3], keepdim=True)
+        diff = diff * torch.clamp(norm_threshold / diff_norm, max=1.0)
+
+    v1 = torch.sub(x, cond_denoised)
+    v1 /= v1.norm(p=2, dim=[-1, -2, -3], keepdim=True).clamp_min(1e-12)
+    parallel = (diff * v1).sum(dim=[-1, -2, -3], keepdim=True)
+
+    # x - (pred_cond + (guidance_scale - 1) * (diff - parallel * v1 + eta * parallel * v1))
+    pred_guided = torch.add(cond_denoised, diff, alpha=1 - guidance_scale)
+    return pred_guided.addcmul_(v1, parallel * ((1 - guidance_scale) * (eta - 1)))
+
+
 class APG_ImYourCFGNow:
     @classmethod
     def INPUT_TYPES(s):
@@ -127,20 +166,16 @@ class APG_ImYourCFGNow:
         momentum_buffer = MomentumBuffer(momentum)
         extras = [momentum_buffer, momentum, adaptive_momentum]
 
-        def apg_function(args):
-            cond = args["cond"]
-            uncond = args["uncond"]
-            sigma = args["sigma"]
-            model = args["model"]
-            cond_scale = args["cond_scale"]
-
+        def limited(sigma):
             if guidance_limiter:
                 if (guidance_sigma_start >= 0 and sigma[0] >  guidance_sigma_start) or \
                    (guidance_sigma_end   >= 0 and sigma[0] <= guidance_sigma_end):
                     if print_data:
                         print(f" guidance limiter active (sigma: {sigma[0]})")
-                    return uncond + (cond - uncond)
+                    return True
+            return False
 
+        def current_momentum_buffer(sigma, model, cond):
             momentum_buffer = extras[0]
             momentum = extras[1]
             adaptive_momentum = extras[2]
@@ -170,12 +205,38 @@ class APG_ImYourCFGNow:
             if print_data:
                 print(" momentum: ", momentum_buffer.momentum, " t: ", t)
 
+            return momentum_buffer
+
+        def apg_function(args):
+            cond = args["cond"]
+            uncond = args["uncond"]
+            sigma = args["sigma"]
+            cond_scale = args["cond_scale"]
+
+            if limited(sigma):
+                return uncond + (cond - uncond)
+
+            momentum_buffer = current_momentum_buffer(sigma, args["model"], cond)
+
             return normalized_guidance(
                 cond, uncond, cond_scale, momentum_buffer, eta, norm_threshold
             )
 
+        def apg_function_fused(args):
+            cond_denoised = args["cond_denoised"]
+            sigma = args["sigma"]
+
+            if limited(sigma):
+                return cond_denoised
+
+            momentum_buffer = current_momentum_buffer(sigma, args["model"], cond_denoised)
+
+            return normalized_guidance_denoised(
+                args["input"], cond_denoised, args["uncond_denoised"], args["cond_scale"], momentum_buffer, eta, norm_threshold
+            )
+
         m = model.clone()
-        m.set_model_sampler_cfg_function(apg_function, extras==extras)
+        m.set_model_sampler_cfg_function(set_fused_variant(apg_function, apg_function_fused), extras==extras)
         m.model_options["disable_cfg1_optimization"] = False
 
         return (m,)
@@ -1,5 +1,6 @@
 import ldm_patched.modules.model_base
 import torch
+from ldm_patched.modules.samplers import set_fused_variant
 
 class AltRescaleCFG:
     @classmethod
@@ -36,8 +37,26 @@ class AltRescaleCFG:
 
             return x_orig - (x - x_final * sigma / (sigma * sigma + 1.0) ** 0.5)
 
+        def rescale_cfg_fused(args):
+            # the same on the denoised predictions: the v-pred outputs above are (x - denoised) * sqrt(sigma^2 + 1) / sigma,
+            # and that factor cancels out of the std ratio and the final conversion back
+            cond_denoised = args["cond_denoised"]
+            sigma = args["sigma"]
+            sigma = sigma.view(sigma.shape[:1] + (1,) * (cond_denoised.ndim - 1))
+            x = args["input"] / (sigma * sigma + 1.0)
+
+            x_cfg = torch.lerp(args["uncond_denoised"], cond_denoised, args["cond_scale"])
+            diff = torch.sub(cond_denoised, x)
+            ro_pos = torch.std(diff, dim=(1,2,3), keepdim=True)
+            ro_cfg = torch.std(torch.sub(x_cfg, x, out=diff), dim=(1,2,3), keepdim=True)
+
+            ratio = ro_pos / ro_cfg
+            weight = multiplier * (1 - ratio ** 2)
+            factor = weight * ratio + (1.0 - weight)
+            return torch.addcmul(x, diff, factor, out=x_cfg)
+
         m = model.clone()
-        m.set_model_sampler_cfg_function(rescale_cfg)
+        m.set_model_sampler_cfg_function(set_fused_variant(rescale_cfg, rescale_cfg_fused))
         return (m, )
 
 NODE_CLASS_MAPPINGS = {
@@ -196,7 +196,8 @@ class ControlNetUnit:
 
     ## If the new field needs to appear in infotext, you need to
     - Add a new item in `ControlNetUnit.infotext_fields`.
-    API-only fields cannot appear in infotext.
+    API-only fields cannot be pasted from infotext. They can still be reported
+    in infotext by adding them to `ControlNetUnit.api_infotext_fields`.
     """
     # Following fields should only be used in the UI.
     # ====== Start of UI only fields ======
@@ -271,6 +272,12 @@ class ControlNetUnit:
     # ====== Start of API only fields ======
     # Whether to save the detected map for this unit; defaults to True.
     save_detected_map: bool = True
+    # Recompute control residuals only every N steps and reuse them in between;
+    # defaults to 1 (compute every step). Only applies to ControlNet models.
+    residual_cache_interval: int = 1
+    # Recompute earlier when sigma changed by more than this fraction since the
+    # residuals were computed; defaults to 0.0 (only the interval is used).
+    residual_cache_sigma_threshold: float = 0.0
     # ====== End of API only fields ======
 
     @staticmethod
@@ -295,6 +302,14 @@ class ControlNetUnit:
             "hr_option",
         )
 
+    @staticmethod
+    def api_infotext_fields():
+        """API-only fields written to infotext when they differ from the default."""
+        return (
+            "residual_cache_interval",
+            "residual_cache_sigma_threshold",
+        )
+
     @staticmethod
     def from_dict(d: Dict) -> "ControlNetUnit":
         """Create ControlNetUnit from dict. This is primarily used to convert
@@ -35,6 +35,11 @@ def serialize_unit(unit: external_code.ControlNetUnit) -> str:
         if getattr(unit, field) != -1
         # Note: exclude hidden slider values.
     }
+    log_value.update({
+        field_to_displaytext(field): getattr(unit, field)
+        for field in external_code.ControlNetUnit.api_infotext_fields()
+        if getattr(unit, field) != getattr(external_code.ControlNetUnit, field)
+    })
     if not all("," not in str(v) and ":" not in str(v) for v in log_value.values()):
         logger.error(f"Unexpected tokens encountered:\n{log_value}")
         return ""
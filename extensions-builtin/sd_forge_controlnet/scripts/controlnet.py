@@ -5,7 +5,7 @@ import cv2
 import torch
 
 import modules.scripts as scripts
-from modules import shared, script_callbacks, masking, images
+from modules import shared, script_callbacks, masking, images, metrics
 from modules.ui_components import InputAccordion
 from modules.api.api import decode_base64_to_image
 import gradio as gr
@@ -37,6 +37,7 @@ import functools
 from PIL import Image
 from modules_forge.shared import try_load_supported_control_model
 from modules_forge.supported_controlnet import ControlModelPatcher
+from modules_forge import content_cache
 
 # Gradio 3.32 bug fix
 import tempfile
@@ -52,6 +53,21 @@ def cached_controlnet_loader(filename):
     return try_load_supported_control_model(filename)
 
 
+metrics.track_lru_cache("controlnet_model", cached_controlnet_loader)
+
+
+# Preprocessor outputs keyed on (input image, mask, preprocessor, resolution, sliders); shared by all
+# API requests and batch items, so re-submitting the same control image with new seeds skips preprocessing.
+preprocessor_cache = content_cache.ContentCache("controlnet_preprocessor")
+
+
+def configure_preprocessor_cache():
+    preprocessor_cache.configure(
+        max_bytes=shared.opts.data.get("control_net_preprocessor_cache_size", 512) * 1024 * 1024,
+        disk=shared.opts.data.get("control_net_preprocessor_cache_disk", False),
+    )
+
+
 class ControlNetCachedParameters:
     def __init__(self):
         self.preprocessor = None
@@ -333,13 +349,27 @@ class ControlNetForForgeOfficial(scripts.Script):
             logger.info(f"Using preprocessor: {unit.module}")
             logger.info(f'preprocessor resolution = {unit.processor_res}')
 
-            preprocessor_output = preprocessor(
-                input_image=input_image,
-                input_mask=input_mask,
-                resolution=unit.processor_res,
-                slider_1=unit.threshold_a,
-                slider_2=unit.threshold_b,
-            )
+            cache_key = None
+            if preprocessor.cache_outputs and shared.opts.data.get("control_net_preprocessor_cache_size", 512) > 0:
+                cache_key = content_cache.content_hash(
+                    input_image, input_mask, unit.module, unit.processor_res, unit.threshold_a, unit.threshold_b)
+
+            preprocessor_output = preprocessor_cache.get(cache_key)
+            if preprocessor_output is not None:
+                logger.info(f"Using cached preprocessor output: {unit.module}")
+                preprocessor_output = preprocessor_output.copy()
+            else:
+                preprocessor_output = preprocessor(
+                    input_image=input_image,
+                    input_mask=input_mask,
+                    resolution=unit.processor_res,
+                    slider_1=unit.threshold_a,
+                    slider_2=unit.threshold_b,
+                )
+
+                if isinstance(preprocessor_output, np.ndarray):
+                    configure_preprocessor_cache()
+                    preprocessor_cache.put(cache_key, preprocessor_output.copy())
 
             preprocessor_outputs.append(preprocessor_output)
 
@@ -478,6 +508,8 @@ class ControlNetForForgeOfficial(scripts.Script):
         params.model.advanced_frame_weighting = None
         params.model.advanced_sigma_weighting = None
         params.model.target_blocks = unit.ipa_block_weight
+        params.model.residual_cache_interval = int(unit.residual_cache_interval)
+        params.model.residual_cache_sigma_threshold = float(unit.residual_cache_sigma_threshold)
 
         soft_weighting = {
             'input': [0.09941396206337118, 0.12050177219802567, 0.14606275417942507, 0.17704576264172736,
@@ -609,6 +641,14 @@ def on_ui_settings():
         5, "Model cache size (requires restart)", gr.Slider, {"minimum": 1, "maximum": 10, "step": 1}, section=section))
     shared.opts.add_option("control_net_ipadapter_cache_size", shared.OptionInfo(
         5, "IPAdapter cache size (requires restart)", gr.Slider, {"minimum": 1, "maximum": 10, "step": 1}, section=section))    
+    shared.opts.add_option("control_net_preprocessor_cache_size", shared.OptionInfo(
+        512, "Preprocessor output cache size in MB (0 = disable)", gr.Slider, {"minimum": 0, "maximum": 8192, "step": 64}, section=section))
+    shared.opts.add_option("control_net_preprocessor_cache_disk", shared.OptionInfo(
+        False, "Also keep preprocessor outputs in the on-disk cache", gr.Checkbox, {"interactive": True}, section=section))
+    shared.opts.add_option("control_net_embedding_cache_size", shared.OptionInfo(
+        256, "Image embedding cache size in MB (CLIP vision, InsightFace, PhotoMaker, reference; 0 = disable)", gr.Slider, {"minimum": 0, "maximum": 4096, "step": 32}, section=section))
+    shared.opts.add_option("control_net_embedding_cache_disk", shared.OptionInfo(
+        False, "Also keep image embeddings in the on-disk cache", gr.Checkbox, {"interactive": True}, section=section))
     shared.opts.add_option("control_net_no_detectmap", shared.OptionInfo(
         False, "Do not append detectmap to output", gr.Checkbox, {"interactive": True}, section=section))
     shared.opts.add_option("control_net_detectmap_autosaving", shared.OptionInfo(
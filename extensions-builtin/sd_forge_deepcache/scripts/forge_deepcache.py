@@ -0,0 +1,94 @@
+import gradio as gr
+
+from modules import scripts
+from ldm_patched.contrib.external_deepcache import DeepCachePatcher
+
+
+opDeepCachePatcher = DeepCachePatcher()
+
+
+# Interval used when the slider is left at 0, by sampler name prefix. Second order samplers call the
+# model twice per step at different sigmas, so every call already counts as a step and a smaller
+# interval keeps the same ratio of full passes.
+sampler_default_intervals = {
+    'DPM++ 2M': 3,
+    'Euler': 3,
+    'DDIM': 3,
+    'UniPC': 3,
+    'DPM++ SDE': 2,
+    'DPM++ 2S': 2,
+    'DPM2': 2,
+    'Heun': 2,
+    'LCM': 1,
+}
+
+
+def default_interval(sampler_name):
+    for prefix, interval in sampler_default_intervals.items():
+        if sampler_name is not None and sampler_name.startswith(prefix):
+            return interval
+    return 2
+
+
+class DeepCacheForForge(scripts.Script):
+    sorting_priority = 13
+
+    def __init__(self):
+        self.deep_cache = None
+
+    def title(self):
+        return "DeepCache Integrated"
+
+    def show(self, is_img2img):
+        return scripts.AlwaysVisible
+
+    def ui(self, *args, **kwargs):
+        with gr.Accordion(open=False, label=self.title()):
+            enabled = gr.Checkbox(label='Enabled', value=False)
+            interval = gr.Slider(label='Cache Interval (0 = sampler default)', value=0, minimum=0, maximum=10, step=1)
+            depth = gr.Slider(label='Cache Depth', value=0, minimum=0, maximum=10, step=1)
+            start_percent = gr.Slider(label='Start Percent', value=0.0, minimum=0.0, maximum=1.0, step=0.001)
+            end_percent = gr.Slider(label='End Percent', value=1.0, minimum=0.0, maximum=1.0, step=0.001)
+
+        return enabled, interval, depth, start_percent, end_percent
+
+    def process_before_every_sampling(self, p, *script_args, **kwargs):
+        enabled, interval, depth, start_percent, end_percent = script_args
+        interval = int(interval)
+        depth = int(depth)
+
+        if self.deep_cache is not None:
+            # the previous pass (e.g. before hires fix) is finished
+            self.deep_cache.report()
+            self.deep_cache = None
+
+        if not enabled:
+            return
+
+        if interval <= 0:
+            interval = default_interval(p.sampler_name)
+
+        if interval <= 1:
+            return
+
+        unet = p.sd_model.forge_objects.unet
+
+        unet, self.deep_cache = opDeepCachePatcher.patch(unet, interval, depth, start_percent, end_percent)
+
+        p.sd_model.forge_objects.unet = unet
+
+        p.extra_generation_params.update(dict(
+            deepcache_enabled=enabled,
+            deepcache_interval=interval,
+            deepcache_depth=self.deep_cache.depth,
+            deepcache_start_percent=start_percent,
+            deepcache_end_percent=end_percent,
+        ))
+
+        return
+
+    def postprocess_batch(self, p, *args, **kwargs):
+        if self.deep_cache is not None:
+            self.deep_cache.report()
+            self.deep_cache.reset()
+            self.deep_cache = None
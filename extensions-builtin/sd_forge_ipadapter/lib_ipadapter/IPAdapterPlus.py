@@ -21,6 +21,7 @@ import torchvision.transforms as TT
 
 from lib_ipadapter.resampler import PerceiverAttention, FeedForward, Resampler
 from modules import shared
+from modules_forge import embedding_cache
 
 from lib_controlnet.logging import logger
 
@@ -198,6 +199,41 @@ def zeroed_hidden_states(clip_vision, batch_size):
     outputs = outputs.hidden_states[-2].to(ldm_patched.modules.model_management.intermediate_device())
     return outputs
 
+def cached_zeroed_hidden_states(clip_vision, batch_size):
+    return embedding_cache.cached(clip_vision, ('zeroed_hidden_states', batch_size), None,
+                                  lambda: zeroed_hidden_states(clip_vision, batch_size))
+
+def encode_noised_image(clip_vision, image, noise):
+    # image_add_noise uses a fixed seed, so the result only depends on the image and the noise amount
+    return embedding_cache.encode_image(clip_vision, image, settings=('noise', noise),
+                                        preprocess=lambda x: image_add_noise(x, noise))
+
+def detect_faces(insightface, image, normed=True, crop_size=None):
+    insightface.det_model.input_size = (640, 640)  # reset the detection size
+    face_img = tensorToNP(image)
+    face_embed = []
+    face_clipvision = []
+
+    for i in range(face_img.shape[0]):
+        for size in [(size, size) for size in range(640, 128, -64)]:
+            insightface.det_model.input_size = size  # TODO: hacky but seems to be working
+            face = insightface.get(face_img[i])
+            if face:
+                face_embed.append(torch.from_numpy(face[0].normed_embedding if normed else face[0].embedding).unsqueeze(0))
+                if crop_size is not None:
+                    face_clipvision.append(NPToTensor(insightface_face_align.norm_crop(face_img[i], landmark=face[0].kps, image_size=crop_size)))
+
+                if 640 not in size:
+                    print(f"\033[33mINFO: InsightFace detection resolution lowered to {size}.\033[0m")
+                break
+        else:
+            raise Exception('InsightFace: No face detected.')
+
+    faces = dict(face_embed=torch.stack(face_embed, dim=0))
+    if crop_size is not None:
+        faces['image'] = torch.stack(face_clipvision, dim=0)
+    return faces
+
 def min_(tensor_list):
     # return the element-wise min of the tensor list.
     x = torch.stack(tensor_list)
@@ -634,6 +670,7 @@ class InsightFaceLoader:
 
         model = FaceAnalysis(name=name, root=INSIGHTFACE_DIR, providers=[provider + 'ExecutionProvider',])
         model.prepare(ctx_id=0, det_size=(640, 640))
+        model.cache_name = f"insightface-{name}"
 
         return (model,)
 
@@ -712,56 +749,22 @@ class IPAdapterApply:
             clip_embed_zeroed = embeds[1].cpu()
         else:
             if self.is_instant_id:
-                insightface.det_model.input_size = (640, 640)  # reset the detection size
-                face_img = tensorToNP(image)
-                face_embed = []
-
-                for i in range(face_img.shape[0]):
-                    for size in [(size, size) for size in range(640, 128, -64)]:
-                        insightface.det_model.input_size = size  # TODO: hacky but seems to be working
-                        face = insightface.get(face_img[i])
-                        if face:
-                            face_embed.append(torch.from_numpy(face[0].embedding).unsqueeze(0))
-
-                            if 640 not in size:
-                                print(f"\033[33mINFO: InsightFace detection resolution lowered to {size}.\033[0m")
-                            break
-                    else:
-                        raise Exception('InsightFace: No face detected.')
-
-                face_embed = torch.stack(face_embed, dim=0)
+                faces = embedding_cache.cached(insightface, ('faces', False, None), image,
+                                               lambda: detect_faces(insightface, image, normed=False))
+                face_embed = faces['face_embed']
                 clip_embed = face_embed
             elif self.is_faceid:
-                insightface.det_model.input_size = (640,640) # reset the detection size
-                face_img = tensorToNP(image)
-                face_embed = []
-                face_clipvision = []
-
-                for i in range(face_img.shape[0]):
-                    for size in [(size, size) for size in range(640, 128, -64)]:
-                        insightface.det_model.input_size = size # TODO: hacky but seems to be working
-                        face = insightface.get(face_img[i])
-                        if face:
-                            face_embed.append(torch.from_numpy(face[0].normed_embedding).unsqueeze(0))
-                            face_clipvision.append(NPToTensor(insightface_face_align.norm_crop(face_img[i], landmark=face[0].kps, image_size=224)))
-
-                            if 640 not in size:
-                                print(f"\033[33mINFO: InsightFace detection resolution lowered to {size}.\033[0m")
-                            break
-                    else:
-                        raise Exception('InsightFace: No face detected.')
-
-                face_embed = torch.stack(face_embed, dim=0)
-                image = torch.stack(face_clipvision, dim=0)
-
-                neg_image = image_add_noise(image, noise) if noise > 0 else None
+                faces = embedding_cache.cached(insightface, ('faces', True, 224), image,
+                                               lambda: detect_faces(insightface, image, normed=True, crop_size=224))
+                face_embed = faces['face_embed']
+                image = faces['image']
 
                 if self.is_plus:
-                    clip_embed = clip_vision.encode_image(image).penultimate_hidden_states
+                    clip_embed = embedding_cache.encode_image(clip_vision, image).penultimate_hidden_states
                     if noise > 0:
-                        clip_embed_zeroed = clip_vision.encode_image(neg_image).penultimate_hidden_states
+                        clip_embed_zeroed = encode_noised_image(clip_vision, image, noise).penultimate_hidden_states
                     else:
-                        clip_embed_zeroed = zeroed_hidden_states(clip_vision, image.shape[0])
+                        clip_embed_zeroed = cached_zeroed_hidden_states(clip_vision, image.shape[0])
                     
                     # TODO: check noise to the uncods too
                     face_embed_zeroed = torch.zeros_like(face_embed)
@@ -772,19 +775,18 @@ class IPAdapterApply:
                 if image.shape[1] != image.shape[2]:
                     print("\033[33mINFO: the IPAdapter reference image is not a square, CLIPImageProcessor will resize and crop it at the center. If the main focus of the picture is not in the middle the result might not be what you are expecting.\033[0m")
 
-                clip_embed = clip_vision.encode_image(image)
-                neg_image = image_add_noise(image, noise) if noise > 0 else None
+                clip_embed = embedding_cache.encode_image(clip_vision, image)
                 
                 if self.is_plus:
                     clip_embed = clip_embed.penultimate_hidden_states
                     if noise > 0:
-                        clip_embed_zeroed = clip_vision.encode_image(neg_image).penultimate_hidden_states
+                        clip_embed_zeroed = encode_noised_image(clip_vision, image, noise).penultimate_hidden_states
                     else:
-                        clip_embed_zeroed = zeroed_hidden_states(clip_vision, image.shape[0])
+                        clip_embed_zeroed = cached_zeroed_hidden_states(clip_vision, image.shape[0])
                 else:
                     clip_embed = clip_embed.image_embeds
                     if noise > 0:
-                        clip_embed_zeroed = clip_vision.encode_image(neg_image).image_embeds
+                        clip_embed_zeroed = encode_noised_image(clip_vision, image, noise).image_embeds
                     else:
                         clip_embed_zeroed = torch.zeros_like(clip_embed)
 
@@ -118,7 +118,10 @@ class AbstractDiffusion:
         self.tile_bs: int = None
         self.num_tiles: int = None
         self.num_batches: int = None
+        self.bboxes: List[BBox] = []
         self.batched_bboxes: List[List[BBox]] = []
+        # tile batches actually sampled, by latent batch size; see schedule_batches
+        self.batch_schedule: Dict[int, List[List[BBox]]] = {}
 
         # ext. Region Prompt Control (custom bbox)
         self.enable_custom_bbox: bool = False
@@ -134,7 +137,7 @@ class AbstractDiffusion:
         self.control_tensor_batch_dict = {}
         self.control_tensor_batch: List[List[Tensor]] = [[]]
         # self.control_params: Dict[str, Tensor] = None # {}
-        self.control_params: Dict[Tuple, List[List[Tensor]]] = {}
+        self.control_params: Dict[Tuple, Tensor] = {}    # (cond_or_uncond + x shape, param_id, batch_id) -> tiled hint
         self.control_tensor_cpu: bool = None
         self.control_tensor_custom: List[List[Tensor]] = []
 
@@ -201,6 +204,7 @@ class AbstractDiffusion:
         # weights basically indicate how many times a pixel is painted
         bboxes, weights = split_bboxes(self.w, self.h, self.tile_w, self.tile_h, overlap, self.get_tile_weights())
         self.weights += weights
+        self.bboxes = bboxes
         self.num_tiles = len(bboxes)
         self.num_batches = ceildiv(self.num_tiles , tile_bs)
         self.tile_bs = ceildiv(len(bboxes) , self.num_batches)          # optimal_batch_size
@@ -238,11 +242,96 @@ class AbstractDiffusion:
         # sampling_steps = _steps
         # self.pbar = tqdm(total=(self.total_bboxes) * sampling_steps, desc=f"{self.method} Sampling: ")
 
+    def schedule_batches(self, model_function, x_in:Tensor) -> List[List[BBox]]:
+        '''
+          Groups the grid bboxes into batches for one model call each. x_in already holds cond and uncond,
+          so every tile in a batch is sampled for both at once. Only tiles of the same size share a batch,
+          so uneven tiles never need padding. A batch holds at most tile_batch_size tiles, fewer if the
+          model would not fit into free memory with that many, and the tiles are spread evenly over the batches.
+          The schedule is computed once per latent batch size and reused for every step.
+        '''
+        N, C = x_in.shape[:2]
+        if N in self.batch_schedule:
+            return self.batch_schedule[N]
+
+        by_size: Dict[Tuple[int, int], List[BBox]] = {}
+        for bbox in self.bboxes:
+            by_size.setdefault((bbox.h, bbox.w), []).append(bbox)
+
+        model = getattr(model_function, '__self__', None)
+        free_memory = ldm_patched.modules.model_management.get_free_memory(x_in.device)
+
+        batches = []
+        for (tile_h, tile_w), bboxes in by_size.items():
+            tile_bs = max(1, min(self.tile_batch_size, len(bboxes)))
+            if hasattr(model, 'memory_required'):
+                while tile_bs > 1 and model.memory_required([tile_bs * N, C, tile_h, tile_w]) >= free_memory:
+                    tile_bs -= 1
+
+            num_batches = ceildiv(len(bboxes), tile_bs)
+            tile_bs = ceildiv(len(bboxes), num_batches)
+            batches += [bboxes[i*tile_bs:(i+1)*tile_bs] for i in range(num_batches)]
+
+        self.batch_schedule[N] = batches
+        return batches
+
+    def sample_tiles(self, model_function: BaseModel.apply_model, x_in:Tensor, t_in:Tensor, c_in:dict, cond_or_uncond:List) -> bool:
+        ''' Runs the model over all grid tiles, passing each output to accumulate_tile; False if interrupted '''
+        N = x_in.shape[0]
+
+        for batch_id, bboxes in enumerate(self.schedule_batches(model_function, x_in)):
+            if ldm_patched.modules.model_management.processing_interrupted():
+                return False
+
+            # batching & compute tiles
+            n_rep = len(bboxes)
+            x_tile = torch.cat([x_in[bbox.slicer] for bbox in bboxes], dim=0)   # [TB, C, TH, TW]
+            t_tile = self.repeat_tensor(t_in, n_rep)
+            c_tile = c_in.copy()
+            c_tile['c_crossattn'] = self.repeat_tensor(c_in['c_crossattn'], n_rep)
+            if 'time_context' in c_in:
+                c_tile['time_context'] = self.repeat_tensor(c_in['time_context'], n_rep)
+            for key in ['y', 'c_concat']:
+                if key in c_in:
+                    icond = c_in[key]
+                    if icond.shape[2:] == (self.h, self.w):
+                        c_tile[key] = torch.cat([icond[bbox.slicer] for bbox in bboxes])
+                    else:
+                        c_tile[key] = self.repeat_tensor(icond, n_rep)
+
+            # controlnet tiling
+            if 'control' in c_in:
+                self.process_controlnet(x_tile.shape, x_tile.dtype, c_in, cond_or_uncond, bboxes, N, batch_id)
+                c_tile['control'] = c_in['control_model'].get_control(x_tile, t_tile, c_tile, len(cond_or_uncond))
+
+            x_tile_out = model_function(x_tile, t_tile, **c_tile)
+
+            for i, bbox in enumerate(bboxes):
+                self.accumulate_tile(bbox, x_tile_out[i*N:(i+1)*N, :, :, :])
+            del x_tile_out, x_tile, t_tile, c_tile
+
+        return True
+
+    def accumulate_tile(self, bbox:BBox, x_tile_out:Tensor):
+        self.x_buffer[bbox.slicer] += x_tile_out
+
+    def refresh_size(self, H:int, W:int):
+        ''' ldm_patched can feed in a latent that's a different size cause of SetArea, so we refresh in that case '''
+        self.refresh = False
+        if self.weights is None or self.h != H or self.w != W:
+            self.h, self.w = H, W
+            self.refresh = True
+            self.batch_schedule.clear()
+            self.control_params.clear()
+            self.init_grid_bbox(self.tile_width, self.tile_height, self.tile_overlap, self.tile_batch_size)
+            # init everything done, perform sanity check & pre-computations
+            self.init_done()
+
     @controlnet
     def prepare_controlnet_tensors(self, refresh:bool=False, tensor=None):
         ''' Crop the control tensor into tiles and cache them '''
         if not refresh:
-            if self.control_tensor_batch is not None or self.control_params is not None: return
+            if self.control_tensor_batch is not None: return
         tensors = [tensor]
         self.org_control_tensor_batch = tensors
         self.control_tensor_batch = []
@@ -302,18 +391,12 @@ class AbstractDiffusion:
         while control is not None:
             param_id += 1
             PH, PW = self.h*8, self.w*8
-            
-            if self.control_params.get(tuple_key, None) is None:
-                self.control_params[tuple_key] = [[None]]
-                val = self.control_params[tuple_key]
-                if param_id+1 >= len(val):
-                    val.extend([[None] for _ in range(param_id+1)])
-                if len(self.batched_bboxes) >= len(val[param_id]):
-                    val[param_id].extend([[None] for _ in range(len(self.batched_bboxes))])
+            # the tiled hint of every scheduled batch is sliced once and reused for all steps
+            cache_key = (tuple_key, param_id, batch_id)
 
             # Below is taken from ldm_patched.modules.controlnet.py, but we need to additionally tile the cnets.
             # if statement: eager eval. first time when cond_hint is None. 
-            if self.refresh or control.cond_hint is None or not isinstance(self.control_params[tuple_key][param_id][batch_id], Tensor):
+            if self.refresh or control.cond_hint is None or cache_key not in self.control_params:
                 dtype = getattr(control, 'manual_cast_dtype', None)
                 if dtype is None: dtype = getattr(getattr(control, 'control_model', None), 'dtype', None)
                 if dtype is None: dtype = x_dtype
@@ -345,9 +428,9 @@ class AbstractDiffusion:
                     cond_hint_pre_tile = self.repeat_tensor(control.cond_hint, ceildiv(batch_size, control.cond_hint.shape[0]))[:batch_size]
                 cns = [cond_hint_pre_tile[:, :, bbox[1]*opt_f:bbox[3]*opt_f, bbox[0]*opt_f:bbox[2]*opt_f] for bbox in bboxes]
                 control.cond_hint = torch.cat(cns, dim=0)
-                self.control_params[tuple_key][param_id][batch_id]=control.cond_hint
+                self.control_params[cache_key] = control.cond_hint
             else:
-                control.cond_hint = self.control_params[tuple_key][param_id][batch_id]
+                control.cond_hint = self.control_params[cache_key]
             control = control.previous_controlnet
 
 import numpy as np
@@ -376,63 +459,17 @@ class MultiDiffusion(AbstractDiffusion):
         t_in: Tensor = args["timestep"]
         c_in: dict = args["c"]
         cond_or_uncond: List = args["cond_or_uncond"]
-        c_crossattn: Tensor = c_in['c_crossattn']
 
         N, C, H, W = x_in.shape
 
-        # ldm_patched.modulesui can feed in a latent that's a different size cause of SetArea, so we'll refresh in that case.
-        self.refresh = False
-        if self.weights is None or self.h != H or self.w != W:
-            self.h, self.w = H, W
-            self.refresh = True
-            self.init_grid_bbox(self.tile_width, self.tile_height, self.tile_overlap, self.tile_batch_size)
-            # init everything done, perform sanity check & pre-computations
-            self.init_done()
-        self.h, self.w = H, W
+        self.refresh_size(H, W)
         # clear buffer canvas
         self.reset_buffer(x_in)
 
         # Background sampling (grid bbox)
         if self.draw_background:
-            for batch_id, bboxes in enumerate(self.batched_bboxes):
-                if ldm_patched.modules.model_management.processing_interrupted(): 
-                    # self.pbar.close()
-                    return x_in
-
-                # batching & compute tiles
-                x_tile = torch.cat([x_in[bbox.slicer] for bbox in bboxes], dim=0)   # [TB, C, TH, TW]
-                n_rep = len(bboxes)
-                ts_tile = self.repeat_tensor(t_in, n_rep)
-                cond_tile = self.repeat_tensor(c_crossattn, n_rep)
-                c_tile = c_in.copy()
-                c_tile['c_crossattn'] = cond_tile
-                if 'time_context' in c_in:
-                    c_tile['time_context'] = self.repeat_tensor(c_in['time_context'], n_rep)
-                for key in c_tile:
-                    if key in ['y', 'c_concat']:
-                        icond = c_tile[key]
-                        if icond.shape[2:] == (self.h, self.w):
-                            c_tile[key] = torch.cat([icond[bbox.slicer] for bbox in bboxes])
-                        else:
-                            c_tile[key] = self.repeat_tensor(icond, n_rep)
-
-                # controlnet tiling
-                # self.switch_controlnet_tensors(batch_id, N, len(bboxes))
-                if 'control' in c_in:
-                    self.process_controlnet(x_tile.shape, x_tile.dtype, c_in, cond_or_uncond, bboxes, N, batch_id)
-                    c_tile['control'] = c_in['control_model'].get_control(x_tile, ts_tile, c_tile, len(cond_or_uncond))
-
-                # stablesr tiling
-                # self.switch_stablesr_tensors(batch_id)
-
-                x_tile_out = model_function(x_tile, ts_tile, **c_tile)
-
-                for i, bbox in enumerate(bboxes):
-                    self.x_buffer[bbox.slicer] += x_tile_out[i*N:(i+1)*N, :, :, :]
-                del x_tile_out, x_tile, ts_tile, c_tile
-
-                # update progress bar
-                # self.update_pbar()
+            if not self.sample_tiles(model_function, x_in, t_in, c_in, cond_or_uncond):
+                return x_in
 
         # Averaging background buffer
         x_out = torch.where(self.weights > 1, self.x_buffer / self.weights, self.x_buffer)
@@ -460,6 +497,10 @@ class MixtureOfDiffusers(AbstractDiffusion):
         for bbox_id, bbox in enumerate(self.custom_bboxes):
             if bbox.blend_mode == BlendMode.BACKGROUND:
                 self.custom_weights[bbox_id] *= self.rescale_factor[bbox.slicer]
+        # The per-tile weights only change with the latent size, so they are computed here once
+        # instead of on every step; they are tiny, at one float per latent pixel of each tile
+        for bbox in self.bboxes:
+            bbox.weight = self.tile_weights * self.rescale_factor[bbox.slicer]
 
     @grid_bbox
     def get_tile_weights(self) -> Tensor:
@@ -469,105 +510,27 @@ class MixtureOfDiffusers(AbstractDiffusion):
         self.tile_weights = self.get_weight(self.tile_w, self.tile_h)
         return self.tile_weights
 
+    def accumulate_tile(self, bbox:BBox, x_tile_out:Tensor):
+        self.x_buffer[bbox.slicer] += x_tile_out * bbox.weight
+
     @torch.no_grad()
     def __call__(self, model_function: BaseModel.apply_model, args: dict):
         x_in: Tensor = args["input"]
         t_in: Tensor = args["timestep"]
         c_in: dict = args["c"]
         cond_or_uncond: List= args["cond_or_uncond"]
-        c_crossattn: Tensor = c_in['c_crossattn']
 
         N, C, H, W = x_in.shape
 
-        self.refresh = False
-        # self.refresh = True
-        if self.weights is None or self.h != H or self.w != W:
-            self.h, self.w = H, W
-            self.refresh = True
-            self.init_grid_bbox(self.tile_width, self.tile_height, self.tile_overlap, self.tile_batch_size)
-            # init everything done, perform sanity check & pre-computations
-            self.init_done()
-        self.h, self.w = H, W
+        self.refresh_size(H, W)
         # clear buffer canvas
         self.reset_buffer(x_in)
 
-        # self.pbar = tqdm(total=(self.total_bboxes) * sampling_steps, desc=f"{self.method} Sampling: ")
-        # self.pbar = tqdm(total=len(self.batched_bboxes), desc=f"{self.method} Sampling: ")
-
         # Global sampling
         if self.draw_background:
-            for batch_id, bboxes in enumerate(self.batched_bboxes):     # batch_id is the `Latent tile batch size`
-                if ldm_patched.modules.model_management.processing_interrupted(): 
-                    # self.pbar.close()
-                    return x_in
-
-                # batching
-                x_tile_list     = []
-                t_tile_list     = []
-                icond_map = {}
-                # tcond_tile_list = []
-                # icond_tile_list = []
-                # vcond_tile_list = []
-                # control_list = []
-                for bbox in bboxes:
-                    x_tile_list.append(x_in[bbox.slicer])
-                    t_tile_list.append(t_in)
-                    if isinstance(c_in, dict):
-                        # tcond
-                        # tcond_tile = c_crossattn #self.get_tcond(c_in)      # cond, [1, 77, 768]
-                        # tcond_tile_list.append(tcond_tile)
-                        # present in sdxl
-                        for key in ['y', 'c_concat']:
-                            if key in c_in:
-                                icond=c_in[key] # self.get_icond(c_in)
-                                if icond.shape[2:] == (self.h, self.w):
-                                    icond = icond[bbox.slicer]
-                                if icond_map.get(key, None) is None:
-                                    icond_map[key] = []
-                                icond_map[key].append(icond)
-                        # # vcond:
-                        # vcond = self.get_vcond(c_in)
-                        # vcond_tile_list.append(vcond)
-                    else:
-                        print('>> [WARN] not supported, make an issue on github!!')
-                n_rep = len(bboxes)
-                x_tile      = torch.cat(x_tile_list,     dim=0)          # differs each
-                t_tile      = self.repeat_tensor(t_in, n_rep)           # just repeat
-                tcond_tile = self.repeat_tensor(c_crossattn, n_rep) # just repeat
-                c_tile = c_in.copy()
-                c_tile['c_crossattn'] = tcond_tile
-                if 'time_context' in c_in:
-                    c_tile['time_context'] = self.repeat_tensor(c_in['time_context'], n_rep) # just repeat
-                for key in c_tile:
-                    if key in ['y', 'c_concat']:
-                        icond_tile = torch.cat(icond_map[key], dim=0)  # differs each
-                        c_tile[key] = icond_tile
-                # vcond_tile = torch.cat(vcond_tile_list, dim=0) if None not in vcond_tile_list else None # just repeat
-
-                # controlnet
-                # self.switch_controlnet_tensors(batch_id, N, len(bboxes), is_denoise=True)
-                if 'control' in c_in:
-                    control=c_in['control']
-                    self.process_controlnet(x_tile.shape, x_tile.dtype, c_in, cond_or_uncond, bboxes, N, batch_id)
-                    c_tile['control'] = control.get_control(x_tile, t_tile, c_tile, len(cond_or_uncond))
-                
-                # stablesr
-                # self.switch_stablesr_tensors(batch_id)
-
-                # denoising: here the x is the noise
-                x_tile_out = model_function(x_tile, t_tile, **c_tile)
-
-                # de-batching
-                for i, bbox in enumerate(bboxes):
-                    # These weights can be calcluated in advance, but will cost a lot of vram 
-                    # when you have many tiles. So we calculate it here.
-                    w = self.tile_weights * self.rescale_factor[bbox.slicer]
-                    self.x_buffer[bbox.slicer] += x_tile_out[i*N:(i+1)*N, :, :, :] * w
-                del x_tile_out, x_tile, t_tile, c_tile
-
-                # self.update_pbar()
-                # self.pbar.update()
-        # self.pbar.close()
+            if not self.sample_tiles(model_function, x_in, t_in, c_in, cond_or_uncond):
+                return x_in
+
         x_out = self.x_buffer
 
         return x_out
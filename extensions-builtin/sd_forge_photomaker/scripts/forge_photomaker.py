@@ -1,7 +1,10 @@
+import os
+
 from modules_forge.supported_preprocessor import Preprocessor, PreprocessorParameter
 from modules_forge.shared import add_supported_preprocessor
 from modules_forge.shared import add_supported_control_model
 from modules_forge.supported_controlnet import ControlModelPatcher
+from modules_forge import embedding_cache
 from ldm_patched.contrib.external_photomaker import PhotoMakerEncode, PhotoMakerIDEncoder
 
 
@@ -35,6 +38,7 @@ class PhotomakerPatcher(ControlModelPatcher):
 
         photomaker_model = PhotoMakerIDEncoder()
         photomaker_model.load_state_dict(state_dict)
+        photomaker_model.cache_name = os.path.basename(ckpt_path)
 
         return PhotomakerPatcher(photomaker_model)
 
@@ -48,7 +52,11 @@ class PhotomakerPatcher(ControlModelPatcher):
         clip = process.sd_model.forge_objects.clip
         text = process.prompts[0]
 
-        cond_modified = opPhotoMakerEncode(photomaker=self.model, image=cond.movedim(1, -1), clip=clip, text=text)[0]
+        def encode_id(id_pixel_values):
+            return embedding_cache.cached(self.model, ('photomaker_id',), id_pixel_values,
+                                          lambda: self.model.encode_id(id_pixel_values))
+
+        cond_modified = opPhotoMakerEncode(photomaker=self.model, image=cond.movedim(1, -1), clip=clip, text=text, encode_id=encode_id)[0]
         cond_modified = unet.encode_conds_after_clip(conds=cond_modified, noise=kwargs['x'])[0]
 
         def conditioning_modifier(model, x, timestep, uncond, cond, cond_scale, model_options, seed):
@@ -231,6 +231,10 @@ def apply_masks(
     return masks_for_overlay
 
 
+# Upper bound on pixels * kernel taps processed at once by weighted_histogram_filter.
+histogram_filter_chunk_elements = 1 << 22
+
+
 def weighted_histogram_filter(img, kernel, kernel_center, percentile_min=0.0, percentile_max=1.0, min_width=1.0):
     """
     Generalization convolution filter capable of applying
@@ -258,101 +262,65 @@ def weighted_histogram_filter(img, kernel, kernel_center, percentile_min=0.0, pe
         (nparray): A filtered copy of the input image "img", a 2-D array of floats.
     """
 
-    # Converts an index tuple into a vector.
-    def vec(x):
-        return np.array(x)
+    from numpy.lib.stride_tricks import sliding_window_view
 
-    kernel_min = -kernel_center
-    kernel_max = vec(kernel.shape) - kernel_center
-
-    def weighted_histogram_filter_single(idx):
-        idx = vec(idx)
-        min_index = np.maximum(0, idx + kernel_min)
-        max_index = np.minimum(vec(img.shape), idx + kernel_max)
-        window_shape = max_index - min_index
-
-        class WeightedElement:
-            """
-            An element of the histogram, its weight
-            and bounds.
-            """
-
-            def __init__(self, value, weight):
-                self.value: float = value
-                self.weight: float = weight
-                self.window_min: float = 0.0
-                self.window_max: float = 1.0
-
-        # Collect the values in the image as WeightedElements,
-        # weighted by their corresponding kernel values.
-        values = []
-        for window_tup in np.ndindex(tuple(window_shape)):
-            window_index = vec(window_tup)
-            image_index = window_index + min_index
-            centered_kernel_index = image_index - idx
-            kernel_index = centered_kernel_index + kernel_center
-            element = WeightedElement(img[tuple(image_index)], kernel[tuple(kernel_index)])
-            values.append(element)
-
-        def sort_key(x: WeightedElement):
-            return x.value
-
-        values.sort(key=sort_key)
-
-        # Calculate the height of the stack (sum)
-        # and each sample's range they occupy in the stack
-        sum = 0
-        for i in range(len(values)):
-            values[i].window_min = sum
-            sum += values[i].weight
-            values[i].window_max = sum
-
-        # Calculate what range of this stack ("window")
-        # we want to get the weighted average across.
-        window_min = sum * percentile_min
-        window_max = sum * percentile_max
-        window_width = window_max - window_min
-
-        # Ensure the window is within the stack and at least a certain size.
-        if window_width < min_width:
-            window_center = (window_min + window_max) / 2
-            window_min = window_center - min_width / 2
-            window_max = window_center + min_width / 2
-
-            if window_max > sum:
-                window_max = sum
-                window_min = sum - min_width
-
-            if window_min < 0:
-                window_min = 0
-                window_max = min_width
-
-        value = 0
-        value_weight = 0
-
-        # Get the weighted average of all the samples
-        # that overlap with the window, weighted
-        # by the size of their overlap.
-        for i in range(len(values)):
-            if window_min >= values[i].window_max:
-                continue
-            if window_max <= values[i].window_min:
-                break
-
-            s = max(window_min, values[i].window_min)
-            e = min(window_max, values[i].window_max)
-            w = e - s
-
-            value += values[i].value * w
-            value_weight += w
-
-        return value / value_weight if value_weight != 0 else 0
+    kernel = np.asarray(kernel, dtype=np.float64)
+    kernel_center = [int(x) for x in np.broadcast_to(kernel_center, (2,))]
+    kernel_size = kernel.shape[0] * kernel.shape[1]
+
+    # Pad the image so every pixel has a full window. The padding gets a weight of 0: it occupies no range in the
+    # histogram stack, which is the same as the window being clipped at the image border.
+    pad = ((kernel_center[0], kernel.shape[0] - kernel_center[0] - 1), (kernel_center[1], kernel.shape[1] - kernel_center[1] - 1))
+    padded_values = np.pad(img.astype(np.float64), pad)
+    padded_weights = np.pad(np.ones(img.shape), pad)
 
     img_out = img.copy()
 
-    # Apply the kernel operation over each pixel.
-    for index in np.ndindex(img.shape):
-        img_out[index] = weighted_histogram_filter_single(index)
+    # Process a band of rows at a time to bound the memory used by the (pixels, kernel taps) arrays.
+    rows_per_chunk = max(1, histogram_filter_chunk_elements // max(1, img.shape[1] * kernel_size))
+
+    for row_start in range(0, img.shape[0], rows_per_chunk):
+        row_end = min(img.shape[0], row_start + rows_per_chunk)
+        band = slice(row_start, row_end + kernel.shape[0] - 1)
+
+        values = sliding_window_view(padded_values[band], kernel.shape).reshape(-1, kernel_size)
+        weights = (sliding_window_view(padded_weights[band], kernel.shape) * kernel).reshape(-1, kernel_size)
+
+        # Sort each window's samples by value and stack their weights.
+        order = np.argsort(values, axis=1, kind='stable')
+        values = np.take_along_axis(values, order, axis=1)
+        weights = np.take_along_axis(weights, order, axis=1)
+
+        element_max = np.cumsum(weights, axis=1)
+        element_min = np.concatenate([np.zeros((element_max.shape[0], 1)), element_max[:, :-1]], axis=1)
+        total = element_max[:, -1:]
+
+        # Calculate what range of each stack ("window") we want to get the weighted average across,
+        # ensuring it is within the stack and at least min_width wide.
+        window_min = total * percentile_min
+        window_max = total * percentile_max
+        narrow = (window_max - window_min) < min_width
+
+        window_center = (window_min + window_max) / 2
+        window_min = np.where(narrow, window_center - min_width / 2, window_min)
+        window_max = np.where(narrow, window_center + min_width / 2, window_max)
+
+        over = narrow & (window_max > total)
+        window_max = np.where(over, total, window_max)
+        window_min = np.where(over, total - min_width, window_min)
+
+        under = narrow & (window_min < 0)
+        window_min = np.where(under, 0, window_min)
+        window_max = np.where(under, min_width, window_max)
+
+        # Get the weighted average of all the samples that overlap with the window,
+        # weighted by the size of their overlap.
+        overlap = np.clip(np.minimum(window_max, element_max) - np.maximum(window_min, element_min), 0, None)
+        value_weight = overlap.sum(axis=1)
+        value = (values * overlap).sum(axis=1)
+        result = np.divide(value, value_weight, out=np.zeros_like(value), where=value_weight != 0)
+
+        img_out[row_start:row_end] = result.reshape(row_end - row_start, img.shape[1])
 
     return img_out
 
@@ -0,0 +1,74 @@
+# DeepCache: Accelerating Diffusion Models for Free (https://arxiv.org/abs/2312.00858)
+# The deep features entering the shallow output blocks change slowly between neighbouring steps,
+# so they are computed on one step and reused for the next `interval - 1` steps, on which only
+# input blocks 0..depth and the matching output blocks run.
+
+
+class DeepCache:
+    def __init__(self, interval, depth, sigma_start, sigma_end):
+        self.interval = interval
+        self.depth = depth
+        self.sigma_start = sigma_start
+        self.sigma_end = sigma_end
+        self.reset()
+
+    def reset(self):
+        self.features = {}
+        self.full_steps = {}
+        self.step = 0
+        self.last_sigma = None
+        self.current_key = None
+        self.full_calls = 0
+        self.cached_calls = 0
+
+    def __deepcopy__(self, memo):
+        # model_options are deep-copied on every clone; all clones of one patched unet share the cache
+        return self
+
+    def begin(self, x, transformer_options):
+        """Called at the start of UNetModel.forward; returns the deep feature to resume from, or None for a full pass."""
+        sigma = float(transformer_options["sigmas"][0])
+        if sigma != self.last_sigma:
+            if self.last_sigma is not None and sigma > self.last_sigma:
+                # a new sampling pass started (e.g. hires fix or next batch)
+                self.report()
+                self.reset()
+            self.last_sigma = sigma
+            self.step += 1
+
+        self.current_key = (tuple(x.shape), tuple(transformer_options.get("cond_or_uncond", [])))
+
+        feature = None
+        if self.sigma_end <= sigma <= self.sigma_start and self.step - self.full_steps.get(self.current_key, -self.interval) < self.interval:
+            feature = self.features.get(self.current_key, None)
+
+        if feature is None:
+            self.full_calls += 1
+        else:
+            self.cached_calls += 1
+        return feature
+
+    def store(self, h):
+        self.features[self.current_key] = h
+        self.full_steps[self.current_key] = self.step
+
+    def report(self):
+        if self.cached_calls > 0:
+            print(f"[DeepCache] full UNet passes: {self.full_calls}, cached passes: {self.cached_calls}")
+
+
+class DeepCachePatcher:
+    def patch(self, model, interval, depth, start_percent, end_percent):
+        model_sampling = model.get_model_object("model_sampling")
+        depth = max(0, min(depth, len(model.model.diffusion_model.input_blocks) - 2))
+
+        deep_cache = DeepCache(
+            interval=interval,
+            depth=depth,
+            sigma_start=model_sampling.percent_to_sigma(start_percent),
+            sigma_end=model_sampling.percent_to_sigma(end_percent),
+        )
+
+        m = model.clone()
+        m.set_transformer_option("deep_cache", deep_cache)
+        return (m, deep_cache)
@@ -100,7 +100,7 @@ class PhotoMakerIDEncoder(ldm_patched.modules.clip_model.CLIPVisionModelProjecti
         self.visual_projection_2 = ldm_patched.modules.ops.manual_cast.Linear(1024, 1280, bias=False)
         self.fuse_module = FuseModule(2048, ldm_patched.modules.ops.manual_cast)
 
-    def forward(self, id_pixel_values, prompt_embeds, class_tokens_mask):
+    def encode_id(self, id_pixel_values):
         b, num_inputs, c, h, w = id_pixel_values.shape
         id_pixel_values = id_pixel_values.view(b * num_inputs, c, h, w)
 
@@ -112,7 +112,12 @@ class PhotoMakerIDEncoder(ldm_patched.modules.clip_model.CLIPVisionModelProjecti
         id_embeds_2 = id_embeds_2.view(b, num_inputs, 1, -1)
 
         id_embeds = torch.cat((id_embeds, id_embeds_2), dim=-1)
-        updated_prompt_embeds = self.fuse_module(prompt_embeds, id_embeds, class_tokens_mask)
+        return id_embeds
+
+    def forward(self, id_pixel_values, prompt_embeds, class_tokens_mask, id_embeds=None):
+        if id_embeds is None:
+            id_embeds = self.encode_id(id_pixel_values)
+        updated_prompt_embeds = self.fuse_module(prompt_embeds, id_embeds.to(prompt_embeds.device), class_tokens_mask)
 
         return updated_prompt_embeds
 
@@ -151,7 +156,7 @@ class PhotoMakerEncode:
 
     CATEGORY = "_for_testing/photomaker"
 
-    def apply_photomaker(self, photomaker, image, clip, text):
+    def apply_photomaker(self, photomaker, image, clip, text, encode_id=None):
         special_token = "photomaker"
         pixel_values = ldm_patched.modules.clip_vision.clip_preprocess(image.to(photomaker.load_device)).float()
         try:
@@ -174,7 +179,8 @@ class PhotoMakerEncode:
             token_index = index - 1
             num_id_images = 1
             class_tokens_mask = [True if token_index <= i < token_index+num_id_images else False for i in range(77)]
-            out = photomaker(id_pixel_values=pixel_values.unsqueeze(0), prompt_embeds=cond.to(photomaker.load_device),
+            id_embeds = encode_id(pixel_values.unsqueeze(0)) if encode_id is not None else None
+            out = photomaker(id_pixel_values=pixel_values.unsqueeze(0), prompt_embeds=cond.to(photomaker.load_device), id_embeds=id_embeds,
                             class_tokens_mask=torch.tensor(class_tokens_mask, dtype=torch.bool, device=photomaker.load_device).unsqueeze(0))
         else:
             out = cond
@@ -36,10 +36,24 @@ def bipartite_soft_matching_random2d(metric: torch.Tensor,
      - r: number of tokens to remove (by merging)
      - no_rand: if true, disable randomness (use top left corner only)
     """
+    plan = compute_merge_plan(metric, w, h, sx, sy, r, no_rand)
+    if plan is None:
+        return do_nothing, do_nothing
+
+    return plan_functions(plan, metric.device)
+
+
+def compute_merge_plan(metric: torch.Tensor,
+                       w: int, h: int, sx: int, sy: int, r: int,
+                       no_rand: bool = False):
+    """
+    Computes the index tensors used by merge/unmerge, see bipartite_soft_matching_random2d.
+    Returns None if nothing should be merged.
+    """
     B, N, _ = metric.shape
 
     if r <= 0 or w == 1 or h == 1:
-        return do_nothing, do_nothing
+        return None
 
     gather = mps_gather_workaround if metric.device.type == "mps" else torch.gather
     
@@ -98,6 +112,19 @@ def bipartite_soft_matching_random2d(metric: torch.Tensor,
         src_idx = edge_idx[..., :r, :]  # Merged Tokens
         dst_idx = gather(node_idx[..., None], dim=-2, index=src_idx)
 
+    return B, N, r, num_dst, a_idx, b_idx, unm_idx, src_idx, dst_idx
+
+
+def plan_functions(plan, device) -> Tuple[Callable, Callable]:
+    B, N, r, num_dst, a_idx, b_idx, unm_idx, src_idx, dst_idx = plan
+    gather = mps_gather_workaround if device.type == "mps" else torch.gather
+
+    def split(x):
+        C = x.shape[-1]
+        src = gather(x, dim=1, index=a_idx.expand(B, N - num_dst, C))
+        dst = gather(x, dim=1, index=b_idx.expand(B, num_dst, C))
+        return src, dst
+
     def merge(x: torch.Tensor, mode="mean") -> torch.Tensor:
         src, dst = split(x)
         n, t1, c = src.shape
@@ -126,7 +153,7 @@ def bipartite_soft_matching_random2d(metric: torch.Tensor,
     return merge, unmerge
 
 
-def get_functions(x, ratio, original_shape):
+def get_functions(x, ratio, original_shape, plans=None):
     b, c, original_h, original_w = original_shape
     original_tokens = original_h * original_w
     downsample = int(math.ceil(math.sqrt(original_tokens // x.shape[1])))
@@ -139,20 +166,68 @@ def get_functions(x, ratio, original_shape):
         h = int(math.ceil(original_h / downsample))
         r = int(x.shape[1] * ratio)
         no_rand = False
-        m, u = bipartite_soft_matching_random2d(x, w, h, stride_x, stride_y, r, no_rand)
-        return m, u
+        if plans is None:
+            m, u = bipartite_soft_matching_random2d(x, w, h, stride_x, stride_y, r, no_rand)
+            return m, u
+
+        key = (tuple(x.shape[:2]), w, h, r, x.device)
+        plan = plans.get(key)
+        if plan is None:
+            plan = compute_merge_plan(x, w, h, stride_x, stride_y, r, no_rand)
+            plans.put(key, plan)
+        if plan is not None:
+            return plan_functions(plan, x.device)
 
     nothing = lambda y: y
     return nothing, nothing
 
 
+class MergePlanCache:
+    """
+    Reuses merge plans across all blocks of the same resolution and across `refresh_interval` neighbouring
+    steps. A plan computed on the first block of a step is then used by every other block with the same
+    token count and batch until it is refreshed.
+    """
+
+    missing = object()
+
+    def __init__(self, refresh_interval):
+        self.refresh_interval = refresh_interval
+        self.plans = {}
+        self.step = 0
+        self.last_sigma = None
+
+    def update_step(self, sigmas):
+        sigma = float(sigmas[0]) if sigmas is not None else None
+        if sigma != self.last_sigma:
+            if self.last_sigma is not None and sigma is not None and sigma > self.last_sigma:
+                # a new sampling pass started (e.g. hires fix or next batch)
+                self.plans = {}
+            self.last_sigma = sigma
+            self.step += 1
+
+    def get(self, key):
+        entry = self.plans.get(key, self.missing)
+        if entry is self.missing or self.step - entry[0] >= self.refresh_interval:
+            return None
+        return entry[1]
+
+    def put(self, key, plan):
+        self.plans[key] = (self.step, plan)
+
+
 class TomePatcher:
     def __init__(self):
         self.u = None
 
-    def patch(self, model, ratio):
+    def patch(self, model, ratio, plan_refresh_interval=0):
+        """plan_refresh_interval = 0 computes a new merge plan in every attention call, N > 0 reuses plans for N steps."""
+        plans = MergePlanCache(plan_refresh_interval) if plan_refresh_interval > 0 else None
+
         def tomesd_m(q, k, v, extra_options):
-            m, self.u = get_functions(q, ratio, extra_options["original_shape"])
+            if plans is not None:
+                plans.update_step(extra_options.get("sigmas", None))
+            m, self.u = get_functions(q, ratio, extra_options["original_shape"], plans)
             return m(q), k, v
 
         def tomesd_u(n, extra_options):
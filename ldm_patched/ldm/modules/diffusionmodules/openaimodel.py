@@ -876,8 +876,15 @@ class UNetModel(nn.Module):
             assert y.shape[0] == x.shape[0]
             emb = emb + self.label_emb(y)
 
+        # DeepCache: on cached steps only the shallow blocks run, resuming from the stored deep feature
+        deep_cache = transformer_options.get("deep_cache", None)
+        deep_feature = deep_cache.begin(x, transformer_options) if deep_cache is not None else None
+
         h = x
         for id, module in enumerate(self.input_blocks):
+            if deep_feature is not None and id > deep_cache.depth:
+                break
+
             transformer_options["block"] = ("input", id)
 
             for block_modifier in block_modifiers:
@@ -900,18 +907,29 @@ class UNetModel(nn.Module):
                 for p in patch:
                     h = p(h, transformer_options)
 
-        transformer_options["block"] = ("middle", 0)
+        if deep_feature is None:
+            transformer_options["block"] = ("middle", 0)
 
-        for block_modifier in block_modifiers:
-            h = block_modifier(h, 'before', transformer_options)
+            for block_modifier in block_modifiers:
+                h = block_modifier(h, 'before', transformer_options)
 
-        h = forward_timestep_embed(self.middle_block, h, emb, context, transformer_options, time_context=time_context, num_video_frames=num_video_frames, image_only_indicator=image_only_indicator)
-        h = apply_control(h, control, 'middle')
+            h = forward_timestep_embed(self.middle_block, h, emb, context, transformer_options, time_context=time_context, num_video_frames=num_video_frames, image_only_indicator=image_only_indicator)
+            h = apply_control(h, control, 'middle')
 
-        for block_modifier in block_modifiers:
-            h = block_modifier(h, 'after', transformer_options)
+            for block_modifier in block_modifiers:
+                h = block_modifier(h, 'after', transformer_options)
 
         for id, module in enumerate(self.output_blocks):
+            if deep_feature is not None:
+                resume_id = len(self.output_blocks) - 1 - deep_cache.depth
+                if id < resume_id:
+                    # keep the control residuals of the remaining blocks aligned
+                    if control is not None and len(control.get('output', [])) > 0:
+                        control['output'].pop()
+                    continue
+                if id == resume_id:
+                    h = deep_feature
+
             transformer_options["block"] = ("output", id)
             hsp = hs.pop()
             hsp = apply_control(hsp, control, 'output')
@@ -936,6 +954,9 @@ class UNetModel(nn.Module):
             for block_modifier in block_modifiers:
                 h = block_modifier(h, 'after', transformer_options)
 
+            if deep_cache is not None and deep_feature is None and id == len(self.output_blocks) - 2 - deep_cache.depth:
+                deep_cache.store(h)
+
         transformer_options["block"] = ("last", 0)
 
         for block_modifier in block_modifiers:
@@ -134,6 +134,8 @@ parser.add_argument("--multi-user", action="store_true")
 parser.add_argument("--cuda-malloc", action="store_true")
 parser.add_argument("--cuda-stream", action="store_true")
 parser.add_argument("--pin-shared-memory", action="store_true")
+parser.add_argument("--offload-planner", action="store_true", help="Choose which modules stay on the GPU in partial offload to minimize transfer per step")
+parser.add_argument("--offload-quantize", type=str, default=None, choices=["int8", "fp8"], help="Transfer offloaded Linear/Conv weights from a per-channel quantized copy in host memory (lossy while loaded; the original weights are kept)")
 
 if ldm_patched.modules.options.args_parsing:
     args = parser.parse_args([])
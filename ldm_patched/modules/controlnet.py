@@ -36,6 +36,11 @@ def broadcast_image_to(tensor, target_batch_size, batched_number):
         return torch.cat([tensor] * batched_number, dim=0)
 
 
+def clone_residual(control):
+    # control_merge scales the residuals in place, so cached ones are never handed out directly
+    return [x.clone() if isinstance(x, torch.Tensor) else x for x in control]
+
+
 def get_at(array, index, default=None):
     return array[index] if 0 <= index < len(array) else default
 
@@ -123,6 +128,14 @@ class ControlBase:
         self.device = device
         self.previous_controlnet = None
 
+        # Residual caching: recompute control residuals only every `residual_cache_interval` steps
+        # (1 disables it), or earlier when sigma moved by more than `residual_cache_sigma_threshold`
+        # relative to the sigma the cached residuals were computed at (0 ignores sigma).
+        self.residual_cache_interval = 1
+        self.residual_cache_sigma_threshold = 0.0
+        self.residual_cache = {}
+        self.residual_cache_stats = {'computed': 0, 'reused': 0}
+
     def set_cond_hint(self, cond_hint, strength=1.0, timestep_percent_range=(0.0, 1.0)):
         self.cond_hint_original = cond_hint
         self.strength = strength
@@ -131,6 +144,8 @@ class ControlBase:
 
     def pre_run(self, model, percent_to_timestep_function):
         self.timestep_range = (percent_to_timestep_function(self.timestep_percent_range[0]), percent_to_timestep_function(self.timestep_percent_range[1]))
+        self.residual_cache = {}
+        self.residual_cache_stats = {'computed': 0, 'reused': 0}
         if self.previous_controlnet is not None:
             self.previous_controlnet.pre_run(model, percent_to_timestep_function)
 
@@ -145,6 +160,10 @@ class ControlBase:
             del self.cond_hint
             self.cond_hint = None
         self.timestep_range = None
+        if self.residual_cache_stats['reused'] > 0:
+            print(f"[ControlNet] Residual cache: computed {self.residual_cache_stats['computed']}, "
+                  f"reused {self.residual_cache_stats['reused']}")
+        self.residual_cache = {}
 
     def get_models(self):
         out = []
@@ -157,6 +176,29 @@ class ControlBase:
         c.strength = self.strength
         c.timestep_percent_range = self.timestep_percent_range
         c.global_average_pooling = self.global_average_pooling
+        c.residual_cache_interval = self.residual_cache_interval
+        c.residual_cache_sigma_threshold = self.residual_cache_sigma_threshold
+
+    def get_cached_residual(self, key, sigma, context):
+        entry = self.residual_cache.get(key, None)
+        if entry is None or entry['age'] + 1 >= self.residual_cache_interval:
+            return None
+
+        threshold = self.residual_cache_sigma_threshold
+        if threshold > 0 and abs(sigma - entry['sigma']) > threshold * abs(entry['sigma']):
+            return None
+
+        if entry['context'].shape != context.shape or not torch.equal(entry['context'], context):
+            return None
+
+        entry['age'] += 1
+        self.residual_cache_stats['reused'] += 1
+        return clone_residual(entry['control'])
+
+    def put_cached_residual(self, key, sigma, context, control):
+        self.residual_cache[key] = {'sigma': sigma, 'context': context, 'control': control, 'age': 0}
+        self.residual_cache_stats['computed'] += 1
+        return clone_residual(control)
 
     def inference_memory_requirements(self, dtype):
         if self.previous_controlnet is not None:
@@ -246,6 +288,7 @@ class ControlNet(ControlBase):
             dtype = self.manual_cast_dtype
 
         output_dtype = x_noisy.dtype
+
         if self.cond_hint is None or x_noisy.shape[2] * 8 != self.cond_hint.shape[2] or x_noisy.shape[3] * 8 != self.cond_hint.shape[3]:
             if self.cond_hint is not None:
                 del self.cond_hint
@@ -254,6 +297,16 @@ class ControlNet(ControlBase):
         if x_noisy.shape[0] != self.cond_hint.shape[0]:
             self.cond_hint = broadcast_image_to(self.cond_hint, x_noisy.shape[0], batched_number)
 
+        residual_cache_key = None
+        if self.residual_cache_interval > 1:
+            # the hint is part of the key: tiled diffusion calls this once per tile batch with the same shapes,
+            # swapping in that batch's slice of the hint
+            residual_cache_key = (tuple(x_noisy.shape), tuple(to.get('cond_or_uncond', [])), self.cond_hint.data_ptr(), tuple(self.cond_hint.shape))
+            sigma = float(t[0])
+            control = self.get_cached_residual(residual_cache_key, sigma, cond['c_crossattn'])
+            if control is not None:
+                return self.control_merge(None, control, control_prev, output_dtype)
+
         context = cond['c_crossattn']
         y = cond.get('y', None)
         if y is not None:
@@ -271,6 +324,9 @@ class ControlNet(ControlBase):
             control = controlnet_model_function_wrapper(**wrapper_args)
         else:
             control = self.control_model(x=x_noisy.to(dtype), hint=self.cond_hint.to(self.device), timesteps=timestep.float(), context=context.to(dtype), y=y)
+
+        if residual_cache_key is not None:
+            control = self.put_cached_residual(residual_cache_key, sigma, context, control)
         return self.control_merge(None, control, control_prev, output_dtype)
 
     def copy(self):
@@ -7,6 +7,7 @@ import psutil
 from enum import Enum
 from ldm_patched.modules.args_parser import args
 from modules_forge import stream
+from ldm_patched.modules import offload_planner
 import torch
 import sys
 import platform
@@ -321,6 +322,7 @@ class LoadedModel:
         self.memory_required = memory_required
         self.model_accelerated = False
         self.device = model.load_device
+        self.execution_profiler = None
 
     def model_memory(self):
         return self.model.model_size()
@@ -350,17 +352,34 @@ class LoadedModel:
             print(f"[Memory Management] Requested {flag} Preserved Memory (MB) = ", async_kept_memory / (1024 * 1024))
             real_async_memory = 0
             mem_counter = 0
-            for m in self.real_model.modules():
+            quantized_memory = [0, 0]
+            if args.offload_quantize is not None:
+                import ldm_patched.modules.ops
+
+            plan = None
+            if args.offload_planner:
+                plan = self.offload_plan(async_kept_memory)
+                print(f"[Memory Management] Offload Plan: {plan.summary()}")
+
+            for n, m in self.real_model.named_modules():
                 if hasattr(m, "ldm_patched_cast_weights"):
                     m.prev_ldm_patched_cast_weights = m.ldm_patched_cast_weights
                     m.ldm_patched_cast_weights = True
                     module_mem = module_size(m)
-                    if mem_counter + module_mem < async_kept_memory:
+                    if plan is not None:
+                        keep = n in plan.keep
+                    else:
+                        keep = mem_counter + module_mem < async_kept_memory
+                    if keep:
                         m.to(self.device)
                         mem_counter += module_mem
                     else:
                         real_async_memory += module_mem
                         m.to(self.model.offload_device)
+                        if args.offload_quantize is not None:
+                            before, after = ldm_patched.modules.ops.quantize_module(m, args.offload_quantize)
+                            quantized_memory[0] += before
+                            quantized_memory[1] += after
                         if PIN_SHARED_MEMORY and is_device_cpu(self.model.offload_device):
                             m._apply(lambda x: x.pin_memory())
                 elif hasattr(m, "weight"):
@@ -369,6 +388,10 @@ class LoadedModel:
                     print(f"[Memory Management] {flag} Loader Disabled for ", m)
             print(f"[Memory Management] Parameters Loaded to {flag} Stream (MB) = ", real_async_memory / (1024 * 1024))
             print(f"[Memory Management] Parameters Loaded to GPU (MB) = ", mem_counter / (1024 * 1024))
+            if quantized_memory[0] > 0:
+                real_async_memory += quantized_memory[1] - quantized_memory[0]
+                print(f"[Memory Management] Quantized Offload ({args.offload_quantize}) Copies (MB) = ", quantized_memory[0] / (1024 * 1024), "->", quantized_memory[1] / (1024 * 1024))
+                print(f"[Memory Management] Transfer Per Model Forward (MB) = ", real_async_memory / (1024 * 1024))
 
             self.model_accelerated = True
 
@@ -377,12 +400,35 @@ class LoadedModel:
 
         return self.real_model
 
+    def offload_plan(self, async_kept_memory):
+        is_castable = lambda m: hasattr(m, "ldm_patched_cast_weights")
+
+        fixed_memory = 0
+        for m in self.real_model.modules():
+            if not is_castable(m) and hasattr(m, "weight") and len(list(m.children())) == 0:
+                fixed_memory += module_size(m)
+
+        entries = offload_planner.collect_entries(self.real_model, module_size, is_castable)
+        plan = offload_planner.get_plan(self.real_model, entries, max(0, async_kept_memory - fixed_memory))
+
+        if offload_planner.profile_key(self.real_model) not in offload_planner.execution_profiles:
+            step_module = getattr(self.real_model, "diffusion_model", self.real_model)
+            self.execution_profiler = offload_planner.ExecutionProfiler(self.real_model, is_castable, step_module=step_module)
+
+        return plan
+
     def model_unload(self, avoid_model_moving=False):
+        if self.execution_profiler is not None:
+            self.execution_profiler.finish()
+            self.execution_profiler = None
+
         if self.model_accelerated:
+            import ldm_patched.modules.ops
             for m in self.real_model.modules():
                 if hasattr(m, "prev_ldm_patched_cast_weights"):
                     m.ldm_patched_cast_weights = m.prev_ldm_patched_cast_weights
                     del m.prev_ldm_patched_cast_weights
+                ldm_patched.modules.ops.dequantize_module(m)
 
             self.model_accelerated = False
 
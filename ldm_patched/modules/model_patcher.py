@@ -36,6 +36,15 @@ def weight_decompose(dora_scale, weight, lora_diff, alpha, strength):
     return weight
 
 
+class LowVramPatch:
+    def __init__(self, key, model_patcher):
+        self.key = key
+        self.model_patcher = model_patcher
+
+    def __call__(self, weight):
+        return self.model_patcher.calculate_weight(self.model_patcher.patches[self.key], weight, self.key)
+
+
 def set_model_options_patch_replace(model_options, patch, name, block_name, number, transformer_index=None):
     to = model_options["transformer_options"].copy()
 
@@ -330,18 +339,12 @@ class ModelPatcher:
         self.patch_model(device_to, patch_weights=False)
 
         logging.info("loading in lowvram mode {}".format(lowvram_model_memory/(1024 * 1024)))
-        class LowVramPatch:
-            def __init__(self, key, model_patcher):
-                self.key = key
-                self.model_patcher = model_patcher
-            def __call__(self, weight):
-                return self.model_patcher.calculate_weight(self.model_patcher.patches[self.key], weight, self.key)
 
         mem_counter = 0
         patch_counter = 0
         for n, m in self.model.named_modules():
             lowvram_weight = False
-            if hasattr(m, "comfy_cast_weights"):
+            if hasattr(m, "ldm_patched_cast_weights"):
                 module_mem = ldm_patched.modules.model_management.module_size(m)
                 if mem_counter + module_mem >= lowvram_model_memory:
                     lowvram_weight = True
@@ -363,8 +366,8 @@ class ModelPatcher:
                         m.bias_function = LowVramPatch(bias_key, self)
                         patch_counter += 1
 
-                m.prev_comfy_cast_weights = m.comfy_cast_weights
-                m.comfy_cast_weights = True
+                m.prev_ldm_patched_cast_weights = m.ldm_patched_cast_weights
+                m.ldm_patched_cast_weights = True
             else:
                 if hasattr(m, "weight"):
                     self.patch_weight_to_device(weight_key, device_to)
@@ -0,0 +1,205 @@
+# Offload planner for partial (async/lowvram) model loading.
+#
+# LoadedModel.model_load used to keep modules on the device with a greedy first-fit over
+# module order. The planner instead treats the choice as a 0/1 knapsack: every castable
+# module has a size (parameter bytes) and a value (bytes moved per sampling step if it is
+# offloaded = size * executions per step), and we keep the set that minimizes the bytes
+# transferred per step under the memory budget.
+
+import logging
+import weakref
+from collections import OrderedDict
+
+import torch
+
+
+KNAPSACK_MAX_BUCKETS = 4096
+PLANS_PER_MODEL = 8
+
+# model -> OrderedDict of (budget, profiled) -> plan, least recently used first. Plans go away
+# with their model, so a model that reuses a freed model's id() never gets its plans.
+plan_cache = weakref.WeakKeyDictionary()
+execution_profiles = {}
+
+
+class OffloadEntry:
+    def __init__(self, name, size, executions=1.0):
+        self.name = name
+        self.size = int(size)
+        self.executions = float(executions)
+        self.category = module_category(name)
+
+    @property
+    def transfer(self):
+        return self.size * self.executions
+
+
+class OffloadPlan:
+    def __init__(self, keep, budget, kept_memory, offloaded_memory, transfer_per_step, transfer_by_category):
+        self.keep = keep
+        self.budget = budget
+        self.kept_memory = kept_memory
+        self.offloaded_memory = offloaded_memory
+        self.transfer_per_step = transfer_per_step
+        self.transfer_by_category = transfer_by_category
+
+    def summary(self):
+        mb = 1024 * 1024
+        categories = ", ".join(f"{k} = {v / mb:.1f}" for k, v in sorted(self.transfer_by_category.items()) if v > 0)
+        return (f"kept {self.kept_memory / mb:.1f} MB of {self.budget / mb:.1f} MB budget, "
+                f"offloaded {self.offloaded_memory / mb:.1f} MB, "
+                f"predicted transfer per step {self.transfer_per_step / mb:.1f} MB ({categories})")
+
+
+def module_category(name):
+    if "attn" in name or "transformer_blocks" in name or "proj_in" in name or "proj_out" in name:
+        kind = "attention"
+    elif any(x in name for x in ("in_layers", "out_layers", "emb_layers", "skip_connection")):
+        kind = "resblock"
+    else:
+        kind = "other"
+
+    if "input_blocks" in name:
+        return f"input_blocks.{kind}"
+    if "middle_block" in name:
+        return f"middle_block.{kind}"
+    if "output_blocks" in name:
+        return f"output_blocks.{kind}"
+    return kind
+
+
+def solve(entries, budget):
+    """Returns the set of entry names to keep on the device."""
+    budget = int(budget)
+    candidates = [e for e in entries if 0 < e.size <= budget]
+
+    if len(candidates) == 0:
+        return set()
+
+    if sum(e.size for e in candidates) <= budget:
+        return set(e.name for e in candidates)
+
+    # Sizes are rounded up to buckets so the solution can never exceed the real budget.
+    granularity = max(1, -(-budget // KNAPSACK_MAX_BUCKETS))
+    capacity = budget // granularity
+
+    best = torch.zeros(capacity + 1, dtype=torch.float64)
+    taken = torch.zeros((len(candidates), capacity + 1), dtype=torch.bool)
+
+    for i, e in enumerate(candidates):
+        w = -(-e.size // granularity)
+        if w > capacity:
+            continue
+        with_item = best[:capacity + 1 - w] + e.transfer
+        improved = with_item > best[w:]
+        taken[i, w:] = improved
+        best[w:] = torch.where(improved, with_item, best[w:])
+
+    keep = set()
+    c = capacity
+    for i in range(len(candidates) - 1, -1, -1):
+        if taken[i, c]:
+            keep.add(candidates[i].name)
+            c -= -(-candidates[i].size // granularity)
+
+    # Fill whatever the bucket rounding left over, most frequently executed first.
+    kept_memory = sum(e.size for e in candidates if e.name in keep)
+    for e in sorted(candidates, key=lambda x: (-x.executions, -x.size)):
+        if e.name not in keep and kept_memory + e.size <= budget:
+            keep.add(e.name)
+            kept_memory += e.size
+
+    return keep
+
+
+def make_plan(entries, budget):
+    keep = solve(entries, budget)
+
+    kept_memory = 0
+    offloaded_memory = 0
+    transfer_per_step = 0.0
+    transfer_by_category = {}
+
+    for e in entries:
+        if e.name in keep:
+            kept_memory += e.size
+        else:
+            offloaded_memory += e.size
+            transfer_per_step += e.transfer
+            transfer_by_category[e.category] = transfer_by_category.get(e.category, 0.0) + e.transfer
+
+    return OffloadPlan(keep, int(budget), kept_memory, offloaded_memory, transfer_per_step, transfer_by_category)
+
+
+def profile_key(model):
+    return f"{model.__class__.__name__}-{sum(1 for _ in model.modules())}"
+
+
+def get_plan(model, entries, budget):
+    plans = plan_cache.get(model, None)
+    if plans is None:
+        plans = plan_cache[model] = OrderedDict()
+
+    key = (int(budget), profile_key(model) in execution_profiles)
+    plan = plans.get(key, None)
+    if plan is None:
+        plan = make_plan(entries, budget)
+        plans[key] = plan
+        while len(plans) > PLANS_PER_MODEL:
+            plans.popitem(last=False)
+    else:
+        plans.move_to_end(key)
+    return plan
+
+
+def collect_entries(model, size_function, is_castable):
+    profile = execution_profiles.get(profile_key(model), {})
+    entries = []
+    for name, m in model.named_modules():
+        if is_castable(m):
+            entries.append(OffloadEntry(name, size_function(m), profile.get(name, 1.0)))
+    return entries
+
+
+class ExecutionProfiler:
+    """
+    Counts how often each castable module runs per model forward.
+
+    Hooks are attached on load and removed after `steps` top-level forwards; the result is
+    stored in execution_profiles so subsequent loads of the same model can be re-planned.
+    """
+
+    def __init__(self, model, is_castable, step_module=None, steps=2):
+        self.model = model
+        self.key = profile_key(model)
+        self.steps = steps
+        self.step_count = 0
+        self.counts = {}
+        self.handles = []
+
+        for name, m in model.named_modules():
+            if is_castable(m):
+                self.handles.append(m.register_forward_pre_hook(self.counter(name)))
+
+        step_module = model if step_module is None else step_module
+        self.handles.append(step_module.register_forward_pre_hook(self.step_hook))
+
+    def counter(self, name):
+        def hook(module, args):
+            self.counts[name] = self.counts.get(name, 0) + 1
+        return hook
+
+    def step_hook(self, module, args):
+        if self.step_count >= self.steps:
+            self.finish()
+            return
+        self.step_count += 1
+
+    def finish(self):
+        for h in self.handles:
+            h.remove()
+        self.handles = []
+
+        if self.step_count > 0 and len(self.counts) > 0:
+            execution_profiles[self.key] = {k: v / self.step_count for k, v in self.counts.items()}
+            logging.info(f"[Offload Planner] Recorded execution profile for {self.key} over {self.step_count} steps")
@@ -30,20 +30,84 @@ def use_patched_ops(operations):
     return
 
 
+QUANTIZED_STORAGE_DTYPES = {
+    "int8": (torch.int8, 127.0),
+}
+
+if hasattr(torch, "float8_e4m3fn"):
+    QUANTIZED_STORAGE_DTYPES["fp8"] = (torch.float8_e4m3fn, 448.0)
+
+
+def quantize_weight(weight, storage="int8"):
+    """Per-output-channel symmetric quantization. Returns (quantized, scale)."""
+    dtype, max_value = QUANTIZED_STORAGE_DTYPES[storage]
+    w = weight.detach().float()
+    absmax = w.flatten(start_dim=1).abs().amax(dim=1).clamp(min=1e-12)
+    scale = (absmax / max_value).reshape(-1, *([1] * (w.dim() - 1)))
+    w = w / scale
+    if dtype == torch.int8:
+        w = w.round().clamp(-max_value, max_value)
+    return w.to(dtype), scale.to(weight.dtype)
+
+
+def dequantize_weight(weight, scale, device=None, dtype=None, non_blocking=False):
+    weight = weight.to(device=device, non_blocking=non_blocking)
+    scale = scale.to(device=device, non_blocking=non_blocking)
+    dtype = scale.dtype if dtype is None else dtype
+    return weight.to(dtype) * scale.to(dtype)
+
+
+def quantize_module(m, storage="int8"):
+    """
+    Adds a quantized copy of the weight of an offloaded Linear/Conv module, which cast_bias_weight transfers instead
+    of the weight; returns (before, after) bytes per transfer. m.weight itself is left untouched.
+    """
+    if getattr(m, "weight_scale", None) is not None or getattr(m, "weight", None) is None or m.weight.dim() < 2:
+        return 0, 0
+    before = m.weight.nelement() * m.weight.element_size()
+    q, scale = quantize_weight(m.weight, storage)
+    m.register_buffer("weight_quantized", q, persistent=False)
+    m.register_buffer("weight_scale", scale, persistent=False)
+    return before, q.nelement() * q.element_size() + scale.nelement() * scale.element_size()
+
+
+def dequantize_module(m):
+    """Drops the quantized copy added by quantize_module; the module goes back to casting its own weight."""
+    if getattr(m, "weight_scale", None) is None:
+        return
+    del m.weight_quantized
+    del m.weight_scale
+
+
+def cast_to_input(tensor, input, non_blocking, function=None, scale=None):
+    if scale is not None:
+        tensor = dequantize_weight(tensor, scale, device=input.device, dtype=input.dtype, non_blocking=non_blocking)
+        return tensor if function is None else function(tensor)
+
+    if function is None:
+        return tensor.to(device=input.device, dtype=input.dtype, non_blocking=non_blocking)
+
+    return function(tensor.to(device=input.device, dtype=input.dtype, non_blocking=non_blocking, copy=True))
+
+
 def cast_bias_weight(s, input):
     weight, bias, signal = None, None, None
     non_blocking = ldm_patched.modules.model_management.device_supports_non_blocking(input.device)
+    weight_function = getattr(s, "weight_function", None)
+    bias_function = getattr(s, "bias_function", None)
+    weight_scale = getattr(s, "weight_scale", None)
+    weight = s.weight if weight_scale is None else s.weight_quantized
 
     if stream.using_stream:
         with stream.stream_context()(stream.mover_stream):
             if s.bias is not None:
-                bias = s.bias.to(device=input.device, dtype=input.dtype, non_blocking=non_blocking)
-            weight = s.weight.to(device=input.device, dtype=input.dtype, non_blocking=non_blocking)
+                bias = cast_to_input(s.bias, input, non_blocking, bias_function)
+            weight = cast_to_input(weight, input, non_blocking, weight_function, weight_scale)
             signal = stream.mover_stream.record_event()
     else:
         if s.bias is not None:
-            bias = s.bias.to(device=input.device, dtype=input.dtype, non_blocking=non_blocking)
-        weight = s.weight.to(device=input.device, dtype=input.dtype, non_blocking=non_blocking)
+            bias = cast_to_input(s.bias, input, non_blocking, bias_function)
+        weight = cast_to_input(weight, input, non_blocking, weight_function, weight_scale)
 
     return weight, bias, signal
 
@@ -6,12 +6,13 @@ from ldm_patched.k_diffusion import sampling as k_diffusion_sampling
 from ldm_patched.unipc import uni_pc
 import torch
 import collections
+import threading
 from ldm_patched.modules import model_management
 import math
 import numpy as np
 from scipy import stats
 
-from modules import shared
+from modules import shared, tracing
 
 def get_area_and_mult(conds, x_in, timestep_in):
     area = (x_in.shape[2], x_in.shape[3], 0, 0)
@@ -189,13 +190,18 @@ def calc_cond_uncond_batch(model, cond, uncond, x_in, timestep, model_options):
         to_batch_temp.reverse()
         to_batch = to_batch_temp[:1]
 
-        free_memory = model_management.get_free_memory(x_in.device)
-        for i in range(1, len(to_batch_temp) + 1):
-            batch_amount = to_batch_temp[:len(to_batch_temp)//i]
-            input_shape = [len(batch_amount) * first_shape[0]] + list(first_shape)[1:]
-            if model.memory_required(input_shape) < free_memory:
-                to_batch = batch_amount
-                break
+        if model_options.get('tiled_diffusion', False):
+            # the tiled diffusion wrapper splits the batch into tiles that fit into memory itself,
+            # so cond and uncond always go to it together
+            to_batch = to_batch_temp
+        else:
+            free_memory = model_management.get_free_memory(x_in.device)
+            for i in range(1, len(to_batch_temp) + 1):
+                batch_amount = to_batch_temp[:len(to_batch_temp)//i]
+                input_shape = [len(batch_amount) * first_shape[0]] + list(first_shape)[1:]
+                if model.memory_required(input_shape) < free_memory:
+                    to_batch = batch_amount
+                    break
 
         input_x = []
         mult = []
@@ -249,13 +255,15 @@ def calc_cond_uncond_batch(model, cond, uncond, x_in, timestep, model_options):
                 p.transformer_options = transformer_options
                 p = p.previous_controlnet
             control_cond = c.copy()  # get_control may change items in this dict, so we need to copy it
-            c['control'] = control.get_control(input_x, timestep_, control_cond, len(cond_or_uncond))
+            with tracing.span("control.get_control", batch=batch_chunks):
+                c['control'] = control.get_control(input_x, timestep_, control_cond, len(cond_or_uncond))
             c['control_model'] = control
 
-        if 'model_function_wrapper' in model_options:
-            output = model_options['model_function_wrapper'](model.apply_model, {"input": input_x, "timestep": timestep_, "c": c, "cond_or_uncond": cond_or_uncond}).chunk(batch_chunks)
-        else:
-            output = model.apply_model(input_x, timestep_, **c).chunk(batch_chunks)
+        with tracing.span("apply_model", batch=batch_chunks):
+            if 'model_function_wrapper' in model_options:
+                output = model_options['model_function_wrapper'](model.apply_model, {"input": input_x, "timestep": timestep_, "c": c, "cond_or_uncond": cond_or_uncond}).chunk(batch_chunks)
+            else:
+                output = model.apply_model(input_x, timestep_, **c).chunk(batch_chunks)
         del input_x
 
         for o in range(batch_chunks):
@@ -273,6 +281,23 @@ def calc_cond_uncond_batch(model, cond, uncond, x_in, timestep, model_options):
     del out_uncond_count
     return out_cond, out_uncond
 
+def set_fused_variant(function, fused_function):
+    """
+    Registers fused_function as the in-place variant of a sampler_cfg_function or sampler_post_cfg_function; it is
+    used instead of function while the fused_cfg option is on.
+
+    A fused cfg function gets the same args except "cond" and "uncond" (x minus the predictions, which it would
+    otherwise force to be allocated) and returns denoised rather than x minus denoised. It must not modify
+    args["cond_denoised"] or args["uncond_denoised"]. A fused post cfg function may overwrite args["denoised"].
+    """
+    function.fused = fused_function
+    return function
+
+
+def fused_variant(function):
+    return getattr(function, "fused", None)
+
+
 #The main sampling function shared by all the samplers
 #Returns denoised
 def sampling_function(model, x, timestep, uncond, cond, cond_scale, model_options={}, seed=None):
@@ -286,15 +311,38 @@ def sampling_function(model, x, timestep, uncond, cond, cond_scale, model_option
         uncond_ = uncond
 
     for fn in model_options.get("sampler_pre_cfg_function", []):
-        model, cond, uncond_, x, timestep, model_options = fn(model, cond, uncond_, x, timestep, model_options)
+        with tracing.span("pre_cfg", function=tracing.function_name(fn)):
+            model, cond, uncond_, x, timestep, model_options = fn(model, cond, uncond_, x, timestep, model_options)
 
     if skip_uncond:
-        cond_pred = model(x, timestep, cond=cond, model_options=model_options)
+        with tracing.span("apply_model", batch=1):
+            cond_pred = model(x, timestep, cond=cond, model_options=model_options)
         uncond_pred = None
     else:
         cond_pred, uncond_pred = calc_cond_uncond_batch(model, cond, uncond_, x, timestep, model_options)
 
-    if "sampler_cfg_function" in model_options:
+    post_cfg_functions = model_options.get("sampler_post_cfg_function", [])
+    fused = shared.opts.fused_cfg and uncond_pred is not None
+    fused_cfg_function = fused_variant(model_options["sampler_cfg_function"]) if fused and "sampler_cfg_function" in model_options else None
+
+    if fused_cfg_function is not None:
+        args = {
+            "cond_scale": cond_scale,
+            "timestep": timestep,
+            "input": x,
+            "sigma": timestep,
+            "cond_denoised": cond_pred,
+            "uncond_denoised": uncond_pred,
+            "model": model,
+            "model_options": model_options
+        }
+        with tracing.span("sampler_cfg_function", function=tracing.function_name(fused_cfg_function)):
+            cfg_result = fused_cfg_function(args)
+    elif fused and "sampler_cfg_function" not in model_options:
+        # uncond + (cond - uncond) * scale as a single kernel; the predictions are only needed afterwards by post cfg functions
+        weight = cond_scale if math.isclose(edit_strength, 1.0) else cond_scale * edit_strength
+        cfg_result = torch.lerp(uncond_pred, cond_pred, weight, out=None if post_cfg_functions else cond_pred)
+    elif "sampler_cfg_function" in model_options:
         args = {
             "cond": x - cond_pred,
             "uncond": x - uncond_pred if uncond_pred is not None else None,
@@ -307,7 +355,8 @@ def sampling_function(model, x, timestep, uncond, cond, cond_scale, model_option
             "model": model,
             "model_options": model_options
         }
-        cfg_result = x - model_options["sampler_cfg_function"](args)
+        with tracing.span("sampler_cfg_function", function=tracing.function_name(model_options["sampler_cfg_function"])):
+            cfg_result = x - model_options["sampler_cfg_function"](args)
     elif skip_uncond:
         cfg_result = cond_pred
     elif not math.isclose(edit_strength, 1.0):
@@ -315,7 +364,10 @@ def sampling_function(model, x, timestep, uncond, cond, cond_scale, model_option
     else:
         cfg_result = uncond_pred + (cond_pred - uncond_pred) * cond_scale
 
-    for fn in model_options.get("sampler_post_cfg_function", []):
+    for fn in post_cfg_functions:
+        if fused and fused_variant(fn) is not None and cfg_result is not cond_pred and cfg_result is not uncond_pred:
+            fn = fused_variant(fn)
+
         args = {
             "denoised": cfg_result,
             "cond": cond,
@@ -328,7 +380,8 @@ def sampling_function(model, x, timestep, uncond, cond, cond_scale, model_option
             "model_options": model_options,
             "input": x
         }
-        cfg_result = fn(args)
+        with tracing.span("post_cfg", function=tracing.function_name(fn)):
+            cfg_result = fn(args)
 
     return cfg_result
 
@@ -853,7 +906,84 @@ def sample(model, noise, positive, negative, cfg, device, sampler, sigmas, model
 SCHEDULER_NAMES = ["normal", "karras", "exponential", "sgm_uniform", "simple", "ddim_uniform", "ays", "ays_gits", "ays_11steps", "ays_32steps", "kl_optimal", "beta", "cosine", "cosexpblend", "phi", "laplace", "karras_dynamic", "sinusoidal_sf", "invcosinusoidal_sf", "react_cosinusoidal_dynsf"]
 SAMPLER_NAMES = KSAMPLER_NAMES + ["ddim", "uni_pc", "uni_pc_bh2"]
 
-def calculate_sigmas_scheduler(model, scheduler_name, steps, is_sdxl=False):
+# options read by the schedulers above; a change to any of them changes the schedule
+SCHEDULER_OPTION_NAMES = [
+    "reforge_normal_sgm", "reforge_beta_dist_alpha", "reforge_beta_dist_beta", "reforge_karras_rho",
+    "reforge_exponential_shrink_factor", "reforge_polyexponential_rho", "reforge_ays_custom_sigmas",
+    "reforge_cosine_sf_factor", "reforge_cosexpblend_exp_decay", "reforge_phi_power", "reforge_laplace_mu",
+    "reforge_laplace_beta", "reforge_karras_dynamic_rho", "reforge_sinusoidal_sf_factor",
+    "reforge_invcosinusoidal_sf_factor", "reforge_react_cosinusoidal_dynsf_factor",
+]
+
+schedule_cache = collections.OrderedDict()
+schedule_cache_lock = threading.Lock()
+schedule_cache_size = 256
+
+
+def model_sampling_key(model_sampling):
+    """identifies a model_sampling by content: its class, plain attributes and buffers (sigmas, log_sigmas),
+    so schedules are shared between models with the same sampling and recomputed when ZTSNR or a
+    ModelSampling patch changes the sigmas"""
+    attributes = tuple(sorted((k, v) for k, v in vars(model_sampling).items() if not k.startswith('_') and isinstance(v, (bool, int, float, str))))
+    buffers = tuple((name, hash(buffer.detach().float().cpu().numpy().tobytes())) for name, buffer in model_sampling.named_buffers())
+    return type(model_sampling).__name__, attributes, buffers
+
+
+def schedule_key(model, scheduler_name, steps, is_sdxl=False):
+    options = tuple(str(getattr(shared.opts, name, None)) for name in SCHEDULER_OPTION_NAMES)
+    return model_sampling_key(model.model_sampling), scheduler_name, int(steps), bool(is_sdxl), options
+
+
+def calculate_sigmas_scheduler(model, scheduler_name, steps, is_sdxl=False, device='cpu'):
+    """
+    Returns the sigmas of scheduler_name for steps steps, on device. Schedules are memoised by schedule_key and
+    kept once per device; every call gets its own copy, so callers are free to modify the returned tensor.
+    """
+    key = schedule_key(model, scheduler_name, steps, is_sdxl)
+    device = str(torch.device(device))
+
+    with schedule_cache_lock:
+        per_device = schedule_cache.get(key)
+        if per_device is not None:
+            schedule_cache.move_to_end(key)
+
+    if per_device is None:
+        sigmas = compute_sigmas_scheduler(model, scheduler_name, steps, is_sdxl=is_sdxl)
+        if sigmas is None:
+            return None
+
+        per_device = {'cpu': sigmas.detach().cpu()}
+        with schedule_cache_lock:
+            schedule_cache[key] = per_device
+            while len(schedule_cache) > schedule_cache_size:
+                schedule_cache.popitem(last=False)
+
+    sigmas = per_device.get(device)
+    if sigmas is None:
+        sigmas = per_device[device] = per_device['cpu'].to(device)
+
+    return sigmas.clone()
+
+
+def list_schedules():
+    """(scheduler name, steps, is_sdxl) of every memoised schedule, least recently used first"""
+    with schedule_cache_lock:
+        return [(scheduler_name, steps, is_sdxl) for _, scheduler_name, steps, is_sdxl, _ in schedule_cache]
+
+
+def precompute_schedules(model, scheduler_names=None, steps=(20, 30), is_sdxl=False, device='cpu'):
+    """fills the schedule cache for every combination of scheduler_names (all by default) and steps"""
+    for scheduler_name in scheduler_names or SCHEDULER_NAMES:
+        for n in steps:
+            calculate_sigmas_scheduler(model, scheduler_name, n, is_sdxl=is_sdxl, device=device)
+
+
+def clear_schedules():
+    with schedule_cache_lock:
+        schedule_cache.clear()
+
+
+def compute_sigmas_scheduler(model, scheduler_name, steps, is_sdxl=False):
     sigma_min = float(model.model_sampling.sigma_min)
     sigma_max = float(model.model_sampling.sigma_max)
 
@@ -942,7 +1072,7 @@ class KSampler:
             steps += 1
             discard_penultimate_sigma = True
 
-        sigmas = calculate_sigmas_scheduler(self.model, self.scheduler, steps)
+        sigmas = calculate_sigmas_scheduler(self.model, self.scheduler, steps, device=self.device)
 
         if discard_penultimate_sigma:
             sigmas = torch.cat([sigmas[:-2], sigmas[-1:]])
@@ -12,12 +12,13 @@ from io import BytesIO
 from fastapi import APIRouter, Depends, FastAPI, Request, Response
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi.exceptions import HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.encoders import jsonable_encoder
 from secrets import compare_digest
 
 import modules.shared as shared
-from modules import sd_samplers, deepbooru, sd_hijack, images, scripts, ui, postprocessing, errors, restart, shared_items, script_callbacks, infotext_utils, sd_models, sd_schedulers
+from modules import sd_samplers, deepbooru, sd_hijack, images, scripts, initialize, postprocessing, errors, restart, shared_items, script_callbacks, infotext_utils, sd_models, sd_schedulers, metrics, output_catalog
+from modules.paths_internal import default_output_dir
 from modules.api import models
 from modules.shared import opts
 from modules.processing import StableDiffusionProcessingTxt2Img, StableDiffusionProcessingImg2Img, process_images
@@ -215,6 +216,7 @@ class Api:
         self.add_api_route("/sdapi/v1/png-info", self.pnginfoapi, methods=["POST"], response_model=models.PNGInfoResponse)
         self.add_api_route("/sdapi/v1/progress", self.progressapi, methods=["GET"], response_model=models.ProgressResponse)
         self.add_api_route("/sdapi/v1/interrogate", self.interrogateapi, methods=["POST"])
+        self.add_api_route("/sdapi/v1/interrogate/batch", self.interrogatebatchapi, methods=["POST"], response_model=models.InterrogateBatchResponse)
         self.add_api_route("/sdapi/v1/interrupt", self.interruptapi, methods=["POST"])
         self.add_api_route("/sdapi/v1/skip", self.skip, methods=["POST"])
         self.add_api_route("/sdapi/v1/options", self.get_config, methods=["GET"], response_model=models.OptionsModel)
@@ -244,14 +246,27 @@ class Api:
         self.add_api_route("/sdapi/v1/scripts", self.get_scripts_list, methods=["GET"], response_model=models.ScriptsList)
         self.add_api_route("/sdapi/v1/script-info", self.get_script_info, methods=["GET"], response_model=list[models.ScriptInfo])
         self.add_api_route("/sdapi/v1/extensions", self.get_extensions_list, methods=["GET"], response_model=list[models.ExtensionItem])
+        self.add_api_route("/metrics", self.get_metrics, methods=["GET"], response_class=PlainTextResponse)
 
         if shared.cmd_opts.api_server_stop:
             self.add_api_route("/sdapi/v1/server-kill", self.kill_webui, methods=["POST"])
             self.add_api_route("/sdapi/v1/server-restart", self.restart_webui, methods=["POST"])
             self.add_api_route("/sdapi/v1/server-stop", self.stop_webui, methods=["POST"])
 
+        self.add_api_route("/sdapi/v1/startup", self.get_startup, methods=["GET"], response_model=models.StartupResponse)
+        self.add_api_route("/sdapi/v1/catalog/images", self.get_catalog_images, methods=["GET"], response_model=models.CatalogResponse)
+        self.add_api_route("/sdapi/v1/catalog/import", self.import_catalog, methods=["POST"], response_model=models.CatalogImportResponse)
+
         self.default_script_arg_txt2img = []
         self.default_script_arg_img2img = []
+        self.script_runners_lock = Lock()
+        self.script_runners_initialized = False
+
+        if not shared.cmd_opts.api_fast_startup:
+            self.init_script_runners()
+
+    def init_script_runners(self):
+        from modules import ui
 
         txt2img_script_runner = scripts.scripts_txt2img
         img2img_script_runner = scripts.scripts_img2img
@@ -269,7 +284,18 @@ class Api:
         if not self.default_script_arg_img2img:
             self.default_script_arg_img2img = self.init_default_script_args(img2img_script_runner)
 
+        self.script_runners_initialized = True
 
+    def ensure_initialized(self):
+        """With --api-fast-startup, finishes loading scripts and builds their default arguments on first use."""
+        if not shared.cmd_opts.api_fast_startup:
+            return
+
+        initialize.initialize_deferred(self.app)
+
+        with self.script_runners_lock:
+            if not self.script_runners_initialized:
+                self.init_script_runners()
 
     def add_api_route(self, path: str, endpoint, **kwargs):
         if shared.cmd_opts.api_auth:
@@ -292,12 +318,16 @@ class Api:
         return script, script_idx
 
     def get_scripts_list(self):
+        self.ensure_initialized()
+
         t2ilist = [script.name for script in scripts.scripts_txt2img.scripts if script.name is not None]
         i2ilist = [script.name for script in scripts.scripts_img2img.scripts if script.name is not None]
 
         return models.ScriptsList(txt2img=t2ilist, img2img=i2ilist)
 
     def get_script_info(self):
+        self.ensure_initialized()
+
         res = []
 
         for script_list in [scripts.scripts_txt2img.scripts, scripts.scripts_img2img.scripts]:
@@ -430,6 +460,8 @@ class Api:
         return params
 
     def text2imgapi(self, txt2imgreq: models.StableDiffusionTxt2ImgProcessingAPI):
+        self.ensure_initialized()
+
         task_id = txt2imgreq.force_task_id or create_task_id("txt2img")
 
         script_runner = scripts.scripts_txt2img
@@ -490,6 +522,8 @@ class Api:
         return models.TextToImageResponse(images=b64images, parameters=vars(txt2imgreq), info=processed.js())
 
     def img2imgapi(self, img2imgreq: models.StableDiffusionImg2ImgProcessingAPI):
+        self.ensure_initialized()
+
         task_id = img2imgreq.force_task_id or create_task_id("img2img")
 
         init_images = img2imgreq.init_images
@@ -565,6 +599,8 @@ class Api:
         return models.ImageToImageResponse(images=b64images, parameters=vars(img2imgreq), info=processed.js())
 
     def extras_single_image_api(self, req: models.ExtrasSingleImageRequest):
+        self.ensure_initialized()
+
         reqDict = setUpscalers(req)
 
         reqDict['image'] = decode_base64_to_image(reqDict['image'])
@@ -575,6 +611,8 @@ class Api:
         return models.ExtrasSingleImageResponse(image=encode_pil_to_base64(result[0][0]), html_info=result[1])
 
     def extras_batch_images_api(self, req: models.ExtrasBatchImagesRequest):
+        self.ensure_initialized()
+
         reqDict = setUpscalers(req)
 
         image_list = reqDict.pop('imageList', [])
@@ -646,6 +684,21 @@ class Api:
 
         return models.InterrogateResponse(caption=processed)
 
+    def interrogatebatchapi(self, interrogatereq: models.InterrogateBatchRequest):
+        if interrogatereq.model == "clip":
+            interrogate_batch = shared.interrogator.interrogate_batch
+        elif interrogatereq.model == "deepdanbooru":
+            interrogate_batch = deepbooru.model.tag_batch
+        else:
+            raise HTTPException(status_code=404, detail="Model not found")
+
+        imgs = [decode_base64_to_image(x).convert('RGB') for x in interrogatereq.images]
+
+        with self.queue_lock:
+            processed = interrogate_batch(imgs, batch_size=interrogatereq.batch_size or None)
+
+        return models.InterrogateBatchResponse(captions=processed)
+
     def interruptapi(self):
         shared.state.interrupt()
 
@@ -704,6 +757,7 @@ class Api:
             for scheduler in sd_schedulers.schedulers]
 
     def get_upscalers(self):
+        self.ensure_initialized()
         return [
             {
                 "name": upscaler.name,
@@ -735,6 +789,7 @@ class Api:
         return [{"name": name, "path": shared.hypernetworks[name]} for name in shared.hypernetworks]
 
     def get_face_restorers(self):
+        self.ensure_initialized()
         return [{"name":x.name(), "cmd_dir": getattr(x, "cmd_dir", None)} for x in shared.face_restorers]
 
     def get_realesrgan_models(self):
@@ -848,6 +903,30 @@ class Api:
         finally:
             shared.state.end()
 
+    def get_startup(self):
+        from modules import timer
+        record = timer.startup_record or timer.startup_timer.dump()
+        return models.StartupResponse(total=record["total"], records=record["records"], deferred_done=initialize.deferred_done or not shared.cmd_opts.api_fast_startup)
+
+    def get_catalog_images(self, query: str = None, seed: int = None, model: str = None, lora: str = None, sha256: str = None, offset: int = 0, limit: int = 50):
+        limit = max(0, min(limit, 1000))
+        try:
+            total, items = output_catalog.catalog().search(query=query, seed=seed, model=model, lora=lora, sha256=sha256, offset=max(0, offset), limit=limit)
+        except output_catalog.sqlite3.OperationalError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid query: {e}") from e
+
+        return models.CatalogResponse(total=total, offset=offset, items=items)
+
+    def import_catalog(self, req: models.CatalogImportRequest):
+        path = os.path.abspath(req.path)
+        output_dirs = {os.path.abspath(default_output_dir)} | {os.path.abspath(getattr(opts, name)) for name in shared.restricted_opts if name.startswith("outdir_") and getattr(opts, name, None)}
+        if not any(os.path.commonpath([path, output_dir]) == output_dir for output_dir in output_dirs if os.path.splitdrive(path)[0] == os.path.splitdrive(output_dir)[0]):
+            raise HTTPException(status_code=403, detail="Only output directories can be imported")
+        if not os.path.isdir(path):
+            raise HTTPException(status_code=404, detail="Directory not found")
+
+        return models.CatalogImportResponse(**output_catalog.catalog().import_directory(path, workers=req.workers, recursive=req.recursive))
+
     def get_memory(self):
         try:
             import os
@@ -883,6 +962,9 @@ class Api:
             cuda = {'error': f'{err}'}
         return models.MemoryResponse(ram=ram, cuda=cuda)
 
+    def get_metrics(self):
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
     def get_extensions_list(self):
         from modules import extensions
         extensions.list_extensions()
@@ -200,6 +200,14 @@ class InterrogateRequest(BaseModel):
 class InterrogateResponse(BaseModel):
     caption: str = Field(default=None, title="Caption", description="The generated caption for the image.")
 
+class InterrogateBatchRequest(BaseModel):
+    images: list[str] = Field(default=[], title="Images", description="Images to work on, each must be a Base64 string containing the image's data.")
+    model: str = Field(default="clip", title="Model", description="The interrogate model used.")
+    batch_size: int = Field(default=0, title="Batch size", description="Images per forward pass; 0 uses the interrogate batch size setting.")
+
+class InterrogateBatchResponse(BaseModel):
+    captions: list[str] = Field(default=[], title="Captions", description="The generated captions, in the order of the input images.")
+
 class TrainResponse(BaseModel):
     info: str = Field(title="Train info", description="Response string from train embedding or hypernetwork task.")
 
@@ -294,6 +302,46 @@ class EmbeddingsResponse(BaseModel):
     loaded: dict[str, EmbeddingItem] = Field(title="Loaded", description="Embeddings loaded for the current model")
     skipped: dict[str, EmbeddingItem] = Field(title="Skipped", description="Embeddings skipped for the current model (likely due to architecture incompatibility)")
 
+class StartupResponse(BaseModel):
+    total: float = Field(title="Total", description="Seconds spent in startup so far")
+    records: dict[str, float] = Field(title="Records", description="Seconds spent in each startup step; nested steps are named category/step")
+    deferred_done: bool = Field(title="Deferred done", description="Whether scripts, upscalers and face restoration have finished loading; always true without --api-fast-startup")
+
+class CatalogItem(BaseModel):
+    path: str = Field(title="Path", description="Absolute path of the image file")
+    mtime: Optional[float] = Field(title="Modified", description="Modification time of the file when it was cataloged")
+    size: Optional[int] = Field(title="Size", description="File size in bytes")
+    sha256: Optional[str] = Field(title="SHA256", description="SHA256 of the file contents")
+    width: Optional[int] = Field(title="Width")
+    height: Optional[int] = Field(title="Height")
+    prompt: Optional[str] = Field(title="Prompt")
+    negative_prompt: Optional[str] = Field(title="Negative prompt")
+    seed: Optional[int] = Field(title="Seed")
+    steps: Optional[int] = Field(title="Steps")
+    sampler: Optional[str] = Field(title="Sampler")
+    cfg_scale: Optional[float] = Field(title="CFG scale")
+    model: Optional[str] = Field(title="Model")
+    model_hash: Optional[str] = Field(title="Model hash")
+    loras: Optional[str] = Field(title="LoRAs", description="Space separated LoRA names from the prompt and Lora hashes")
+    infotext: Optional[str] = Field(title="Infotext")
+    parameters: Optional[str] = Field(title="Parameters", description="All parameters parsed from the infotext, as JSON")
+
+class CatalogResponse(BaseModel):
+    total: int = Field(title="Total", description="Number of images matching the query")
+    offset: int = Field(title="Offset")
+    items: list[CatalogItem] = Field(title="Items", description="Matching images from offset on, newest first")
+
+class CatalogImportRequest(BaseModel):
+    path: str = Field(title="Path", description="Directory to add; must be inside one of the output directories")
+    recursive: bool = Field(default=True, title="Recursive", description="Also add images in subdirectories")
+    workers: int = Field(default=8, title="Workers", description="Number of threads reading files")
+
+class CatalogImportResponse(BaseModel):
+    scanned: int = Field(title="Scanned", description="Number of image files found")
+    added: int = Field(title="Added", description="Number of new or changed images added")
+    unchanged: int = Field(title="Unchanged", description="Number of images already in the catalog")
+    failed: int = Field(title="Failed", description="Number of images that could not be read")
+
 class MemoryResponse(BaseModel):
     ram: dict = Field(title="RAM", description="System memory stats")
     cuda: dict = Field(title="CUDA", description="nVidia CUDA memory stats")
@@ -44,7 +44,7 @@ class FaceRestorerCodeFormer(face_restoration_utils.CommonFaceRestoration):
     def get_device(self):
         return devices.device_codeformer
 
-    def restore(self, np_image, w: float | None = None):
+    def make_restore_face(self, w: float | None = None):
         if w is None:
             w = getattr(shared.opts, "code_former_weight", 0.5)
 
@@ -52,7 +52,13 @@ class FaceRestorerCodeFormer(face_restoration_utils.CommonFaceRestoration):
             assert self.net is not None
             return self.net(cropped_face_t, weight=w, adain=True)[0]
 
-        return self.restore_with_helper(np_image, restore_face)
+        return restore_face
+
+    def restore(self, np_image, w: float | None = None):
+        return self.restore_with_helper(np_image, self.make_restore_face(w))
+
+    def restore_batch(self, np_images, w: float | None = None):
+        return self.restore_batch_with_helper(np_images, self.make_restore_face(w))
 
 
 def setup_model(dirname: str) -> None:
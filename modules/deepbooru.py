@@ -4,7 +4,7 @@ import re
 import torch
 import numpy as np
 
-from modules import modelloader, paths, deepbooru_model, images, shared
+from modules import modelloader, paths, deepbooru_model, images, shared, interrogate
 from ldm_patched.modules import model_management
 from ldm_patched.modules.model_patcher import ModelPatcher
 
@@ -57,20 +57,53 @@ class DeepDanbooru:
 
         return res
 
+    def tag_batch(self, pil_images, force_disable_ranks=False, batch_size=None):
+        """Tags a list of PIL images or file paths with the model kept loaded; images are resized on a thread pool."""
+        res = []
+        shared.state.begin(job="deepbooru")
+        try:
+            self.start()
+
+            batch_size = batch_size or interrogate.batch_size_for(self.load_device, 160 * 1024 * 1024)
+            shared.state.job_count = (len(pil_images) + batch_size - 1) // batch_size
+
+            for _, arrays in interrogate.prefetch_batches(pil_images, self.preprocess, batch_size):
+                if shared.state.interrupted:
+                    break
+
+                with torch.no_grad():
+                    x = torch.from_numpy(np.stack(arrays)).to(self.load_device, self.dtype)
+                    y = self.model(x).detach().cpu().numpy()
+
+                res += [self.format_tags(probabilities, force_disable_ranks) for probabilities in y]
+
+                shared.state.nextjob()
+        finally:
+            self.stop()
+            shared.state.end()
+
+        return res
+
+    def preprocess(self, pil_image):
+        pic = images.resize_image(2, interrogate.open_image(pil_image), 512, 512)
+        return np.array(pic, dtype=np.float32) / 255
+
     def tag_multi(self, pil_image, force_disable_ranks=False):
+        a = np.expand_dims(self.preprocess(pil_image), 0)
+
+        with torch.no_grad():
+            x = torch.from_numpy(a).to(self.load_device, self.dtype)
+            y = self.model(x)[0].detach().cpu().numpy()
+
+        return self.format_tags(y, force_disable_ranks)
+
+    def format_tags(self, y, force_disable_ranks=False):
         threshold = shared.opts.interrogate_deepbooru_score_threshold
         use_spaces = shared.opts.deepbooru_use_spaces
         use_escape = shared.opts.deepbooru_escape
         alpha_sort = shared.opts.deepbooru_sort_alpha
         include_ranks = shared.opts.interrogate_return_ranks and not force_disable_ranks
 
-        pic = images.resize_image(2, pil_image.convert("RGB"), 512, 512)
-        a = np.expand_dims(np.array(pic, dtype=np.float32), 0) / 255
-
-        with torch.no_grad():
-            x = torch.from_numpy(a).to(self.load_device, self.dtype)
-            y = self.model(x)[0].detach().cpu().numpy()
-
         probability_dict = {}
 
         for tag, probability in zip(self.model.tags, y):
@@ -45,12 +45,28 @@ class ExtensionMetadata:
         self.config = configparser.ConfigParser()
 
         filepath = os.path.join(path, self.filename)
-        # `self.config.read()` will quietly swallow OSErrors (which FileNotFoundError is),
-        # so no need to check whether the file exists beforehand.
+
+        def read_config():
+            config = configparser.ConfigParser()
+
+            # `config.read()` will quietly swallow OSErrors (which FileNotFoundError is),
+            # so no need to check whether the file exists beforehand.
+            try:
+                config.read(filepath)
+            except Exception:
+                errors.report(f"Error reading {self.filename} for extension {canonical_name}.", exc_info=True)
+
+            return {section: dict(config.items(section, raw=True)) for section in config.sections()}
+
+        # the index entry is invalidated by the mtime of metadata.ini, or of the extension's directory
+        # if there is none, which changes when metadata.ini is added or removed
         try:
-            self.config.read(filepath)
+            sections = cache.cached_data_for_file('extensions-metadata', path, filepath if os.path.isfile(filepath) else path, read_config)
         except Exception:
-            errors.report(f"Error reading {self.filename} for extension {canonical_name}.", exc_info=True)
+            errors.report(f"Error reading cached {self.filename} for extension {canonical_name}.", exc_info=True)
+            sections = read_config()
+
+        self.config.read_dict(sections or {})
 
         self.canonical_name = self.config.get("Extension", "Name", fallback=canonical_name)
         self.canonical_name = canonical_name.lower().strip()
@@ -66,9 +66,8 @@ def restore_with_face_helper(
 
     `restore_face` should take a cropped face image and return a restored face image.
     """
-    from torchvision.transforms.functional import normalize
-    np_image = np_image[:, :, ::-1]
     original_resolution = np_image.shape[0:2]
+    np_image = np_image[:, :, ::-1]
 
     try:
         logger.debug("Detecting faces...")
@@ -77,40 +76,115 @@ def restore_with_face_helper(
         face_helper.get_face_landmarks_5(only_center_face=False, resize=640, eye_dist_threshold=5)
         face_helper.align_warp_face()
         logger.debug("Found %d faces, restoring", len(face_helper.cropped_faces))
+        restored_faces = []
         for cropped_face in face_helper.cropped_faces:
-            cropped_face_t = bgr_image_to_rgb_tensor(cropped_face / 255.0)
-            normalize(cropped_face_t, (0.5, 0.5, 0.5), (0.5, 0.5, 0.5), inplace=True)
-            cropped_face_t = cropped_face_t.unsqueeze(0).to(devices.device_codeformer)
+            cropped_face_t = face_to_tensor(cropped_face).unsqueeze(0).to(devices.device_codeformer)
 
             try:
                 with torch.no_grad():
                     cropped_face_t = restore_face(cropped_face_t)
-                devices.torch_gc()
             except Exception:
                 errors.report('Failed face-restoration inference', exc_info=True)
 
             restored_face = rgb_tensor_to_bgr_image(cropped_face_t, min_max=(-1, 1))
-            restored_face = (restored_face * 255.0).astype('uint8')
-            face_helper.add_restored_face(restored_face)
+            restored_faces.append((restored_face * 255.0).astype('uint8'))
+
+        devices.torch_gc()
 
         logger.debug("Merging restored faces into image")
-        face_helper.get_inverse_affine(None)
-        img = face_helper.paste_faces_to_input_image()
-        img = img[:, :, ::-1]
-        if original_resolution != img.shape[0:2]:
-            img = cv2.resize(
-                img,
-                (0, 0),
-                fx=original_resolution[1] / img.shape[1],
-                fy=original_resolution[0] / img.shape[0],
-                interpolation=cv2.INTER_LINEAR,
-            )
+        img = paste_restored_faces(face_helper, restored_faces, original_resolution)
         logger.debug("Face restoration complete")
     finally:
         face_helper.clean_all()
     return img
 
 
+face_helper_state_fields = ('input_img', 'all_landmarks_5', 'det_faces', 'affine_matrices', 'cropped_faces')
+
+
+def face_to_tensor(cropped_face: np.ndarray) -> torch.Tensor:
+    from torchvision.transforms.functional import normalize
+    cropped_face_t = bgr_image_to_rgb_tensor(cropped_face / 255.0)
+    normalize(cropped_face_t, (0.5, 0.5, 0.5), (0.5, 0.5, 0.5), inplace=True)
+    return cropped_face_t
+
+
+def paste_restored_faces(face_helper: FaceRestoreHelper, restored_faces, original_resolution) -> np.ndarray:
+    for restored_face in restored_faces:
+        face_helper.add_restored_face(restored_face)
+
+    face_helper.get_inverse_affine(None)
+    img = face_helper.paste_faces_to_input_image()
+    img = img[:, :, ::-1]
+    if original_resolution != img.shape[0:2]:
+        img = cv2.resize(
+            img,
+            (0, 0),
+            fx=original_resolution[1] / img.shape[1],
+            fy=original_resolution[0] / img.shape[0],
+            interpolation=cv2.INTER_LINEAR,
+        )
+    return img
+
+
+def restore_with_face_helper_batch(
+    np_images: list[np.ndarray],
+    face_helper: FaceRestoreHelper,
+    restore_face: Callable[[torch.Tensor], torch.Tensor],
+    batch_size: int,
+) -> list[np.ndarray]:
+    """
+    Batched version of restore_with_face_helper.
+
+    Faces are detected in every image first, then all aligned crops are restored together in batches of
+    `batch_size`, and finally the restored faces are pasted back into their own images.
+    """
+    states = []
+    faces = []
+
+    try:
+        logger.debug("Detecting faces in %d images...", len(np_images))
+        for np_image in np_images:
+            face_helper.clean_all()
+            face_helper.read_image(np_image[:, :, ::-1])
+            face_helper.get_face_landmarks_5(only_center_face=False, resize=640, eye_dist_threshold=5)
+            face_helper.align_warp_face()
+            states.append({k: getattr(face_helper, k) for k in face_helper_state_fields})
+            faces += face_helper.cropped_faces
+
+        logger.debug("Found %d faces, restoring in batches of %d", len(faces), batch_size)
+        restored_faces = []
+        for i in range(0, len(faces), batch_size):
+            batch = torch.stack([face_to_tensor(x) for x in faces[i:i + batch_size]]).to(devices.device_codeformer)
+
+            try:
+                with torch.no_grad():
+                    batch = restore_face(batch)
+            except Exception:
+                errors.report('Failed face-restoration inference', exc_info=True)
+
+            for restored_face in batch.float().cpu():
+                restored_face = rgb_tensor_to_bgr_image(restored_face, min_max=(-1, 1))
+                restored_faces.append((restored_face * 255.0).astype('uint8'))
+
+        devices.torch_gc()
+
+        logger.debug("Merging restored faces into images")
+        results = []
+        for np_image, state in zip(np_images, states):
+            face_helper.clean_all()
+            for k, v in state.items():
+                setattr(face_helper, k, v)
+
+            count = len(state['cropped_faces'])
+            results.append(paste_restored_faces(face_helper, restored_faces[:count], np_image.shape[0:2]))
+            restored_faces = restored_faces[count:]
+    finally:
+        face_helper.clean_all()
+
+    return results
+
+
 class CommonFaceRestoration(face_restoration.FaceRestoration):
     net: torch.Module | None
     model_url: str
@@ -161,6 +235,28 @@ class CommonFaceRestoration(face_restoration.FaceRestoration):
             if shared.opts.face_restoration_unload:
                 self.send_model_to(devices.cpu)
 
+    def restore_batch_with_helper(
+        self,
+        np_images: list[np.ndarray],
+        restore_face: Callable[[torch.Tensor], torch.Tensor],
+    ) -> list[np.ndarray]:
+        try:
+            if self.net is None:
+                self.net = self.load_net()
+        except Exception:
+            logger.warning("Unable to load face-restoration model", exc_info=True)
+            return np_images
+
+        batch_size = max(1, getattr(shared.opts, "face_restoration_batch_size", 8))
+
+        try:
+            prepare_free_memory()
+            self.send_model_to(self.get_device())
+            return restore_with_face_helper_batch(np_images, self.face_helper, restore_face, batch_size)
+        finally:
+            if shared.opts.face_restoration_unload:
+                self.send_model_to(devices.cpu)
+
 
 def patch_facexlib(dirname: str) -> None:
     import facexlib.detection
@@ -43,12 +43,15 @@ class FaceRestorerGFPGAN(face_restoration_utils.CommonFaceRestoration):
                 ).model
         raise ValueError("No GFPGAN model found")
 
+    def restore_face(self, cropped_face_t):
+        assert self.net is not None
+        return self.net(cropped_face_t, return_rgb=False)[0]
+
     def restore(self, np_image):
-        def restore_face(cropped_face_t):
-            assert self.net is not None
-            return self.net(cropped_face_t, return_rgb=False)[0]
+        return self.restore_with_helper(np_image, self.restore_face)
 
-        return self.restore_with_helper(np_image, restore_face)
+    def restore_batch(self, np_images):
+        return self.restore_batch_with_helper(np_images, self.restore_face)
 
 
 def gfpgan_fix_faces(np_image):
@@ -3,6 +3,7 @@ from modules import modelloader, devices, errors
 from modules.shared import opts, cmd_opts
 from modules.upscaler import Upscaler, UpscalerData
 from modules.upscaler_utils import upscale_with_model
+from modules_forge import upscaler_pool
 
 
 class UpscalerGRL(Upscaler):
@@ -23,7 +24,6 @@ class UpscalerGRL(Upscaler):
         except Exception:
             errors.report(f"Unable to load GRL model {selected_model}", exc_info=True)
             return img
-        model.to(devices.device_grl)
         return grl_upscale(model, img)
 
     def load_model(self, path: str):
@@ -31,9 +31,9 @@ class UpscalerGRL(Upscaler):
             raise FileNotFoundError(f"Model file {path} not found")
         else:
             filename = path
-        return modelloader.load_spandrel_model(
+        return upscaler_pool.load_model(
             filename,
-            device=('cpu' if devices.device_grl.type == 'mps' else None),
+            device=devices.device_grl,
             prefer_half=(not cmd_opts.no_half and not cmd_opts.upcast_sampling),
             expected_architecture='GRL',
         )
@@ -1,7 +1,7 @@
 import hashlib
 import os.path
 
-from modules import shared
+from modules import shared, metrics
 import modules.cache
 
 dump_cache = modules.cache.dump_cache
@@ -42,6 +42,7 @@ def sha256(filename, title, use_addnet_hash=False):
     hashes = cache("hashes-addnet") if use_addnet_hash else cache("hashes")
 
     sha256_value = sha256_from_cache(filename, title, use_addnet_hash)
+    metrics.cache_hit("hashes", sha256_value is not None)
     if sha256_value is not None:
         return sha256_value
 
@@ -537,7 +537,7 @@ def train_hypernetwork(id_task, hypernetwork_name: str, learn_rate: float, batch
 
     latent_sampling_method = ds.latent_sampling_method
 
-    dl = modules.textual_inversion.dataset.PersonalizedDataLoader(ds, latent_sampling_method=latent_sampling_method, batch_size=ds.batch_size, pin_memory=pin_memory)
+    dl = modules.textual_inversion.dataset.PersonalizedDataLoader(ds, latent_sampling_method=latent_sampling_method, batch_size=ds.batch_size, pin_memory=pin_memory, num_workers=shared.opts.training_dataloader_workers)
 
     old_parallel_processing_allowed = shared.parallel_processing_allowed
 
@@ -21,7 +21,7 @@ import string
 import json
 import hashlib
 
-from modules import sd_samplers, shared, script_callbacks, errors
+from modules import sd_samplers, shared, script_callbacks, errors, metrics, sequence_numbers, output_catalog
 from modules.paths_internal import roboto_ttf_file
 from modules.shared import opts
 
@@ -558,20 +558,18 @@ def get_next_sequence_number(path, basename):
 
     The sequence starts at 0.
     """
-    result = -1
-    if basename != '':
-        basename = f"{basename}-"
-
-    prefix_length = len(basename)
-    for p in os.listdir(path):
-        if p.startswith(basename):
-            parts = os.path.splitext(p[prefix_length:])[0].split('-')  # splits the filename (removing the basename first if one is defined, so the sequence number is always the first element)
-            try:
-                result = max(int(parts[0]), result)
-            except ValueError:
-                pass
+    return sequence_numbers.scan(path, basename)
+
+
+def allocate_sequence_number(path, basename):
+    """
+    Like get_next_sequence_number, but reserves the number, so consecutive calls return different numbers. Unless
+    the save_images_sequence_index option is "Scan directory", the directory is only scanned the first time.
+    """
+    if opts.save_images_sequence_index == "Scan directory":
+        return get_next_sequence_number(path, basename)
 
-    return result + 1
+    return sequence_numbers.allocate(path, basename, persist=opts.save_images_sequence_index == "Memory and file")
 
 
 def save_image_with_geninfo(image, geninfo, filename, extension=None, existing_pnginfo=None, pnginfo_section_name='parameters'):
@@ -633,6 +631,7 @@ def save_image_with_geninfo(image, geninfo, filename, extension=None, existing_p
         image.save(filename, format=image_format, quality=opts.jpeg_quality)
 
 
+@metrics.timed("save")
 def save_image(image, path, basename, seed=None, prompt=None, extension='png', info=None, short_filename=False, no_prompt=False, grid=False, pnginfo_section_name='parameters', p=None, existing_info=None, forced_filename=None, suffix="", save_to_dirs=None):
     """Save an image.
 
@@ -698,13 +697,16 @@ def save_image(image, path, basename, seed=None, prompt=None, extension='png', i
             file_decoration = f"-{file_decoration}"
 
         if add_number:
-            basecount = get_next_sequence_number(path, basename)
+            basecount = allocate_sequence_number(path, basename)
             fullfn = None
             for i in range(500):
                 fn = f"{basecount + i:05}" if basename == '' else f"{basename}-{basecount + i:04}"
                 fullfn = os.path.join(path, f"{fn}{file_decoration}.{extension}")
                 if not os.path.exists(fullfn):
                     break
+
+            if i > 0 and opts.save_images_sequence_index != "Scan directory":
+                sequence_numbers.mark_used(path, basename, basecount + i, persist=opts.save_images_sequence_index == "Memory and file")
         else:
             fullfn = os.path.join(path, f"{file_decoration}.{extension}")
     else:
@@ -737,13 +739,21 @@ def save_image(image, path, basename, seed=None, prompt=None, extension='png', i
                 filename = f"{filename_without_extension}-{n}{extension}"
         os.replace(temp_file_path, filename)
 
+        return filename
+
     fullfn_without_extension, extension = os.path.splitext(params.filename)
     if hasattr(os, 'statvfs'):
         max_name_len = os.statvfs(path).f_namemax
         fullfn_without_extension = fullfn_without_extension[:max_name_len - max(4, len(extension))]
         params.filename = fullfn_without_extension + extension
         fullfn = params.filename
-    _atomically_save_image(image, fullfn_without_extension, extension)
+    saved_filename = _atomically_save_image(image, fullfn_without_extension, extension)
+
+    if opts.output_catalog:
+        try:
+            output_catalog.add_saved_image(saved_filename, image, info)
+        except Exception:
+            errors.report("Error adding image to output catalog", exc_info=True)
 
     image.already_saved_as = fullfn
 
@@ -5,7 +5,7 @@ import sys
 import warnings
 import os
 
-from threading import Thread
+from threading import Lock, Thread
 
 from modules.timer import startup_timer
 
@@ -50,7 +50,11 @@ def imports():
     shared_init.initialize()
     startup_timer.record("initialize shared")
 
-    from modules import processing, gradio_extensons, ui  # noqa: F401
+    from modules.shared_cmd_options import cmd_opts
+    if cmd_opts.api_fast_startup:
+        from modules import processing  # noqa: F401
+    else:
+        from modules import processing, gradio_extensons, ui  # noqa: F401
     startup_timer.record("other imports")
 
 
@@ -75,6 +79,14 @@ def initialize():
     sd_models.setup_model()
     startup_timer.record("setup SD model")
 
+    from modules.shared_cmd_options import cmd_opts
+    if not cmd_opts.api_fast_startup:
+        setup_face_restoration()
+
+    initialize_rest(reload_script_modules=False)
+
+
+def setup_face_restoration():
     from modules.shared_cmd_options import cmd_opts
 
     from modules import codeformer_model
@@ -86,8 +98,6 @@ def initialize():
     gfpgan_model.setup_model(cmd_opts.gfpgan_models_path)
     startup_timer.record("setup gfpgan")
 
-    initialize_rest(reload_script_modules=False)
-
 
 def initialize_rest(*, reload_script_modules=False):
     """
@@ -121,17 +131,18 @@ def initialize_rest(*, reload_script_modules=False):
     localization.list_localizations(cmd_opts.localizations_dir)
     startup_timer.record("list localizations")
 
-    with startup_timer.subcategory("load scripts"):
-        scripts.load_scripts()
+    if not cmd_opts.api_fast_startup:
+        with startup_timer.subcategory("load scripts"):
+            scripts.load_scripts()
 
-    if reload_script_modules and shared.opts.enable_reloading_ui_scripts:
-        for module in [module for name, module in sys.modules.items() if name.startswith("modules.ui")]:
-            importlib.reload(module)
-        startup_timer.record("reload script modules")
+        if reload_script_modules and shared.opts.enable_reloading_ui_scripts:
+            for module in [module for name, module in sys.modules.items() if name.startswith("modules.ui")]:
+                importlib.reload(module)
+            startup_timer.record("reload script modules")
 
-    from modules import modelloader
-    modelloader.load_upscalers()
-    startup_timer.record("load upscalers")
+        from modules import modelloader
+        modelloader.load_upscalers()
+        startup_timer.record("load upscalers")
 
     from modules import sd_vae
     sd_vae.refresh_vae_list()
@@ -166,3 +177,57 @@ def initialize_rest(*, reload_script_modules=False):
     extra_networks.initialize()
     extra_networks.register_default_extra_networks()
     startup_timer.record("initialize extra networks")
+
+
+deferred_lock = Lock()
+deferred_done = False
+
+
+def initialize_deferred(app=None):
+    """
+    With --api-fast-startup, does the part of startup that initialize() skipped: face restoration, extension
+    scripts and upscalers. Runs once; called from a background thread after the API starts listening and from
+    every endpoint that needs scripts, whichever comes first. Does nothing without --api-fast-startup.
+    """
+    global deferred_done
+
+    from modules.shared_cmd_options import cmd_opts
+    if deferred_done or not cmd_opts.api_fast_startup:
+        return
+
+    with deferred_lock:
+        if deferred_done:
+            return
+
+        from modules import timer
+        with startup_timer.subcategory("deferred"):
+            from modules import gradio_extensons  # noqa: F401
+            startup_timer.record("import gradio extensions")
+
+            setup_face_restoration()
+
+            from modules import scripts
+            with startup_timer.subcategory("load scripts"):
+                scripts.load_scripts()
+
+            from modules import modelloader
+            modelloader.load_upscalers()
+            startup_timer.record("load upscalers")
+
+            # extensions can register optimizers and UNets from on_list_optimizers and on_list_unets callbacks
+            from modules import sd_hijack
+            sd_hijack.list_optimizers()
+            startup_timer.record("scripts list_optimizers")
+
+            from modules import sd_unet
+            sd_unet.list_unets()
+            startup_timer.record("scripts list_unets")
+
+            from modules import script_callbacks
+            script_callbacks.before_ui_callback()
+            script_callbacks.app_started_callback(None, app)
+            startup_timer.record("app started callbacks")
+
+        timer.startup_record = startup_timer.dump()
+        print(f"Deferred startup done: {startup_timer.summary()}.")
+        deferred_done = True
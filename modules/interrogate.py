@@ -1,12 +1,14 @@
 import os
 import sys
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import re
 
 import torch
 import torch.hub
 
+from PIL import Image
 from torchvision import transforms
 from torchvision.transforms.functional import InterpolationMode
 
@@ -22,6 +24,41 @@ Category = namedtuple("Category", ["name", "topn", "items"])
 
 re_topn = re.compile(r"\.top(\d+)$")
 
+# rough activation memory per image, used to pick a batch size that fits in free VRAM
+blip_bytes_per_image = 256 * 1024 * 1024
+clip_bytes_per_image = 64 * 1024 * 1024
+
+
+def batch_size_for(device, bytes_per_image, limit=64):
+    if shared.opts.interrogate_batch_size > 0:
+        return int(shared.opts.interrogate_batch_size)
+
+    free_memory = model_management.get_free_memory(device)
+    return max(1, min(limit, int(free_memory * 0.8 // bytes_per_image)))
+
+
+def open_image(image):
+    """Images for batch interrogation may be given as file paths, so a folder never has to be held in memory at once."""
+    if isinstance(image, (str, os.PathLike)):
+        with Image.open(image) as img:
+            return img.convert("RGB")
+    return image.convert("RGB")
+
+
+def prefetch_batches(items, preprocess, batch_size):
+    """Yields (items, preprocessed items) in batches; the next batch is preprocessed on a thread pool while the caller runs the model on the current one."""
+    chunks = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    if not chunks:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as pool:
+        pending = [pool.submit(preprocess, x) for x in chunks[0]]
+        for i, chunk in enumerate(chunks):
+            current = pending
+            pending = [pool.submit(preprocess, x) for x in chunks[i + 1]] if i + 1 < len(chunks) else []
+            yield chunk, [f.result() for f in current]
+
+
 def category_types():
     return [f.stem for f in Path(shared.interrogator.content_dir).glob('*.txt')]
 
@@ -149,18 +186,26 @@ class InterrogateModels:
     def unload(self):
         pass
 
-    def rank(self, image_features, text_array, top_count=1):
+    def encode_text(self, text_array):
         import clip
 
-        devices.torch_gc()
-
         if shared.opts.interrogate_clip_dict_limit != 0:
             text_array = text_array[0:int(shared.opts.interrogate_clip_dict_limit)]
 
-        top_count = min(top_count, len(text_array))
         text_tokens = clip.tokenize(list(text_array), truncate=True).to(self.load_device)
         text_features = self.clip_model.encode_text(text_tokens).type(self.dtype)
         text_features /= text_features.norm(dim=-1, keepdim=True)
+        return text_features
+
+    def rank(self, image_features, text_array, top_count=1, text_features=None):
+        if shared.opts.interrogate_clip_dict_limit != 0:
+            text_array = text_array[0:int(shared.opts.interrogate_clip_dict_limit)]
+
+        top_count = min(top_count, len(text_array))
+
+        if text_features is None:
+            devices.torch_gc()
+            text_features = self.encode_text(text_array)
 
         similarity = torch.zeros((1, len(text_array))).to(self.load_device)
         for i in range(image_features.shape[0]):
@@ -170,17 +215,20 @@ class InterrogateModels:
         top_probs, top_labels = similarity.cpu().topk(top_count, dim=-1)
         return [(text_array[top_labels[0][i].numpy()], (top_probs[0][i].numpy()*100)) for i in range(top_count)]
 
-    def generate_caption(self, pil_image):
-        gpu_image = transforms.Compose([
+    def blip_transform(self, pil_image):
+        return transforms.Compose([
             transforms.Resize((blip_image_eval_size, blip_image_eval_size), interpolation=InterpolationMode.BICUBIC),
             transforms.ToTensor(),
             transforms.Normalize((0.48145466, 0.4578275, 0.40821073), (0.26862954, 0.26130258, 0.27577711))
-        ])(pil_image).unsqueeze(0).type(self.dtype).to(self.load_device)
+        ])(pil_image)
 
+    def generate_captions(self, gpu_images):
         with torch.no_grad():
-            caption = self.blip_model.generate(gpu_image, sample=False, num_beams=shared.opts.interrogate_clip_num_beams, min_length=shared.opts.interrogate_clip_min_length, max_length=shared.opts.interrogate_clip_max_length)
+            return self.blip_model.generate(gpu_images, sample=False, num_beams=shared.opts.interrogate_clip_num_beams, min_length=shared.opts.interrogate_clip_min_length, max_length=shared.opts.interrogate_clip_max_length)
 
-        return caption[0]
+    def generate_caption(self, pil_image):
+        gpu_image = self.blip_transform(pil_image).unsqueeze(0).type(self.dtype).to(self.load_device)
+        return self.generate_captions(gpu_image)[0]
 
     def interrogate(self, pil_image):
         res = ""
@@ -217,3 +265,57 @@ class InterrogateModels:
         shared.state.end()
 
         return res
+
+    def prepare_image(self, image):
+        pil_image = open_image(image)
+        return self.blip_transform(pil_image), self.clip_preprocess(pil_image)
+
+    def interrogate_batch(self, images, batch_size=None):
+        """Interrogates a list of PIL images or file paths, keeping the models loaded and running them on whole batches.
+
+        Category text features are encoded once for the whole list instead of once per image.
+        """
+        res = []
+        shared.state.begin(job="interrogate")
+        try:
+            self.load()
+
+            with torch.no_grad(), devices.autocast():
+                categories = [(cat, self.encode_text(cat.items)) for cat in self.categories()]
+
+            batch_size = batch_size or batch_size_for(self.load_device, blip_bytes_per_image * shared.opts.interrogate_clip_num_beams + clip_bytes_per_image)
+            shared.state.job_count = (len(images) + batch_size - 1) // batch_size
+
+            for _, prepared in prefetch_batches(images, self.prepare_image, batch_size):
+                if shared.state.interrupted:
+                    break
+
+                blip_images = torch.stack([x for x, _ in prepared]).type(self.dtype).to(self.load_device)
+                clip_images = torch.stack([x for _, x in prepared]).type(self.dtype).to(self.load_device)
+
+                captions = self.generate_captions(blip_images)
+
+                with torch.no_grad(), devices.autocast():
+                    image_features = self.clip_model.encode_image(clip_images).type(self.dtype)
+                    image_features /= image_features.norm(dim=-1, keepdim=True)
+
+                    for caption, features in zip(captions, image_features):
+                        for cat, text_features in categories:
+                            for match, score in self.rank(features.unsqueeze(0), cat.items, top_count=cat.topn, text_features=text_features):
+                                if shared.opts.interrogate_return_ranks:
+                                    caption += f", ({match}:{score/100:.3f})"
+                                else:
+                                    caption += f", {match}"
+                        res.append(caption)
+
+                shared.state.nextjob()
+
+        except Exception:
+            errors.report("Error interrogating", exc_info=True)
+
+        res += ["<error>"] * (len(images) - len(res))
+
+        self.unload()
+        shared.state.end()
+
+        return res
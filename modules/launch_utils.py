@@ -574,9 +574,10 @@ def configure_forge_reference_checkout(a1111_home: Path):
 
 
 def start():
-    print(f"Launching {'API server' if '--nowebui' in sys.argv else 'Web UI'} with arguments: {shlex.join(sys.argv[1:])}")
+    api_only = '--nowebui' in sys.argv or '--api-fast-startup' in sys.argv
+    print(f"Launching {'API server' if api_only else 'Web UI'} with arguments: {shlex.join(sys.argv[1:])}")
     import webui
-    if '--nowebui' in sys.argv:
+    if api_only:
         webui.api_only()
     else:
         webui.webui()
@@ -1,3 +1,4 @@
+import numpy as np
 from PIL import Image, ImageFilter, ImageOps
 
 
@@ -91,3 +92,58 @@ def fill(image, mask):
 
     return image_mod.convert("RGB")
 
+
+def downsample(x):
+    """halves height and width of an [H, W, C] array by averaging 2x2 blocks; odd sizes are zero-padded"""
+    h, w, c = x.shape
+    x = np.pad(x, ((0, h % 2), (0, w % 2), (0, 0)))
+    return x.reshape(x.shape[0] // 2, 2, x.shape[1] // 2, 2, c).mean(axis=(1, 3))
+
+
+def upsample(x, height, width):
+    """doubles height and width of an [H, W, C] array with bilinear interpolation, then crops it to height x width"""
+    for axis, size in ((0, height), (1, width)):
+        x = np.moveaxis(x, axis, 0)
+        previous = np.concatenate([x[:1], x[:-1]])
+        following = np.concatenate([x[1:], x[-1:]])
+        x = np.stack([0.75 * x + 0.25 * previous, 0.75 * x + 0.25 * following], axis=1).reshape(-1, *x.shape[1:])[:size]
+        x = np.moveaxis(x, 0, axis)
+
+    return x
+
+
+def fill_pyramid(images, mask):
+    """
+    Same purpose as fill(), for a list of images sharing one mask, using a push-pull pyramid: known pixels are
+    averaged down level by level to 1x1, and going back up every level's holes are filled with the upsampled
+    level below. Holes get smooth colors from their surroundings like with fill(), and unmasked pixels are kept
+    as they are, at the cost of a few passes over the image instead of blurs with radii up to 256.
+    """
+
+    alpha = 1.0 - np.asarray(mask.convert('L'), dtype=np.float32)[..., None] / 255.0
+    alphas = [alpha]
+    while max(alphas[-1].shape[:2]) > 1:
+        alphas.append(downsample(alphas[-1]))
+
+    res = []
+    for image in images:
+        premultiplied = [np.asarray(image.convert('RGB'), dtype=np.float32) / 255.0 * alpha]
+        for _ in alphas[1:]:
+            premultiplied.append(downsample(premultiplied[-1]))
+
+        filled = premultiplied[-1] / np.maximum(alphas[-1], 1e-6)
+        for color, coverage in zip(reversed(premultiplied[:-1]), reversed(alphas[:-1])):
+            filled = color + (1.0 - coverage) * upsample(filled, *coverage.shape[:2])
+
+        res.append(Image.fromarray(np.clip(filled * 255.0 + 0.5, 0, 255).astype(np.uint8)))
+
+    return res
+
+
+def fill_images(images, mask, method="Blur"):
+    """fills masked regions of all images of a job, which share one mask; method is "Blur" for fill() or "Pyramid" for fill_pyramid()"""
+
+    if method == "Pyramid":
+        return fill_pyramid(images, mask)
+
+    return [fill(image, mask) for image in images]
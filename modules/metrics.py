@@ -0,0 +1,247 @@
+"""
+A small in-process metrics registry rendered in the Prometheus text exposition format.
+
+Recording a value is a dict lookup and an addition under a lock, so instrumentation can stay on in
+production. Values that are cheap to read on demand (queue depth, loaded models, memory) are registered
+as callback gauges and only evaluated when /metrics is scraped.
+"""
+
+import bisect
+import contextlib
+import functools
+import threading
+import time
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+
+    escaped = [(k, str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for k, v in labels]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+    def samples(self):
+        if self.callback is not None:
+            try:
+                result = self.callback()
+            except Exception:
+                return []
+
+            if isinstance(result, dict):
+                return [(self.name, tuple(sorted(labels)), value) for labels, value in result.items()]
+            return [(self.name, (), result)]
+
+        with self.lock:
+            return [(self.name, labels, value) for labels, value in self.values.items()]
+
+    def render(self):
+        lines = self.header()
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = value
+
+    def set_max(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            if value > self.values.get(key, float("-inf")):
+                self.values[key] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        result = []
+        with self.lock:
+            items = [(labels, (list(counts), total, count)) for labels, (counts, total, count) in self.values.items()]
+
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                result.append((f"{self.name}_bucket", labels + (("le", format_value(bound)),), cumulative))
+            result.append((f"{self.name}_sum", labels, total))
+            result.append((f"{self.name}_count", labels, count))
+
+        return result
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, callback=None):
+        return self.register(Counter(name, documentation, callback))
+
+    def gauge(self, name, documentation, callback=None):
+        return self.register(Gauge(name, documentation, callback))
+
+    def histogram(self, name, documentation, buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, buckets))
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram("webui_stage_duration_seconds", "Time spent in each stage of a generation job.")
+cache_requests = registry.counter("webui_cache_requests_total", "Cache lookups by cache and result (hit/miss).")
+memory_high_water = registry.gauge("webui_memory_high_water_bytes", "Highest observed memory use by device.")
+
+
+def observe(stage, seconds):
+    stage_seconds.observe(seconds, stage=stage)
+
+
+@contextlib.contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage=name)
+
+
+def timed(name):
+    """Decorator form of stage()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def cache_hit(cache, hit=True):
+    cache_requests.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def queue_depth():
+    from modules import progress
+
+    return len(progress.pending_tasks)
+
+
+def model_residency():
+    from ldm_patched.modules import model_management
+
+    result = {}
+    for loaded_model in list(model_management.current_loaded_models):
+        labels = (("model", loaded_model.model.model.__class__.__name__), ("device", str(loaded_model.device)))
+        result[labels] = result.get(labels, 0) + loaded_model.model_memory()
+    return result
+
+
+def update_memory_high_water():
+    import psutil
+    import torch
+
+    memory_high_water.set_max(psutil.Process().memory_info().rss, device="cpu")
+
+    if torch.cuda.is_available():
+        for i in range(torch.cuda.device_count()):
+            memory_high_water.set_max(torch.cuda.max_memory_allocated(i), device=f"cuda:{i}")
+
+
+tracked_lru_caches = {}
+
+
+def track_lru_cache(name, function):
+    """Exposes hits/misses of a functools.lru_cache wrapped function under cache=name."""
+    tracked_lru_caches[name] = function
+
+
+def lru_cache_requests():
+    result = {}
+    for name, function in list(tracked_lru_caches.items()):
+        info = function.cache_info()
+        result[(("cache", name), ("result", "hit"))] = info.hits
+        result[(("cache", name), ("result", "miss"))] = info.misses
+    return result
+
+
+registry.gauge("webui_queue_depth", "Number of tasks waiting in the queue.", queue_depth)
+registry.gauge("webui_loaded_model_bytes", "Memory of models currently loaded by model management.", model_residency)
+registry.counter("webui_lru_cache_requests_total", "Lookups of in-process model caches by cache and result (hit/miss).", lru_cache_requests)
+
+
+def render():
+    try:
+        update_memory_high_water()
+    except Exception:
+        pass
+
+    return registry.render()
@@ -3,6 +3,7 @@ from modules import modelloader, devices, errors
 from modules.shared import opts, cmd_opts
 from modules.upscaler import Upscaler, UpscalerData
 from modules.upscaler_utils import upscale_with_model
+from modules_forge import upscaler_pool
 
 
 class UpscalerOmniSR(Upscaler):
@@ -23,7 +24,6 @@ class UpscalerOmniSR(Upscaler):
         except Exception:
             errors.report(f"Unable to load OmniSR model {selected_model}", exc_info=True)
             return img
-        model.to(devices.device_omnisr)
         return omnisr_upscale(model, img)
 
     def load_model(self, path: str):
@@ -31,9 +31,9 @@ class UpscalerOmniSR(Upscaler):
             raise FileNotFoundError(f"Model file {path} not found")
         else:
             filename = path
-        return modelloader.load_spandrel_model(
+        return upscaler_pool.load_model(
             filename,
-            device=('cpu' if devices.device_omnisr.type == 'mps' else None),
+            device=devices.device_omnisr,
             prefer_half=(not cmd_opts.no_half and not cmd_opts.upcast_sampling),
             expected_architecture='OmniSR',
         )
@@ -0,0 +1,280 @@
+"""
+SQLite catalog of saved images, searchable by prompt, seed, model and LoRA without opening the images.
+
+save_image adds every image it writes while the output_catalog option is on; existing folders are added with
+import_directory. Each row holds the file's path, size, modification time and sha256, the image size, the infotext
+and the parameters parsed from it. Prompts, models, LoRAs and the whole infotext are indexed with FTS5 when the
+sqlite library has it, and searched with LIKE otherwise.
+"""
+
+import hashlib
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.paths_internal import data_path
+
+catalog_filename = os.environ.get('SD_WEBUI_OUTPUT_CATALOG', os.path.join(data_path, "output_catalog.db"))
+
+image_extensions = {".png", ".jpg", ".jpeg", ".webp", ".avif", ".gif"}
+
+columns = ["path", "mtime", "size", "sha256", "width", "height", "prompt", "negative_prompt", "seed", "steps", "sampler", "cfg_scale", "model", "model_hash", "loras", "infotext", "parameters"]
+text_columns = ["prompt", "negative_prompt", "model", "loras", "infotext"]
+
+re_lora = re.compile(r"<lora:([^:>]+)")
+
+schema = """
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime REAL,
+    size INTEGER,
+    sha256 TEXT,
+    width INTEGER,
+    height INTEGER,
+    prompt TEXT,
+    negative_prompt TEXT,
+    seed INTEGER,
+    steps INTEGER,
+    sampler TEXT,
+    cfg_scale REAL,
+    model TEXT,
+    model_hash TEXT,
+    loras TEXT,
+    infotext TEXT,
+    parameters TEXT
+);
+CREATE INDEX IF NOT EXISTS images_seed ON images(seed);
+CREATE INDEX IF NOT EXISTS images_model ON images(model);
+CREATE INDEX IF NOT EXISTS images_sha256 ON images(sha256);
+"""
+
+fts_schema = """
+CREATE VIRTUAL TABLE IF NOT EXISTS images_fts USING fts5(prompt, negative_prompt, model, loras, infotext, content='images', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS images_fts_insert AFTER INSERT ON images BEGIN
+    INSERT INTO images_fts(rowid, prompt, negative_prompt, model, loras, infotext) VALUES (new.id, new.prompt, new.negative_prompt, new.model, new.loras, new.infotext);
+END;
+CREATE TRIGGER IF NOT EXISTS images_fts_delete AFTER DELETE ON images BEGIN
+    INSERT INTO images_fts(images_fts, rowid, prompt, negative_prompt, model, loras, infotext) VALUES ('delete', old.id, old.prompt, old.negative_prompt, old.model, old.loras, old.infotext);
+END;
+CREATE TRIGGER IF NOT EXISTS images_fts_update AFTER UPDATE ON images BEGIN
+    INSERT INTO images_fts(images_fts, rowid, prompt, negative_prompt, model, loras, infotext) VALUES ('delete', old.id, old.prompt, old.negative_prompt, old.model, old.loras, old.infotext);
+    INSERT INTO images_fts(rowid, prompt, negative_prompt, model, loras, infotext) VALUES (new.id, new.prompt, new.negative_prompt, new.model, new.loras, new.infotext);
+END;
+"""
+
+
+def to_number(value, kind):
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_infotext(infotext):
+    """Catalog columns for an infotext; the whole parsed dict goes into the parameters column as JSON."""
+    from modules import infotext_utils
+
+    if not infotext:
+        return {}
+
+    params = infotext_utils.parse_generation_parameters(infotext, skip_fields=[])
+    prompt = params.get("Prompt", "")
+
+    loras = re_lora.findall(prompt)
+    for item in str(params.get("Lora hashes", "")).split(","):
+        name = item.split(":")[0].strip()
+        if name and name not in loras:
+            loras.append(name)
+
+    return {
+        "prompt": prompt,
+        "negative_prompt": params.get("Negative prompt", ""),
+        "seed": to_number(params.get("Seed"), int),
+        "steps": to_number(params.get("Steps"), int),
+        "sampler": params.get("Sampler"),
+        "cfg_scale": to_number(params.get("CFG scale"), float),
+        "model": params.get("Model"),
+        "model_hash": params.get("Model hash"),
+        "loras": " ".join(loras),
+        "parameters": json.dumps(params, default=str),
+    }
+
+
+def make_record(path, data, infotext, width, height):
+    stat = os.stat(path)
+    return {
+        "path": os.path.abspath(path),
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "width": width,
+        "height": height,
+        "infotext": infotext,
+        **parse_infotext(infotext),
+    }
+
+
+def record_from_file(path):
+    """Reads the file at path once, for both its hash and its infotext."""
+    from PIL import Image
+    from modules import images
+
+    with open(path, "rb") as file:
+        data = file.read()
+
+    with Image.open(io.BytesIO(data)) as image:
+        infotext, _ = images.read_info_from_image(image)
+        width, height = image.size
+
+    return make_record(path, data, infotext, width, height)
+
+
+class OutputCatalog:
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        self.connection = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(schema)
+
+        try:
+            self.connection.executescript(fts_schema)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+
+    def insert(self, records):
+        """Adds records (dicts with keys from columns) to the catalog, replacing earlier entries for the same paths."""
+        placeholders = ", ".join(f":{name}" for name in columns)
+        updates = ", ".join(f"{name}=excluded.{name}" for name in columns if name != "path")
+        sql = f"INSERT INTO images({', '.join(columns)}) VALUES ({placeholders}) ON CONFLICT(path) DO UPDATE SET {updates}"
+
+        with self.lock, self.connection:
+            self.connection.executemany(sql, [{name: record.get(name) for name in columns} for record in records])
+
+    def known_files(self, directory):
+        """{path: (mtime, size)} for cataloged files under directory"""
+        prefix = os.path.join(os.path.abspath(directory), "")
+        with self.lock:
+            rows = self.connection.execute("SELECT path, mtime, size FROM images WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)).fetchall()
+
+        return {row["path"]: (row["mtime"], row["size"]) for row in rows}
+
+    def search(self, query=None, seed=None, model=None, lora=None, sha256=None, offset=0, limit=50):
+        """
+        Returns (total number of matches, matches from offset on as dicts), newest first. query is an FTS5 query
+        over prompts, models, LoRAs and the whole infotext; the other arguments must match exactly, except model,
+        which also matches the model hash.
+        """
+        conditions = []
+        params = []
+
+        if query:
+            if self.fts:
+                conditions.append("id IN (SELECT rowid FROM images_fts WHERE images_fts MATCH ?)")
+                params.append(query)
+            else:
+                conditions.append("(" + " OR ".join(f"{name} LIKE ?" for name in text_columns) + ")")
+                params += [f"%{query}%"] * len(text_columns)
+
+        if seed is not None:
+            conditions.append("seed = ?")
+            params.append(seed)
+
+        if model:
+            conditions.append("(model = ? OR model_hash = ?)")
+            params += [model, model]
+
+        if lora:
+            conditions.append("(' ' || loras || ' ') LIKE ?")
+            params.append(f"% {lora} %")
+
+        if sha256:
+            conditions.append("sha256 = ?")
+            params.append(sha256)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self.lock:
+            total = self.connection.execute(f"SELECT count(*) FROM images {where}", params).fetchone()[0]
+            rows = self.connection.execute(f"SELECT * FROM images {where} ORDER BY id DESC LIMIT ? OFFSET ?", params + [limit, offset]).fetchall()
+
+        return total, [dict(row) for row in rows]
+
+    def import_directory(self, directory, workers=8, recursive=True, batch_size=500):
+        """
+        Adds the images under directory that are not cataloged yet or changed since; files are read by a pool of
+        workers threads. Returns a dict with the numbers of scanned, added, unchanged and failed files.
+        """
+        from modules import errors
+
+        paths = []
+        for root, dirs, files in os.walk(directory):
+            paths += [os.path.abspath(os.path.join(root, name)) for name in files if os.path.splitext(name)[1].lower() in image_extensions]
+            if not recursive:
+                break
+
+        known = self.known_files(directory)
+        todo = []
+        for path in paths:
+            stat = os.stat(path)
+            if known.get(path) != (stat.st_mtime, stat.st_size):
+                todo.append(path)
+
+        def read(path):
+            try:
+                return record_from_file(path)
+            except Exception:
+                errors.report(f"Error reading {path} for the output catalog", exc_info=True)
+                return None
+
+        added = failed = 0
+        batch = []
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for record in executor.map(read, todo):
+                if record is None:
+                    failed += 1
+                    continue
+
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    self.insert(batch)
+                    added += len(batch)
+                    batch = []
+
+        if batch:
+            self.insert(batch)
+            added += len(batch)
+
+        return {"scanned": len(paths), "added": added, "unchanged": len(paths) - len(todo), "failed": failed}
+
+
+default_catalog = None
+default_catalog_lock = threading.Lock()
+
+
+def catalog():
+    global default_catalog
+
+    with default_catalog_lock:
+        if default_catalog is None:
+            default_catalog = OutputCatalog(catalog_filename)
+
+    return default_catalog
+
+
+def add_saved_image(path, image, infotext):
+    """Called by save_image with the file it has just written."""
+    with open(path, "rb") as file:
+        data = file.read()
+
+    catalog().insert([make_record(path, data, infotext, image.width, image.height)])
@@ -18,7 +18,7 @@ if opts.sd_processing == "reForge OG":
     from typing import Any
 
     import modules.sd_hijack
-    from modules import devices, prompt_parser, masking, sd_samplers, lowvram, infotext_utils, extra_networks, sd_vae_approx, scripts, sd_samplers_common, sd_unet, errors, rng, profiling
+    from modules import devices, prompt_parser, masking, sd_samplers, lowvram, infotext_utils, extra_networks, sd_vae_approx, scripts, sd_samplers_common, sd_unet, errors, rng, profiling, metrics
     from modules.rng import slerp # noqa: F401
     from modules.sd_hijack import model_hijack
     from modules.sd_samplers_common import images_tensor_to_samples, decode_first_stage, approximation_indexes
@@ -498,8 +498,10 @@ if opts.sd_processing == "reForge OG":
                 if cache[0] is not None and cached_params == cache[0]:
                     if len(cache) > 2:
                         modules.sd_hijack.model_hijack.extra_generation_params.update(cache[2])
+                    metrics.cache_hit("cond")
                     return cache[1]
 
+            metrics.cache_hit("cond", False)
             cache = caches[0]
 
             with devices.autocast():
@@ -772,6 +774,7 @@ if opts.sd_processing == "reForge OG":
             "ENSD": opts.eta_noise_seed_delta if uses_ensd else None,
             "Token merging ratio": None if token_merging_ratio == 0 else token_merging_ratio,
             "Token merging ratio hr": None if not enable_hr or token_merging_ratio_hr == 0 else token_merging_ratio_hr,
+            "Token merging plan reuse": None if (token_merging_ratio == 0 and token_merging_ratio_hr == 0) or opts.token_merging_plan_reuse == 0 else opts.token_merging_plan_reuse,
             "Init image hash": getattr(p, 'init_img_hash', None),
             "RNG": opts.randn_source if opts.randn_source != "GPU" else None,
             "Tiling": "True" if p.tiling else None,
@@ -1035,20 +1038,21 @@ if opts.sd_processing == "reForge OG":
 
                 save_samples = p.save_samples()
 
-                for i, x_sample in enumerate(x_samples_ddim):
-                    p.batch_index = i
-
-                    x_sample = 255. * np.moveaxis(x_sample.cpu().numpy(), 0, 2)
-                    x_sample = x_sample.astype(np.uint8)
+                x_samples_uint8 = [(255. * np.moveaxis(x_sample.cpu().numpy(), 0, 2)).astype(np.uint8) for x_sample in x_samples_ddim]
 
-                    if p.restore_faces:
-                        if save_samples and opts.save_images_before_face_restoration:
+                if p.restore_faces:
+                    if save_samples and opts.save_images_before_face_restoration:
+                        for i, x_sample in enumerate(x_samples_uint8):
+                            p.batch_index = i
                             images.save_image(Image.fromarray(x_sample), p.outpath_samples, "", p.seeds[i], p.prompts[i], opts.samples_format, info=infotext(i), p=p, suffix="-before-face-restoration")
 
-                        devices.torch_gc()
+                    devices.torch_gc()
+
+                    x_samples_uint8 = modules.face_restoration.restore_faces_batch(x_samples_uint8)
+                    devices.torch_gc()
 
-                        x_sample = modules.face_restoration.restore_faces(x_sample)
-                        devices.torch_gc()
+                for i, x_sample in enumerate(x_samples_uint8):
+                    p.batch_index = i
 
                     image = Image.fromarray(x_sample)
 
@@ -1739,20 +1743,21 @@ if opts.sd_processing == "reForge OG":
                     image = image.crop(crop_region)
                     image = images.resize_image(2, image, self.width, self.height)
 
-                if image_mask is not None:
-                    if self.inpainting_fill != 1:
-                        image = masking.fill(image, latent_mask)
+                imgs.append(image)
 
-                        if self.inpainting_fill == 0:
-                            self.extra_generation_params["Masked content"] = 'fill'
+            if image_mask is not None:
+                if self.inpainting_fill != 1:
+                    imgs = masking.fill_images(imgs, latent_mask, method=opts.inpainting_fill_method)
 
+                    if self.inpainting_fill == 0:
+                        self.extra_generation_params["Masked content"] = 'fill'
+
+            for i, image in enumerate(imgs):
                 if add_color_corrections:
                     self.color_corrections.append(setup_color_correction(image))
 
                 image = np.array(image).astype(np.float32) / 255.0
-                image = np.moveaxis(image, 2, 0)
-
-                imgs.append(image)
+                imgs[i] = np.moveaxis(image, 2, 0)
 
             if len(imgs) == 1:
                 batch_images = np.expand_dims(imgs[0], axis=0).repeat(self.batch_size, axis=0)
@@ -1862,7 +1867,7 @@ elif opts.sd_processing == "reForge A1111":
     from typing import Any
 
     import modules.sd_hijack
-    from modules import devices, prompt_parser, masking, sd_samplers, lowvram, infotext_utils, extra_networks, sd_vae_approx, scripts, sd_samplers_common, sd_unet, errors, rng, profiling
+    from modules import devices, prompt_parser, masking, sd_samplers, lowvram, infotext_utils, extra_networks, sd_vae_approx, scripts, sd_samplers_common, sd_unet, errors, rng, profiling, metrics
     from modules.rng import slerp # noqa: F401
     from modules.sd_hijack import model_hijack
     from modules.sd_samplers_common import images_tensor_to_samples, decode_first_stage, approximation_indexes
@@ -2340,8 +2345,10 @@ elif opts.sd_processing == "reForge A1111":
 
             for cache in caches:
                 if cache[0] is not None and cached_params == cache[0]:
+                    metrics.cache_hit("cond")
                     return cache[1]
 
+            metrics.cache_hit("cond", False)
             cache = caches[0]
 
             with devices.autocast():
@@ -2652,6 +2659,7 @@ elif opts.sd_processing == "reForge A1111":
             "ENSD": opts.eta_noise_seed_delta if uses_ensd else None,
             "Token merging ratio": None if token_merging_ratio == 0 else token_merging_ratio,
             "Token merging ratio hr": None if not enable_hr or token_merging_ratio_hr == 0 else token_merging_ratio_hr,
+            "Token merging plan reuse": None if (token_merging_ratio == 0 and token_merging_ratio_hr == 0) or opts.token_merging_plan_reuse == 0 else opts.token_merging_plan_reuse,
             "Init image hash": getattr(p, 'init_img_hash', None),
             "RNG": opts.randn_source if opts.randn_source != "GPU" else None,
             "Tiling": "True" if p.tiling else None,
@@ -2917,20 +2925,21 @@ elif opts.sd_processing == "reForge A1111":
 
                 save_samples = p.save_samples()
 
-                for i, x_sample in enumerate(x_samples_ddim):
-                    p.batch_index = i
-
-                    x_sample = 255. * np.moveaxis(x_sample.cpu().numpy(), 0, 2)
-                    x_sample = x_sample.astype(np.uint8)
+                x_samples_uint8 = [(255. * np.moveaxis(x_sample.cpu().numpy(), 0, 2)).astype(np.uint8) for x_sample in x_samples_ddim]
 
-                    if p.restore_faces:
-                        if save_samples and opts.save_images_before_face_restoration:
+                if p.restore_faces:
+                    if save_samples and opts.save_images_before_face_restoration:
+                        for i, x_sample in enumerate(x_samples_uint8):
+                            p.batch_index = i
                             images.save_image(Image.fromarray(x_sample), p.outpath_samples, "", p.seeds[i], p.prompts[i], opts.samples_format, info=infotext(i), p=p, suffix="-before-face-restoration")
 
-                        devices.torch_gc()
+                    devices.torch_gc()
+
+                    x_samples_uint8 = modules.face_restoration.restore_faces_batch(x_samples_uint8)
+                    devices.torch_gc()
 
-                        x_sample = modules.face_restoration.restore_faces(x_sample)
-                        devices.torch_gc()
+                for i, x_sample in enumerate(x_samples_uint8):
+                    p.batch_index = i
 
                     image = Image.fromarray(x_sample)
 
@@ -3621,20 +3630,21 @@ elif opts.sd_processing == "reForge A1111":
                     image = image.crop(crop_region)
                     image = images.resize_image(2, image, self.width, self.height)
 
-                if image_mask is not None:
-                    if self.inpainting_fill != 1:
-                        image = masking.fill(image, latent_mask)
+                imgs.append(image)
 
-                        if self.inpainting_fill == 0:
-                            self.extra_generation_params["Masked content"] = 'fill'
+            if image_mask is not None:
+                if self.inpainting_fill != 1:
+                    imgs = masking.fill_images(imgs, latent_mask, method=opts.inpainting_fill_method)
 
+                    if self.inpainting_fill == 0:
+                        self.extra_generation_params["Masked content"] = 'fill'
+
+            for i, image in enumerate(imgs):
                 if add_color_corrections:
                     self.color_corrections.append(setup_color_correction(image))
 
                 image = np.array(image).astype(np.float32) / 255.0
-                image = np.moveaxis(image, 2, 0)
-
-                imgs.append(image)
+                imgs[i] = np.moveaxis(image, 2, 0)
 
             if len(imgs) == 1:
                 batch_images = np.expand_dims(imgs[0], axis=0).repeat(self.batch_size, axis=0)
@@ -6,6 +6,7 @@ import gradio as gr
 from pydantic import BaseModel, Field
 
 from modules.shared import opts
+from modules import metrics
 
 import modules.shared as shared
 from collections import OrderedDict
@@ -24,7 +25,9 @@ def start_task(id_task):
     global current_task
 
     current_task = id_task
-    pending_tasks.pop(id_task, None)
+    queued_at = pending_tasks.pop(id_task, None)
+    if queued_at is not None:
+        metrics.observe("queue_wait", time.time() - queued_at)
 
 
 def finish_task(id_task):
@@ -37,6 +40,8 @@ def finish_task(id_task):
     if len(finished_tasks) > 16:
         finished_tasks.pop(0)
 
+    metrics.update_memory_high_water()
+
 def create_task_id(task_type):
     N = 7
     res = ''.join(random.choices(string.ascii_uppercase +
@@ -3,6 +3,7 @@ from modules import modelloader, devices, errors
 from modules.shared import opts, cmd_opts, models_path
 from modules.upscaler import Upscaler, UpscalerData
 from modules.upscaler_utils import upscale_with_model
+from modules_forge import upscaler_pool
 from modules_forge.forge_util import prepare_free_memory
 
 
@@ -31,7 +32,6 @@ class UpscalerRCAN(Upscaler):
         except Exception:
             errors.report(f"Unable to load RCAN model {selected_model}", exc_info=True)
             return img
-        model.to(devices.device_esrgan)
         return rcan_upscale(model, img)
 
     def load_model(self, path: str):
@@ -40,9 +40,9 @@ class UpscalerRCAN(Upscaler):
         else:
             filename = path
 
-        return modelloader.load_spandrel_model(
+        return upscaler_pool.load_model(
             filename,
-            device=('cpu' if devices.device_esrgan.type == 'mps' else None),
+            device=devices.device_esrgan,
             prefer_half=(not cmd_opts.no_half and not cmd_opts.upcast_sampling),
             expected_architecture='RCAN',
         )
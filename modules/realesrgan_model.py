@@ -4,6 +4,7 @@ from modules import modelloader, errors
 from modules.shared import cmd_opts, opts
 from modules.upscaler import Upscaler, UpscalerData
 from modules.upscaler_utils import upscale_with_model
+from modules_forge import upscaler_pool
 from modules_forge.forge_util import prepare_free_memory
 
 
@@ -39,7 +40,7 @@ class UpscalerRealESRGAN(Upscaler):
             errors.report(f"Unable to load RealESRGAN model {path}", exc_info=True)
             return img
 
-        model_descriptor = modelloader.load_spandrel_model(
+        model_descriptor = upscaler_pool.load_model(
             info.local_data_path,
             device=self.device,
             prefer_half=(not cmd_opts.no_half and not cmd_opts.upcast_sampling),
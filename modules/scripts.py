@@ -2,12 +2,15 @@ import os
 import re
 import sys
 import inspect
+import threading
+import time
 from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 
 import gradio as gr
 
-from modules import shared, paths, script_callbacks, extensions, script_loading, scripts_postprocessing, errors, timer, util
+from modules import shared, paths, script_callbacks, extensions, script_loading, scripts_postprocessing, errors, timer, util, tracing
 
 topological_sort = util.topological_sort
 
@@ -376,6 +379,7 @@ class ScriptBuiltinUI(Script):
 
 
 current_basedir = paths.script_path
+thread_basedir = threading.local()
 
 
 def basedir():
@@ -383,7 +387,7 @@ def basedir():
     this is the main directory (where webui.py resides), and for scripts in extensions directory
     (ie extensions/aesthetic/script/aesthetic.py), this is extension's directory (extensions/aesthetic)
     """
-    return current_basedir
+    return getattr(thread_basedir, "path", current_basedir)
 
 
 ScriptFile = namedtuple("ScriptFile", ["basedir", "filename", "path"])
@@ -402,7 +406,10 @@ class ScriptWithDependencies:
     load_after: list
 
 
-def list_scripts(scriptdirname, extension, *, include_extensions=True):
+def list_scripts(scriptdirname, extension, *, include_extensions=True, dependencies_out=None):
+    """returns script files in load order; if dependencies_out is a dict, it is filled with the paths
+    of scripts each script must be loaded after, keyed by path"""
+
     scripts = {}
 
     loaded_extensions = {ext.canonical_name: ext for ext in extensions.active()}
@@ -477,6 +484,10 @@ def list_scripts(scriptdirname, extension, *, include_extensions=True):
     ordered_scripts = topological_sort(dependencies)
     scripts_list = [scripts[script_canonical_name].file for script_canonical_name in ordered_scripts]
 
+    if dependencies_out is not None:
+        for script in scripts.values():
+            dependencies_out[script.file.path] = [scripts[x].file.path for x in script.load_after if x in scripts]
+
     return scripts_list
 
 
@@ -496,13 +507,112 @@ def list_files_with_name(filename):
     return res
 
 
+def script_owner(scriptfile):
+    """name of the extension a script belongs to, or "base" for scripts that come with the webui"""
+    extension = extensions.extension_paths.get(scriptfile.basedir)
+    return extension.name if extension is not None else "base"
+
+
+def script_load_dependencies(scripts_list, dependencies):
+    """for every script, the paths of scripts that have to finish importing before it can start:
+    its After/Before dependencies, the previous script of the same extension, and all scripts of
+    extensions its extension Requires; only earlier scripts in scripts_list count, so this is never cyclic"""
+
+    position = {scriptfile.path: index for index, scriptfile in enumerate(scripts_list)}
+    by_basedir = {}
+    for scriptfile in scripts_list:
+        by_basedir.setdefault(scriptfile.basedir, []).append(scriptfile.path)
+
+    res = {}
+    for index, scriptfile in enumerate(scripts_list):
+        required = set(dependencies.get(scriptfile.path, []))
+
+        same_extension = by_basedir[scriptfile.basedir]
+        own_index = same_extension.index(scriptfile.path)
+        if own_index > 0:
+            required.add(same_extension[own_index - 1])
+
+        extension = extensions.extension_paths.get(scriptfile.basedir)
+        for name in (extension.metadata.requires or []) if extension is not None else []:
+            required_extension = extensions.loaded_extensions.get(name)
+            if required_extension is not None:
+                required.update(by_basedir.get(required_extension.path, []))
+
+        res[scriptfile.path] = {x for x in required if position.get(x, index) < index}
+
+    return res
+
+
+def import_scripts_parallel(scripts_list, dependencies, workers, load_times):
+    """imports scripts from a thread pool, starting each one as soon as everything it depends on is imported;
+    returns a dict of path -> module, with None for scripts that failed"""
+
+    def import_script(scriptfile):
+        thread_basedir.path = scriptfile.basedir
+        start = time.perf_counter()
+        try:
+            return script_loading.load_module(scriptfile.path)
+        except Exception:
+            errors.report(f"Error loading script: {scriptfile.filename}", exc_info=True)
+            return None
+        finally:
+            load_times[scriptfile.path] = time.perf_counter() - start
+            del thread_basedir.path
+
+    scriptfiles = {scriptfile.path: scriptfile for scriptfile in scripts_list}
+    waiting = script_load_dependencies(scripts_list, dependencies)
+    modules = {}
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="load_scripts") as executor:
+        running = {}
+        while waiting or running:
+            for path in [path for path, required in waiting.items() if not required]:
+                del waiting[path]
+                running[executor.submit(import_script, scriptfiles[path])] = path
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = running.pop(future)
+                modules[path] = future.result()
+                for required in waiting.values():
+                    required.discard(path)
+
+    return modules
+
+
+def restore_callback_order(scripts_list):
+    """scripts imported in parallel register their callbacks in whatever order they finish; this sorts
+    callbacks back into script load order, keeping the order each script registered its own callbacks in"""
+
+    order = {}
+    for index, scriptfile in enumerate(scripts_list):
+        order.setdefault(scriptfile.path, index)
+        if scriptfile.basedir != paths.script_path:
+            order.setdefault(scriptfile.basedir, index)
+
+    def callback_order(callback):
+        if callback.script in order:
+            return order[callback.script]
+
+        extension = extensions.find_extension(callback.script)
+        return order.get(extension.path, -1) if extension is not None else -1
+
+    for callback_list in script_callbacks.callback_map.values():
+        callback_list.sort(key=callback_order)
+
+
+extension_load_times = {}
+
+
 def load_scripts():
     global current_basedir
     scripts_data.clear()
     postprocessing_scripts_data.clear()
     script_callbacks.clear_callbacks()
+    extension_load_times.clear()
 
-    scripts_list = list_scripts("scripts", ".py") + list_scripts("modules/processing_scripts", ".py", include_extensions=False)
+    dependencies = {}
+    scripts_list = list_scripts("scripts", ".py", dependencies_out=dependencies) + list_scripts("modules/processing_scripts", ".py", include_extensions=False, dependencies_out=dependencies)
 
     for s in scripts_list:
         if s.basedir not in sys.path:
@@ -512,7 +622,7 @@ def load_scripts():
 
     # print(f'Current System Paths = {syspath}')
 
-    def register_scripts_from_module(module):
+    def register_scripts_from_module(module, scriptfile):
         for script_class in module.__dict__.values():
             if not inspect.isclass(script_class):
                 continue
@@ -522,24 +632,51 @@ def load_scripts():
             elif issubclass(script_class, scripts_postprocessing.ScriptPostprocessing):
                 postprocessing_scripts_data.append(ScriptClassData(script_class, scriptfile.path, scriptfile.basedir, module))
 
-    # here the scripts_list is already ordered
-    # processing_script is not considered though
-    for scriptfile in scripts_list:
-        try:
-            if scriptfile.basedir != paths.script_path:
-                sys.path = [scriptfile.basedir] + sys.path
-            current_basedir = scriptfile.basedir
+    load_times = {}
+    workers = max(1, int(shared.opts.script_loading_workers))
 
-            script_module = script_loading.load_module(scriptfile.path)
-            register_scripts_from_module(script_module)
+    if workers > 1:
+        # every extension's directory is already on sys.path, so they are not pushed to the front per script
+        modules = import_scripts_parallel(scripts_list, dependencies, workers, load_times)
+        restore_callback_order(scripts_list)
 
-        except Exception:
-            errors.report(f"Error loading script: {scriptfile.filename}", exc_info=True)
+        # here the scripts_list is already ordered
+        for scriptfile in scripts_list:
+            if modules.get(scriptfile.path) is not None:
+                register_scripts_from_module(modules[scriptfile.path], scriptfile)
 
-        finally:
-            sys.path = syspath
-            current_basedir = paths.script_path
-            timer.startup_timer.record(scriptfile.filename)
+        timer.startup_timer.record(f"import scripts ({workers} threads)")
+
+    else:
+        # here the scripts_list is already ordered
+        # processing_script is not considered though
+        for scriptfile in scripts_list:
+            start = time.perf_counter()
+            try:
+                if scriptfile.basedir != paths.script_path:
+                    sys.path = [scriptfile.basedir] + sys.path
+                current_basedir = scriptfile.basedir
+
+                script_module = script_loading.load_module(scriptfile.path)
+                register_scripts_from_module(script_module, scriptfile)
+
+            except Exception:
+                errors.report(f"Error loading script: {scriptfile.filename}", exc_info=True)
+
+            finally:
+                sys.path = syspath
+                current_basedir = paths.script_path
+                load_times[scriptfile.path] = time.perf_counter() - start
+                timer.startup_timer.record(scriptfile.filename)
+
+    for scriptfile in scripts_list:
+        owner = script_owner(scriptfile)
+        extension_load_times[owner] = extension_load_times.get(owner, 0) + load_times.get(scriptfile.path, 0)
+
+    if workers > 1:
+        # time spent in each thread; the threads overlap, so these add up to more than the wall time above
+        for owner, load_time in extension_load_times.items():
+            timer.startup_timer.add_time_to_record(timer.startup_timer.base_category + owner, load_time)
 
     global scripts_txt2img, scripts_img2img, scripts_postproc
 
@@ -857,7 +994,8 @@ class ScriptRunner:
         for script in self.ordered_scripts('process_before_every_step'):
             try:
                 script_args = p.script_args[script.args_from:script.args_to]
-                script.process_before_every_step(p, *script_args, **kwargs)
+                with tracing.span("process_before_every_step", script=script.filename):
+                    script.process_before_every_step(p, *script_args, **kwargs)
             except Exception:
                 errors.report(f"Error running process_before_every_step: {script.filename}", exc_info=True)
 
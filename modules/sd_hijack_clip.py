@@ -1,9 +1,9 @@
 import math
-from collections import namedtuple
+from collections import OrderedDict, namedtuple
 
 import torch
 
-from modules import prompt_parser, devices, sd_hijack, sd_emphasis
+from modules import prompt_parser, devices, sd_hijack, sd_emphasis, shared
 from modules.shared import opts
 
 
@@ -43,6 +43,8 @@ class TextConditionalModel(torch.nn.Module):
         self.id_end = None
         self.id_pad = None
 
+        self.chunk_cache = OrderedDict()
+
     def empty_chunk(self):
         """creates an empty PromptChunk and returns it"""
 
@@ -212,19 +214,23 @@ class TextConditionalModel(torch.nn.Module):
         used_embeddings = {}
         chunk_count = max([len(x) for x in batch_chunks])
 
+        batch_chunks = [chunks + [self.empty_chunk() for _ in range(chunk_count - len(chunks))] for chunks in batch_chunks]
+        for chunks in batch_chunks:
+            for chunk in chunks:
+                for _position, embedding in chunk.fixes:
+                    used_embeddings[embedding.name] = embedding
+
+        devices.torch_npu_set_device()
+        encoded = self.encode_chunks([chunk for chunks in batch_chunks for chunk in chunks])
+
         zs = []
         for i in range(chunk_count):
-            batch_chunk = [chunks[i] if i < len(chunks) else self.empty_chunk() for chunks in batch_chunks]
-
-            tokens = [x.tokens for x in batch_chunk]
-            multipliers = [x.multipliers for x in batch_chunk]
-            self.hijack.fixes = [x.fixes for x in batch_chunk]
+            batch_chunk = [chunks[i] for chunks in batch_chunks]
+            batch_encoded = [encoded[j * chunk_count + i] for j in range(len(batch_chunks))]
 
-            for fixes in self.hijack.fixes:
-                for _position, embedding in fixes:
-                    used_embeddings[embedding.name] = embedding
-            devices.torch_npu_set_device()
-            z = self.process_tokens(tokens, multipliers)
+            z = self.apply_emphasis(torch.stack([x[0] for x in batch_encoded]), [x.tokens for x in batch_chunk], [x.multipliers for x in batch_chunk])
+            if batch_encoded[0][1] is not None:
+                z.pooled = torch.stack([x[1] for x in batch_encoded])
             zs.append(z)
 
         if opts.textual_inversion_add_hashes_to_infotext and used_embeddings:
@@ -250,14 +256,63 @@ class TextConditionalModel(torch.nn.Module):
         else:
             return torch.hstack(zs)
 
-    def process_tokens(self, remade_batch_tokens, batch_multipliers):
+    def chunk_cache_key(self, chunk):
+        """Everything that affects what the transformers network outputs for a chunk, besides the weights of the model itself."""
+
+        return (
+            tuple(chunk.tokens),
+            tuple(chunk.fixes),  # embeddings hash by identity, so a reloaded embedding gets a new key
+            opts.CLIP_stop_at_last_layers,
+            opts.sdxl_clip_l_skip,
+            getattr(getattr(self, 'wrapped', None), 'layer', None),
+            getattr(getattr(self, 'wrapped', None), 'layer_idx', None),
+            getattr(shared.sd_model, 'current_lora_hash', None),
+        )
+
+    def encode_chunks(self, chunks):
         """
-        sends one single prompt chunk to be encoded by transformers neural network.
-        remade_batch_tokens is a batch of tokens - a list, where every element is a list of tokens; usually
-        there are exactly 77 tokens in the list. batch_multipliers is the same but for multipliers instead of tokens.
-        Multipliers are used to give more or less weight to the outputs of transformers network. Each multiplier
-        corresponds to one token.
+        Encodes a list of PromptChunks with one pass through the transformers network, reusing chunks encoded before.
+        Returns a list with a (z, pooled) tuple for every chunk; z has shape (77, C), pooled is None unless the model
+        returns pooled output. Emphasis is not applied: multipliers are left to the caller, as in process_tokens.
         """
+
+        cache_size = opts.CLIP_chunk_cache_size if not torch.is_grad_enabled() else 0
+        if cache_size <= 0:
+            self.chunk_cache.clear()
+
+        results = [None] * len(chunks)
+        missing = {}  # cache key -> positions in chunks that need it; identical chunks are only encoded once
+        for i, chunk in enumerate(chunks):
+            key = self.chunk_cache_key(chunk) if cache_size > 0 else i
+            if cache_size > 0 and key in self.chunk_cache:
+                self.chunk_cache.move_to_end(key)
+                results[i] = self.chunk_cache[key]
+            else:
+                missing.setdefault(key, []).append(i)
+
+        if missing:
+            rows = [chunks[positions[0]] for positions in missing.values()]
+            self.hijack.fixes = [chunk.fixes for chunk in rows]
+
+            z = self.encode_tokens([chunk.tokens for chunk in rows])
+            pooled = getattr(z, 'pooled', None)
+
+            for row, (key, positions) in enumerate(missing.items()):
+                result = (z[row], pooled[row] if pooled is not None else None)
+                for i in positions:
+                    results[i] = result
+
+                if cache_size > 0:
+                    self.chunk_cache[key] = result
+
+            while len(self.chunk_cache) > cache_size:
+                self.chunk_cache.popitem(last=False)
+
+        return results
+
+    def encode_tokens(self, remade_batch_tokens):
+        """sends a batch of token lists, each usually exactly 77 tokens long, through the transformers network"""
+
         tokens = torch.asarray(remade_batch_tokens).to(devices.device)
 
         # this is for SD2: SD1 uses the same token for padding and end of text, while SD2 uses different ones.
@@ -266,10 +321,30 @@ class TextConditionalModel(torch.nn.Module):
                 index = remade_batch_tokens[batch_pos].index(self.id_end)
                 tokens[batch_pos, index+1:tokens.shape[1]] = self.id_pad
 
-        z = self.encode_with_transformers(tokens)
+        return self.encode_with_transformers(tokens)
+
+    def process_tokens(self, remade_batch_tokens, batch_multipliers):
+        """
+        sends one single prompt chunk to be encoded by transformers neural network.
+        remade_batch_tokens is a batch of tokens - a list, where every element is a list of tokens; usually
+        there are exactly 77 tokens in the list. batch_multipliers is the same but for multipliers instead of tokens.
+        Multipliers are used to give more or less weight to the outputs of transformers network. Each multiplier
+        corresponds to one token.
+        """
+        z = self.encode_tokens(remade_batch_tokens)
 
         pooled = getattr(z, 'pooled', None)
 
+        z = self.apply_emphasis(z, remade_batch_tokens, batch_multipliers)
+
+        if pooled is not None:
+            z.pooled = pooled
+
+        return z
+
+    def apply_emphasis(self, z, remade_batch_tokens, batch_multipliers):
+        """applies multipliers to transformers output z for a batch of chunks with the emphasis mode from settings"""
+
         emphasis = sd_emphasis.get_current_option(opts.emphasis)()
         emphasis.tokens = remade_batch_tokens
         emphasis.multipliers = torch.asarray(batch_multipliers).to(devices.device)
@@ -277,12 +352,7 @@ class TextConditionalModel(torch.nn.Module):
 
         emphasis.after_transformers()
 
-        z = emphasis.z
-
-        if pooled is not None:
-            z.pooled = pooled
-
-        return z
+        return emphasis.z
 
 
 class FrozenCLIPEmbedderWithCustomWordsBase(TextConditionalModel):
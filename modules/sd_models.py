@@ -13,7 +13,7 @@ from urllib import request
 import ldm.modules.midas as midas
 import gc
 
-from modules import paths, shared, modelloader, devices, script_callbacks, sd_vae, sd_disable_initialization, errors, hashes, sd_models_config, sd_unet, sd_models_xl, cache, extra_networks, processing, lowvram, sd_hijack, patches
+from modules import paths, shared, modelloader, devices, script_callbacks, sd_vae, sd_disable_initialization, errors, hashes, sd_models_config, sd_unet, sd_models_xl, cache, extra_networks, processing, lowvram, sd_hijack, patches, metrics
 from modules.timer import Timer
 import numpy as np
 from modules_forge import forge_loader
@@ -801,7 +801,8 @@ def reuse_model_from_already_loaded(sd_model, checkpoint_info, timer):
 
 
 def reload_model_weights(sd_model=None, info=None, forced_reload=False):
-    return load_model(info)
+    with metrics.stage("model_load"):
+        return load_model(info)
 
 
 def unload_model_weights(sd_model=None, info=None):
@@ -818,7 +819,8 @@ def apply_token_merging(sd_model, token_merging_ratio):
 
     sd_model.forge_objects.unet = TomePatcher().patch(
         model=sd_model.forge_objects.unet,
-        ratio=token_merging_ratio
+        ratio=token_merging_ratio,
+        plan_refresh_interval=shared.opts.token_merging_plan_reuse
     )
 
     return
@@ -3,7 +3,7 @@ from collections import namedtuple
 import numpy as np
 import torch
 from PIL import Image
-from modules import devices, images, sd_vae_approx, sd_samplers, sd_vae_taesd, shared, sd_models
+from modules import devices, images, sd_vae_approx, sd_samplers, sd_vae_taesd, shared, sd_models, metrics, tracing
 from modules.shared import opts, state
 from modules_forge.forge_sampler import sampling_prepare, sampling_cleanup
 from modules import extra_networks
@@ -73,7 +73,8 @@ def single_sample_to_image(sample, approximation=None):
 
 def decode_first_stage(model, x):
     approx_index = approximation_indexes.get(opts.sd_vae_decode_method, 0)
-    return samples_to_images_tensor(x, approx_index, model)
+    with metrics.stage("vae_decode"):
+        return samples_to_images_tensor(x, approx_index, model)
 
 
 def sample_to_image(samples, index=0, approximation=None):
@@ -279,7 +280,8 @@ class Sampler:
         state.sampling_step = 0
 
         try:
-            return func()
+            with metrics.stage("sampling"), tracing.job(f"{self.config.name} {steps} steps"):
+                return func()
         except RecursionError:
             print(
                 'Encountered RecursionError during sampling, returning last latent. '
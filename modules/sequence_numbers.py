@@ -0,0 +1,132 @@
+"""
+Hands out the sequence numbers at the start of saved image filenames.
+
+Scanning an output directory on every save gets slow once it holds many thousands of images, so the directory is
+scanned once per basename and the next free number is kept from then on. In "Memory" mode it is kept in this
+process only; in "Memory and file" mode it is kept in a small state file in the directory, read and updated under
+an exclusive file lock, so several webui processes saving to the same directory never get the same number and a
+restarted process does not have to scan again. Delete the state file to make it rescan.
+"""
+
+import json
+import os
+import threading
+
+state_filename = ".sequence_numbers.json"
+
+if os.name == 'nt':
+    import msvcrt
+
+    def lock_file(file):
+        file.seek(0)
+        while True:
+            try:
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                pass  # LK_LOCK gives up after ten seconds; keep waiting
+
+    def unlock_file(file):
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def lock_file(file):
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+
+    def unlock_file(file):
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+def scan(path, basename):
+    """Returns the number after the highest one used by files in path, or 0 if there are none."""
+    result = -1
+    if basename != '':
+        basename = f"{basename}-"
+
+    prefix_length = len(basename)
+    for p in os.listdir(path):
+        if p.startswith(basename):
+            parts = os.path.splitext(p[prefix_length:])[0].split('-')  # splits the filename (removing the basename first if one is defined, so the sequence number is always the first element)
+            try:
+                result = max(int(parts[0]), result)
+            except ValueError:
+                pass
+
+    return result + 1
+
+
+class DirectoryIndex:
+    def __init__(self, path):
+        self.path = path
+        self.next_numbers = {}
+        self.lock = threading.Lock()
+
+    def update(self, basename, persist, change):
+        """Calls change(next number) under the lock and stores what it returns as the new next number."""
+        with self.lock:
+            if not persist:
+                if basename not in self.next_numbers:
+                    self.next_numbers[basename] = scan(self.path, basename)
+
+                self.next_numbers[basename] = change(self.next_numbers[basename])
+                return
+
+            with open(os.path.join(self.path, state_filename), "a+", encoding="utf8") as file:
+                lock_file(file)
+                try:
+                    file.seek(0)
+                    try:
+                        state = json.loads(file.read() or "{}")
+                    except ValueError:
+                        state = {}
+
+                    if basename not in state:
+                        state[basename] = scan(self.path, basename)
+
+                    state[basename] = change(state[basename])
+                    self.next_numbers[basename] = state[basename]
+
+                    file.seek(0)
+                    file.truncate()
+                    file.write(json.dumps(state))
+                    file.flush()
+                finally:
+                    unlock_file(file)
+
+
+indexes = {}
+indexes_lock = threading.Lock()
+
+
+def directory_index(path):
+    path = os.path.abspath(path)
+    with indexes_lock:
+        index = indexes.get(path)
+        if index is None:
+            index = indexes[path] = DirectoryIndex(path)
+
+    return index
+
+
+def allocate(path, basename, persist=False):
+    """Reserves and returns the next sequence number for basename in the directory path."""
+    allocated = []
+
+    def take(next_number):
+        allocated.append(next_number)
+        return next_number + 1
+
+    directory_index(path).update(basename, persist, take)
+    return allocated[0]
+
+
+def mark_used(path, basename, number, persist=False):
+    """Makes sure number is never handed out for basename in path, e.g. after a file with it was found on disk."""
+    directory_index(path).update(basename, persist, lambda next_number: max(next_number, number + 1))
+
+
+def clear():
+    with indexes_lock:
+        indexes.clear()
@@ -37,6 +37,8 @@ options_templates.update(options_section(('saving-images', "Saving images/grids"
     "samples_format": OptionInfo('png', 'File format for images', ui_components.DropdownEditable, {"choices": ("png", "jpg", "jpeg", "webp", "avif")}).info("manual input of <a href='https://pillow.readthedocs.io/en/stable/handbook/image-file-formats.html' target='_blank'>other formats</a> is possible, but compatibility is not guaranteed"),
     "samples_filename_pattern": OptionInfo("", "Images filename pattern", component_args=hide_dirs).link("wiki", "https://github.com/AUTOMATIC1111/stable-diffusion-webui/wiki/Custom-Images-Filename-Name-and-Subdirectory"),
     "save_images_add_number": OptionInfo(True, "Add number to filename when saving", component_args=hide_dirs),
+    "save_images_sequence_index": OptionInfo("Memory", "Finding the number to add to filename", gr.Radio, {"choices": ["Scan directory", "Memory", "Memory and file"], **hide_dirs}).info("Scan directory = list the directory for every image, slow for large directories; Memory = scan once, then count; Memory and file = also keep the count in a file in the directory, for several webui instances saving to one directory"),
+    "output_catalog": OptionInfo(False, "Add saved images to the output catalog").info("SQLite database with the parsed infotext of every saved image, searchable through the /sdapi/v1/catalog API"),
     "save_images_replace_action": OptionInfo("Replace", "Saving the image to an existing file", gr.Radio, {"choices": ["Replace", "Add number suffix"], **hide_dirs}),
     "grid_save": OptionInfo(True, "Always save all generated image grids"),
     "grid_format": OptionInfo('png', 'File format for grids', ui_components.DropdownEditable, {"choices": ("png", "jpg", "jpeg", "webp", "avif")}).info("manual input of <a href='https://pillow.readthedocs.io/en/stable/handbook/image-file-formats.html' target='_blank'>other formats</a> is possible, but compatibility is not guaranteed"),
@@ -99,6 +101,8 @@ options_templates.update(options_section(('saving-to-dirs', "Saving to a directo
 
 options_templates.update(options_section(('upscaling', "Upscaling", "postprocessing"), {
     "unload_sd_during_upscale": OptionInfo(False, "Unload SD Model from VRAM to RAM during upscale"),
+    "sd_upscale_batched_tiles": OptionInfo(False, "SD upscale: sample all tiles in one processing run").info("faster; always-on scripts run once per upscale, so ones that use the img2img input (e.g. ControlNet with no image of its own) see only the first tile"),
+    "upscaler_pool_size": OptionInfo(1024, "Memory for keeping upscaler models loaded (MB)", gr.Number, {"precision": 0}).info("least recently used models are dropped first; 0 = load the model from disk for every image"),
     "ESRGAN_tile": OptionInfo(256, "Tile size for ESRGAN upscalers.", gr.Slider, {"minimum": 0, "maximum": 4096, "step": 16}).info("0 = no tiling"),
     "ESRGAN_tile_overlap": OptionInfo(32, "Tile overlap for ESRGAN upscalers.", gr.Slider, {"minimum": 0, "maximum": 2048, "step": 8}).info("Low values = visible seam"),
     "RCAN_tile": OptionInfo(512, "Tile size for RCAN upscaler. 0 = no tiling.", gr.Slider, {"minimum": 0, "maximum": 4096, "step": 16}),
@@ -129,6 +133,7 @@ options_templates.update(options_section(('face-restoration', "Face restoration"
     "face_restoration_model": OptionInfo("CodeFormer", "Face restoration model", gr.Radio, lambda: {"choices": [x.name() for x in shared.face_restorers]}),
     "code_former_weight": OptionInfo(0.5, "CodeFormer weight", gr.Slider, {"minimum": 0, "maximum": 1, "step": 0.01}).info("0 = maximum effect; 1 = minimum effect"),
     "face_restoration_unload": OptionInfo(False, "Move face restoration model from VRAM into RAM after processing"),
+    "face_restoration_batch_size": OptionInfo(8, "Face restoration batch size", gr.Slider, {"minimum": 1, "maximum": 64, "step": 1}).info("number of faces from the whole generation batch restored in one model call"),
 }))
 
 options_templates.update(options_section(('system', "System", "system"), {
@@ -146,6 +151,7 @@ options_templates.update(options_section(('system', "System", "system"), {
     "hide_ldm_prints": OptionInfo(True, "Prevent Stability-AI's ldm/sgm modules from printing noise to console."),
     "dump_stacks_on_signal": OptionInfo(False, "Print stack traces before exiting the program with ctrl+c."),
     "concurrent_git_fetch_limit": OptionInfo(16, "Number of simultaneous extension update checks ", gr.Slider, {"step": 1, "minimum": 1, "maximum": 100}).info("reduce extension update check time"),
+    "script_loading_workers": OptionInfo(1, "Number of threads importing extension scripts at startup", gr.Slider, {"step": 1, "minimum": 1, "maximum": 32}).info("1 = one by one; more threads import independent extensions at the same time").needs_restart(),
 }))
 
 options_templates.update(options_section(('profiler', "Profiler", "system"), {
@@ -162,6 +168,13 @@ Warning: writing profile can take a lot of time, up to 30 seconds, and the file
     "profiling_profile_memory": OptionInfo(True, "Profile memory"),
     "profiling_with_stack": OptionInfo(True, "Include python stack"),
     "profiling_filename": OptionInfo("trace.json", "Profile filename"),
+    "tracing_explanation": OptionHTML("""
+Lightweight tracing records only the time spent in model calls, ControlNet, CFG functions and per-step script callbacks,
+and is cheap enough to leave enabled. Each traced job is written as a separate Chrome trace file.
+"""),
+    "tracing_sample_every": OptionInfo(0, "Trace one in every N sampling jobs", gr.Number, {"precision": 0}).info("0 = disable"),
+    "tracing_synchronize": OptionInfo(False, "Synchronize GPU at the end of each traced span").info("more accurate GPU timings, slower traced jobs"),
+    "tracing_directory": OptionInfo("", "Directory for trace files").info("empty = traces folder in webui data directory"),
 }))
 
 options_templates.update(options_section(('API', "API", "system"), {
@@ -177,6 +190,9 @@ options_templates.update(options_section(('training', "Training", "training"), {
     "save_training_settings_to_txt": OptionInfo(True, "Save textual inversion and hypernet settings to a text file whenever training starts."),
     "dataset_filename_word_regex": OptionInfo("", "Filename word regex"),
     "dataset_filename_join_string": OptionInfo(" ", "Filename join string"),
+    "training_latent_cache": OptionInfo(True, "Cache VAE latents of training images on disk").info("training again on the same images with the same VAE and resolution skips encoding; latents are streamed from the cache instead of kept in RAM"),
+    "training_latent_encode_batch_size": OptionInfo(4, "Batch size for VAE-encoding training images", gr.Slider, {"minimum": 1, "maximum": 64, "step": 1}),
+    "training_dataloader_workers": OptionInfo(0, "Number of DataLoader worker processes for training", gr.Slider, {"minimum": 0, "maximum": 16, "step": 1}).info("only used when all latents come from the disk cache; 0 = load in the main process"),
     "training_image_repeats_per_epoch": OptionInfo(1, "Number of repeats for a single input image per epoch; used only for displaying epoch number", gr.Number, {"precision": 0}),
     "training_write_csv_every": OptionInfo(500, "Save an csv containing the loss to log directory every N steps, 0 to disable"),
     "training_xattention_optimizations": OptionInfo(False, "Use cross attention optimizations while training"),
@@ -197,6 +213,7 @@ options_templates.update(options_section(('sd', "Stable Diffusion", "sd"), {
     "comma_padding_backtrack": OptionInfo(20, "Prompt word wrap length limit", gr.Slider, {"minimum": 0, "maximum": 74, "step": 1}).info("in tokens - for texts shorter than specified, if they don't fit into 75 token limit, move them to the next 75 token chunk"),
     "sdxl_clip_l_skip": OptionInfo(False, "Clip skip SDXL", gr.Checkbox).info("Enable Clip skip for the secondary clip model in sdxl. Has no effect on SD 1.5 or SD 2.0/2.1."),
     "CLIP_stop_at_last_layers": OptionInfo(1, "Clip skip", gr.Slider, {"minimum": 1, "maximum": 12, "step": 1}, infotext="Clip skip").link("wiki", "https://github.com/AUTOMATIC1111/stable-diffusion-webui/wiki/Features#clip-skip").info("ignore last layers of CLIP network; 1 ignores none, 2 ignores one layer"),
+    "CLIP_chunk_cache_size": OptionInfo(64, "Number of encoded prompt chunks to keep", gr.Number, {"precision": 0}).info("chunks of 75 tokens shared between prompts, such as a style prefix, are only run through CLIP once; 0 = disable"),
     "upcast_attn": OptionInfo(False, "Upcast cross attention layer to float32"),
     "randn_source": OptionInfo("GPU", "Random number generator source.", gr.Radio, {"choices": ["GPU", "CPU", "NV"]}, infotext="RNG").info("changes seeds drastically; use CPU to produce the same picture across different videocard vendors; use NV to produce same picture as on NVidia videocards"),
     "tiling": OptionInfo(False, "Tiling", infotext='Tiling').info("produce a tileable picture"),
@@ -292,6 +309,7 @@ options_templates.update(options_section(('sd_sampling', "SD Sampling backend fo
 }))
 
 options_templates.update(options_section(('img2img', "img2img", "sd"), {
+    "inpainting_fill_method": OptionInfo("Blur", "Inpainting \"fill\" method for masked content", gr.Radio, {"choices": ["Blur", "Pyramid"]}).info("Pyramid = much faster on large images, similar but not identical result"),
     "inpainting_mask_weight": OptionInfo(1.0, "Inpainting conditioning mask strength", gr.Slider, {"minimum": 0.0, "maximum": 1.0, "step": 0.01}, infotext='Conditional mask weight'),
     "initial_noise_multiplier": OptionInfo(1.0, "Noise multiplier for img2img", gr.Slider, {"minimum": 0.0, "maximum": 1.5, "step": 0.001}, infotext='Noise multiplier'),
     "img2img_extra_noise": OptionInfo(0.0, "Extra noise multiplier for img2img and hires fix", gr.Slider, {"minimum": 0.0, "maximum": 1.0, "step": 0.01}, infotext='Extra noise').info("0 = disabled (default); should be lower than denoising strength"),
@@ -315,8 +333,10 @@ options_templates.update(options_section(('optimizations', "Optimizations", "sd"
     "token_merging_ratio": OptionInfo(0.0, "Token merging ratio", gr.Slider, {"minimum": 0.0, "maximum": 0.9, "step": 0.1}, infotext='Token merging ratio').link("PR", "https://github.com/AUTOMATIC1111/stable-diffusion-webui/pull/9256").info("0=disable, higher=faster"),
     "token_merging_ratio_img2img": OptionInfo(0.0, "Token merging ratio for img2img", gr.Slider, {"minimum": 0.0, "maximum": 0.9, "step": 0.1}).info("only applies if non-zero and overrides above"),
     "token_merging_ratio_hr": OptionInfo(0.0, "Token merging ratio for high-res pass", gr.Slider, {"minimum": 0.0, "maximum": 0.9, "step": 0.1}, infotext='Token merging ratio hr').info("only applies if non-zero and overrides above"),
+    "token_merging_plan_reuse": OptionInfo(0, "Token merging plan reuse (steps)", gr.Slider, {"minimum": 0, "maximum": 10, "step": 1}, infotext='Token merging plan reuse').info("compute which tokens to merge once per resolution and reuse it across blocks and this many steps; 0=recompute in every attention call"),
     "pad_cond_uncond": OptionInfo(False, "Pad prompt/negative prompt", infotext='Pad conds').info("improves performance when prompt and negative prompt have different lengths; changes seeds"),
     "pad_cond_uncond_v0": OptionInfo(False, "Pad prompt/negative prompt (v0)", infotext='Pad conds v0').info("alternative implementation for the above; used prior to 1.6.0 for DDIM sampler; overrides the above if set; WARNING: truncates negative prompt if it's too long; changes seeds"),
+    "fused_cfg": OptionInfo(False, "Fused CFG").info("combine prompt and negative prompt predictions in place, and use the in-place variants of RescaleCFG, APG and Mahiro CFG; saves memory bandwidth at high resolutions; may change images very slightly"),
     "persistent_cond_cache": OptionInfo(True, "Persistent cond cache").info("do not recalculate conds from prompts if prompts have not changed since previous calculation"),
     "batch_cond_uncond": OptionInfo(True, "Batch cond/uncond").info("do both conditional and unconditional denoising in one batch; uses a bit more VRAM during sampling, but improves speed; previously this was controlled by --always-batch-cond-uncond commandline argument"),
     "fp8_storage": OptionInfo("Disable", "FP8 weight", gr.Radio, {"choices": ["Disable", "Enable for SDXL", "Enable"]}).info("Use FP8 to store Linear/Conv layers' weight. Require pytorch>=2.1.0."),
@@ -338,6 +358,7 @@ options_templates.update(options_section(('compatibility', "Compatibility", "sd"
 
 options_templates.update(options_section(('interrogate', "Interrogate"), {
     "interrogate_keep_models_in_memory": OptionInfo(False, "Keep models in VRAM"),
+    "interrogate_batch_size": OptionInfo(0, "Batch size for folder and API batch interrogation", gr.Slider, {"minimum": 0, "maximum": 64, "step": 1}).info("0 = fit to free VRAM"),
     "interrogate_return_ranks": OptionInfo(False, "Include ranks of model tags matches in results.").info("booru only"),
     "interrogate_clip_num_beams": OptionInfo(1, "BLIP: num_beams", gr.Slider, {"minimum": 1, "maximum": 16, "step": 1}),
     "interrogate_clip_min_length": OptionInfo(24, "BLIP: minimum description length", gr.Slider, {"minimum": 1, "maximum": 128, "step": 1}),
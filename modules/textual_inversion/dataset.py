@@ -1,3 +1,4 @@
+import copy
 import os
 import numpy as np
 import PIL
@@ -5,11 +6,13 @@ import torch
 from torch.utils.data import Dataset, DataLoader, Sampler
 from torchvision import transforms
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from random import shuffle, choices
 
 import random
 import tqdm
 from modules import devices, shared, images
+from modules.textual_inversion import latent_cache
 import re
 
 from ldm.modules.distributions.distributions import DiagonalGaussianDistribution
@@ -18,17 +21,30 @@ re_numbers_at_start = re.compile(r"^[-\d]+\s*")
 
 
 class DatasetEntry:
-    def __init__(self, filename=None, filename_text=None, latent_dist=None, latent_sample=None, cond=None, cond_text=None, pixel_values=None, weight=None):
+    def __init__(self, filename=None, filename_text=None, latent_dist=None, latent_sample=None, cond=None, cond_text=None, pixel_values=None, weight=None, latent_file=None):
         self.filename = filename
         self.filename_text = filename_text
         self.weight = weight
         self.latent_dist = latent_dist
         self.latent_sample = latent_sample
+        self.latent_file = latent_file
+        self.latent_shape = None
         self.cond = cond
         self.cond_text = cond_text
         self.pixel_values = pixel_values
 
 
+class PreparedImage:
+    def __init__(self, path):
+        self.path = path
+        self.image = None
+        self.alpha_channel = None
+        self.latent_key = None
+        self.latent_sample = None
+        self.latent_dist = None
+        self.latent_file = None
+
+
 class PersonalizedBase(Dataset):
     def __init__(self, data_root, width, height, repeats, flip_p=0.5, placeholder_token="*", model=None, cond_model=None, device=None, template_file=None, include_cond=False, batch_size=1, gradient_step=1, shuffle_tags=False, tag_drop_out=0, latent_sampling_method='once', varsize=False, use_weight=False):
         re_word = re.compile(shared.opts.dataset_filename_word_regex) if shared.opts.dataset_filename_word_regex else None
@@ -55,86 +71,54 @@ class PersonalizedBase(Dataset):
         groups = defaultdict(list)
 
         print("Preparing dataset...")
-        for path in tqdm.tqdm(self.image_paths):
-            alpha_channel = None
-            if shared.state.interrupted:
-                raise Exception("interrupted")
+        self.latent_store = latent_cache.LatentStore(model) if shared.opts.training_latent_cache else None
+        resolution = None if varsize else (width, height)
+        encode_batch_size = max(1, int(shared.opts.training_latent_encode_batch_size))
+
+        def load(path):
+            # runs in a worker thread; the image is only decoded when its latent has to be computed or for its alpha channel
+            item = PreparedImage(path)
+            if self.latent_store is not None:
+                item.latent_key = self.latent_store.latent_key(latent_cache.file_hash(path), resolution, latent_sampling_method)
+                if self.latent_store.contains(item.latent_key) and not use_weight:
+                    return item
+
             try:
                 image = images.read(path)
                 #Currently does not work for single color transparency
                 #We would need to read image.info['transparency'] for that
                 if use_weight and 'A' in image.getbands():
-                    alpha_channel = image.getchannel('A')
+                    item.alpha_channel = image.getchannel('A')
                 image = image.convert('RGB')
                 if not varsize:
                     image = image.resize((width, height), PIL.Image.BICUBIC)
             except Exception:
-                continue
-
-            text_filename = f"{os.path.splitext(path)[0]}.txt"
-            filename = os.path.basename(path)
-
-            if os.path.exists(text_filename):
-                with open(text_filename, "r", encoding="utf8") as file:
-                    filename_text = file.read()
-            else:
-                filename_text = os.path.splitext(filename)[0]
-                filename_text = re.sub(re_numbers_at_start, '', filename_text)
-                if re_word:
-                    tokens = re_word.findall(filename_text)
-                    filename_text = (shared.opts.dataset_filename_join_string or "").join(tokens)
-
-            npimage = np.array(image).astype(np.uint8)
-            npimage = (npimage / 127.5 - 1.0).astype(np.float32)
-
-            torchdata = torch.from_numpy(npimage).permute(2, 0, 1).to(device=device, dtype=torch.float32)
-            latent_sample = None
-
-            with devices.autocast():
-                latent_dist = model.encode_first_stage(torchdata.unsqueeze(dim=0))
-
-            #Perform latent sampling, even for random sampling.
-            #We need the sample dimensions for the weights
-            if latent_sampling_method == "deterministic":
-                if isinstance(latent_dist, DiagonalGaussianDistribution):
-                    # Works only for DiagonalGaussianDistribution
-                    latent_dist.std = 0
-                else:
-                    latent_sampling_method = "once"
-            latent_sample = model.get_first_stage_encoding(latent_dist).squeeze().to(devices.cpu)
-
-            if use_weight and alpha_channel is not None:
-                channels, *latent_size = latent_sample.shape
-                weight_img = alpha_channel.resize(latent_size)
-                npweight = np.array(weight_img).astype(np.float32)
-                #Repeat for every channel in the latent sample
-                weight = torch.tensor([npweight] * channels).reshape([channels] + latent_size)
-                #Normalize the weight to a minimum of 0 and a mean of 1, that way the loss will be comparable to default.
-                weight -= weight.min()
-                weight /= weight.mean()
-            elif use_weight:
-                #If an image does not have a alpha channel, add a ones weight map anyway so we can stack it later
-                weight = torch.ones(latent_sample.shape)
-            else:
-                weight = None
-
-            if latent_sampling_method == "random":
-                entry = DatasetEntry(filename=path, filename_text=filename_text, latent_dist=latent_dist, weight=weight)
-            else:
-                entry = DatasetEntry(filename=path, filename_text=filename_text, latent_sample=latent_sample, weight=weight)
-
-            if not (self.tag_drop_out != 0 or self.shuffle_tags):
-                entry.cond_text = self.create_text(filename_text)
-
-            if include_cond and not (self.tag_drop_out != 0 or self.shuffle_tags):
-                with devices.autocast():
-                    entry.cond = cond_model([entry.cond_text]).to(devices.cpu).squeeze(0)
-            groups[image.size].append(len(self.dataset))
-            self.dataset.append(entry)
-            del torchdata
-            del latent_dist
-            del latent_sample
-            del weight
+                return None
+
+            if self.latent_store is None or not self.latent_store.contains(item.latent_key):
+                item.image = np.array(image).astype(np.uint8)
+            return item
+
+        with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor, tqdm.tqdm(total=len(self.image_paths)) as pbar:
+            chunk_size = encode_batch_size * 8
+            for chunk_start in range(0, len(self.image_paths), chunk_size):
+                if shared.state.interrupted:
+                    raise Exception("interrupted")
+
+                chunk = self.image_paths[chunk_start:chunk_start + chunk_size]
+                items = [item for item in executor.map(load, chunk) if item is not None]
+
+                latent_sampling_method = self.encode_latents([item for item in items if item.image is not None], model, device, latent_sampling_method, encode_batch_size)
+
+                for item in items:
+                    entry = self.create_entry(item, re_word, latent_sampling_method, use_weight, include_cond, cond_model)
+                    groups[tuple(entry.latent_shape[-2:])].append(len(self.dataset))
+                    self.dataset.append(entry)
+
+                pbar.update(len(chunk))
+
+        if self.latent_store is not None and self.latent_store.hits:
+            print(f"Reused {self.latent_store.hits} cached latents from {self.latent_store.directory}")
 
         self.length = len(self.dataset)
         self.groups = list(groups.values())
@@ -145,10 +129,116 @@ class PersonalizedBase(Dataset):
 
         if len(groups) > 1:
             print("Buckets:")
-            for (w, h), ids in sorted(groups.items(), key=lambda x: x[0]):
-                print(f"  {w}x{h}: {len(ids)}")
+            for (h, w), ids in sorted(groups.items(), key=lambda x: x[0]):
+                print(f"  {w * 8}x{h * 8}: {len(ids)}")
             print()
 
+    def encode_latents(self, items, model, device, latent_sampling_method, batch_size):
+        """VAE-encodes item.image for all items, grouped by size and batch_size at a time, and stores the results on the items.
+
+        Returns latent_sampling_method, which falls back to "once" if the VAE can't do deterministic sampling."""
+        by_size = defaultdict(list)
+        for item in items:
+            by_size[item.image.shape].append(item)
+
+        for group in by_size.values():
+            for i in range(0, len(group), batch_size):
+                batch = group[i:i + batch_size]
+
+                npimages = (np.stack([item.image for item in batch]) / 127.5 - 1.0).astype(np.float32)
+                torchdata = torch.from_numpy(npimages).permute(0, 3, 1, 2).to(device=device, dtype=torch.float32)
+
+                with devices.autocast():
+                    latent_dist = model.encode_first_stage(torchdata)
+
+                #Perform latent sampling, even for random sampling.
+                #We need the sample dimensions for the weights
+                if latent_sampling_method == "deterministic":
+                    if isinstance(latent_dist, DiagonalGaussianDistribution):
+                        # Works only for DiagonalGaussianDistribution
+                        latent_dist.std = 0
+                    else:
+                        latent_sampling_method = "once"
+                latent_samples = model.get_first_stage_encoding(latent_dist).to(devices.cpu)
+
+                for j, item in enumerate(batch):
+                    item.image = None
+                    item.latent_sample = latent_samples[j]
+                    if latent_sampling_method == "random" and isinstance(latent_dist, DiagonalGaussianDistribution):
+                        item.latent_dist = DiagonalGaussianDistribution(latent_dist.parameters[j:j + 1])
+                    elif self.latent_store is not None:
+                        item.latent_file = self.latent_store.save(item.latent_key, item.latent_sample)
+
+                del torchdata
+                del latent_dist
+
+        return latent_sampling_method
+
+    def create_entry(self, item, re_word, latent_sampling_method, use_weight, include_cond, cond_model):
+        path = item.path
+        text_filename = f"{os.path.splitext(path)[0]}.txt"
+        filename = os.path.basename(path)
+
+        if os.path.exists(text_filename):
+            with open(text_filename, "r", encoding="utf8") as file:
+                filename_text = file.read()
+        else:
+            filename_text = os.path.splitext(filename)[0]
+            filename_text = re.sub(re_numbers_at_start, '', filename_text)
+            if re_word:
+                tokens = re_word.findall(filename_text)
+                filename_text = (shared.opts.dataset_filename_join_string or "").join(tokens)
+
+        latent_sample = item.latent_sample
+        if item.latent_file is None and self.latent_store is not None and item.latent_dist is None:
+            item.latent_file = self.latent_store.path(item.latent_key)
+            latent_sample = latent_cache.load_memmap(item.latent_file)
+            self.latent_store.hits += 1
+
+        if use_weight and item.alpha_channel is not None:
+            channels, *latent_size = latent_sample.shape
+            weight_img = item.alpha_channel.resize(latent_size)
+            npweight = np.array(weight_img).astype(np.float32)
+            #Repeat for every channel in the latent sample
+            weight = torch.tensor([npweight] * channels).reshape([channels] + latent_size)
+            #Normalize the weight to a minimum of 0 and a mean of 1, that way the loss will be comparable to default.
+            weight -= weight.min()
+            weight /= weight.mean()
+        elif use_weight:
+            #If an image does not have a alpha channel, add a ones weight map anyway so we can stack it later
+            weight = torch.ones(latent_sample.shape)
+        else:
+            weight = None
+
+        if latent_sampling_method == "random" and item.latent_dist is not None:
+            entry = DatasetEntry(filename=path, filename_text=filename_text, latent_dist=item.latent_dist, weight=weight)
+        elif item.latent_file is not None:
+            # streamed from the memory-mapped cache file in __getitem__
+            entry = DatasetEntry(filename=path, filename_text=filename_text, latent_file=item.latent_file, weight=weight)
+        else:
+            entry = DatasetEntry(filename=path, filename_text=filename_text, latent_sample=latent_sample, weight=weight)
+        entry.latent_shape = tuple(latent_sample.shape)
+
+        if not (self.tag_drop_out != 0 or self.shuffle_tags):
+            entry.cond_text = self.create_text(filename_text)
+
+        if include_cond and not (self.tag_drop_out != 0 or self.shuffle_tags):
+            entry.cond = self.encode_cond(entry.cond_text, cond_model)
+
+        return entry
+
+    def encode_cond(self, text, cond_model):
+        key = self.latent_store.cond_key(text) if self.latent_store is not None else None
+        if key is not None and self.latent_store.contains(key):
+            return latent_cache.load_memmap(self.latent_store.path(key))
+
+        with devices.autocast():
+            cond = cond_model([text]).to(devices.cpu).squeeze(0)
+
+        if key is not None:
+            self.latent_store.save(key, cond)
+        return cond
+
     def create_text(self, filename_text):
         text = random.choice(self.lines)
         tags = filename_text.split(',')
@@ -167,10 +257,19 @@ class PersonalizedBase(Dataset):
         entry = self.dataset[i]
         if self.tag_drop_out != 0 or self.shuffle_tags:
             entry.cond_text = self.create_text(entry.filename_text)
-        if self.latent_sampling_method == "random":
+        if entry.latent_file is not None:
+            # return a copy so that the latent read from disk isn't kept alive by the dataset
+            entry = copy.copy(entry)
+            entry.latent_sample = latent_cache.load_memmap(entry.latent_file)
+        elif self.latent_sampling_method == "random":
             entry.latent_sample = shared.sd_model.get_first_stage_encoding(entry.latent_dist).to(devices.cpu)
         return entry
 
+    @property
+    def streaming(self):
+        """True if all latents are read from the disk cache, which lets DataLoader workers load them in parallel."""
+        return all(entry.latent_file is not None for entry in self.dataset)
+
 
 class GroupedBatchSampler(Sampler):
     def __init__(self, data_source: PersonalizedBase, batch_size: int):
@@ -207,8 +306,12 @@ class GroupedBatchSampler(Sampler):
 
 
 class PersonalizedDataLoader(DataLoader):
-    def __init__(self, dataset, latent_sampling_method="once", batch_size=1, pin_memory=False):
-        super(PersonalizedDataLoader, self).__init__(dataset, batch_sampler=GroupedBatchSampler(dataset, batch_size), pin_memory=pin_memory)
+    def __init__(self, dataset, latent_sampling_method="once", batch_size=1, pin_memory=False, num_workers=0):
+        if not dataset.streaming:
+            # entries held in RAM or sampled with the VAE on the main process can't go through worker processes
+            num_workers = 0
+
+        super(PersonalizedDataLoader, self).__init__(dataset, batch_sampler=GroupedBatchSampler(dataset, batch_size), pin_memory=pin_memory, num_workers=num_workers, persistent_workers=num_workers > 0)
         if latent_sampling_method == "random":
             self.collate_fn = collate_wrapper_random
         else:
@@ -0,0 +1,105 @@
+"""
+On-disk store for the VAE latents and text conditioning of training images.
+
+Every entry is a .npy file under <cache dir>/training_latents, named after a hash of everything that changes
+the stored value: the image file contents, training resolution, VAE and latent sampling method for latents,
+and the prompt text, checkpoint, CLIP skip, emphasis mode, LoRAs and embeddings for conditioning. Entries are
+opened memory-mapped, so datasets do not have to keep their latents in RAM and training over the same folder
+again skips VAE encoding altogether.
+"""
+
+import hashlib
+import os
+import uuid
+
+import numpy as np
+import torch
+
+from modules import cache, devices, sd_vae, shared
+from modules_forge.content_cache import content_hash
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def checkpoint_id(model):
+    info = getattr(model, "sd_checkpoint_info", None)
+    if info is None:
+        return None
+
+    if info.sha256:
+        return info.sha256
+
+    return f"{info.filename}:{os.path.getmtime(info.filename)}"
+
+
+def vae_id(model):
+    """Identifies the VAE used to encode latents; the checkpoint stands in for its baked-in VAE."""
+    vae = sd_vae.get_loaded_vae_hash() if sd_vae.loaded_vae_file else checkpoint_id(model)
+    return vae, str(devices.dtype_vae)
+
+
+def cond_settings(text):
+    """What besides the text and checkpoint changes a prompt's conditioning, as in FrozenCLIPEmbedderWithCustomWordsBase.chunk_cache_key."""
+    from modules.sd_hijack import model_hijack
+
+    embeddings = sorted((name, embedding.hash or embedding.checksum()) for name, embedding in model_hijack.embedding_db.word_embeddings.items() if name in text)
+    return (
+        shared.opts.CLIP_stop_at_last_layers,
+        shared.opts.sdxl_clip_l_skip,
+        shared.opts.emphasis,
+        getattr(shared.sd_model, 'current_lora_hash', None),
+        embeddings,
+    )
+
+
+def to_numpy(tensor):
+    tensor = tensor.detach().cpu()
+    if tensor.dtype == torch.bfloat16:
+        tensor = tensor.float()
+    return tensor.numpy()
+
+
+class LatentStore:
+    def __init__(self, model, directory=None):
+        self.directory = directory or os.path.join(cache.cache_dir, "training_latents")
+        self.vae = vae_id(model)
+        self.checkpoint = checkpoint_id(model)
+        self.hits = 0
+
+    def latent_key(self, image_hash, resolution, latent_sampling_method):
+        return content_hash("latent", image_hash, resolution, self.vae, latent_sampling_method)
+
+    def cond_key(self, text):
+        return content_hash("cond", text, self.checkpoint, cond_settings(text))
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.npy")
+
+    def contains(self, key):
+        return os.path.isfile(self.path(key))
+
+    def save(self, key, tensor):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # write under a temporary name first so concurrent or interrupted runs never see a partial file
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as file:
+            np.save(file, to_numpy(tensor))
+        os.replace(tmp_path, path)
+
+        return path
+
+
+def load_memmap(path):
+    """
+    Returns a stored entry as a tensor backed by a copy-on-write memory map of its file: pages are read from disk
+    as they are used, and writes to the tensor go to private memory instead of the file.
+    """
+    return torch.from_numpy(np.load(path, mmap_mode="c"))
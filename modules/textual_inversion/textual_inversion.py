@@ -483,7 +483,7 @@ def train_embedding(id_task, embedding_name, learn_rate, batch_size, gradient_st
 
     latent_sampling_method = ds.latent_sampling_method
 
-    dl = modules.textual_inversion.dataset.PersonalizedDataLoader(ds, latent_sampling_method=latent_sampling_method, batch_size=ds.batch_size, pin_memory=pin_memory)
+    dl = modules.textual_inversion.dataset.PersonalizedDataLoader(ds, latent_sampling_method=latent_sampling_method, batch_size=ds.batch_size, pin_memory=pin_memory, num_workers=shared.opts.training_dataloader_workers)
 
     if unload:
         shared.parallel_processing_allowed = False
@@ -0,0 +1,140 @@
+"""
+Lightweight span tracing for the sampling loop.
+
+Unlike modules.profiling, which wraps a whole job in torch.profiler, this only records wall-clock spans
+around a handful of hot calls (apply_model, ControlNet, CFG and post-CFG functions, per-script step
+callbacks). Only one in `tracing_sample_every` jobs is traced; for all other jobs span() returns a shared
+no-op context manager. Traced jobs are written as Chrome trace JSON, viewable in chrome://tracing or Perfetto.
+"""
+
+import contextlib
+import itertools
+import json
+import os
+import threading
+import time
+
+from modules import shared
+
+
+null_span = contextlib.nullcontext()
+
+job_counter = itertools.count()
+current_trace = None
+last_trace_filename = None
+
+
+class Trace:
+    def __init__(self, name, synchronize=False):
+        self.name = name
+        self.synchronize = synchronize
+        self.events = []
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+
+    def add(self, name, start, end, args=None):
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": (start - self.start) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": self.pid,
+            "tid": self.tid,
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def to_chrome_trace(self):
+        return {
+            "traceEvents": self.events,
+            "displayTimeUnit": "ms",
+            "otherData": {"job": self.name, "started_at": self.started_at},
+        }
+
+    def totals(self):
+        result = {}
+        for e in self.events:
+            result[e["name"]] = result.get(e["name"], 0.0) + e["dur"] / 1e6
+        return result
+
+
+class Span:
+    def __init__(self, trace, name, args):
+        self.trace = trace
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, exc_tb):
+        if self.trace.synchronize:
+            synchronize_device()
+        self.trace.add(self.name, self.start, time.perf_counter(), self.args)
+
+
+def synchronize_device():
+    import torch
+
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+
+
+def span(name, **args):
+    """Returns a context manager timing `name` in the current trace, or a no-op if this job is not traced."""
+    trace = current_trace
+    if trace is None:
+        return null_span
+
+    return Span(trace, name, args)
+
+
+def function_name(fn):
+    """A readable name for a patch function, so spans can be attributed to the extension that registered it."""
+    module = getattr(fn, "__module__", None) or type(fn).__module__
+    name = getattr(fn, "__qualname__", None) or type(fn).__qualname__
+    return f"{module}.{name}"
+
+
+def should_trace():
+    every = shared.opts.data.get("tracing_sample_every", 0)
+    if not every or every <= 0:
+        return False
+
+    return next(job_counter) % every == 0
+
+
+def trace_filename(trace):
+    directory = shared.opts.data.get("tracing_directory", "") or os.path.join(shared.data_path, "traces")
+    os.makedirs(directory, exist_ok=True)
+    timestamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(trace.started_at))
+    return os.path.join(directory, f"{timestamp}-{trace.pid}-{int(trace.start * 1000) % 100000}.json")
+
+
+@contextlib.contextmanager
+def job(name):
+    """Traces the enclosed sampling job if it is selected by the 1-in-N sampling setting."""
+    global current_trace, last_trace_filename
+
+    if current_trace is not None or not should_trace():
+        yield
+        return
+
+    trace = Trace(name, synchronize=shared.opts.data.get("tracing_synchronize", False))
+    current_trace = trace
+    try:
+        with span(name):
+            yield
+    finally:
+        current_trace = None
+        try:
+            filename = trace_filename(trace)
+            with open(filename, "w", encoding="utf8") as file:
+                json.dump(trace.to_chrome_trace(), file)
+            last_trace_filename = filename
+        except Exception as e:
+            print(f"Error writing trace: {e}")
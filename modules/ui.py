@@ -125,11 +125,15 @@ def process_interrogate(interrogation_function, mode, ii_input_dir, ii_output_di
         else:
             ii_output_dir = ii_input_dir
 
-        for image in images:
-            img = Image.open(image)
+        batch_interrogation_function = {
+            interrogate: shared.interrogator.interrogate_batch,
+            interrogate_deepbooru: deepbooru.model.tag_batch,
+        }[interrogation_function]
+
+        for image, prompt in zip(images, batch_interrogation_function(images)):
             filename = os.path.basename(image)
             left, _ = os.path.splitext(filename)
-            print(interrogation_function(img), file=open(os.path.join(ii_output_dir, f"{left}.txt"), 'a', encoding='utf-8'))
+            print(prompt, file=open(os.path.join(ii_output_dir, f"{left}.txt"), 'a', encoding='utf-8'))
 
         return [gr.update(), None]
 
@@ -0,0 +1,150 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+from modules import metrics
+
+
+def update_hash(h, item):
+    if item is None:
+        h.update(b'None')
+    elif isinstance(item, np.ndarray):
+        item = np.ascontiguousarray(item)
+        h.update(f'ndarray{item.shape}{item.dtype}'.encode())
+        h.update(item.data)
+    elif isinstance(item, torch.Tensor):
+        item = item.detach().cpu().contiguous()
+        h.update(f'tensor{tuple(item.shape)}{item.dtype}'.encode())
+        h.update(item.reshape(-1).view(torch.uint8).numpy().data)
+    elif isinstance(item, (list, tuple)):
+        h.update(f'{type(item).__name__}{len(item)}'.encode())
+        for x in item:
+            update_hash(h, x)
+    elif isinstance(item, dict):
+        h.update(f'dict{len(item)}'.encode())
+        for k in sorted(item.keys(), key=str):
+            update_hash(h, k)
+            update_hash(h, item[k])
+    else:
+        h.update(repr(item).encode())
+        h.update(b'\0')
+
+
+def content_hash(*items):
+    """sha256 over the contents of arrays/tensors and the repr of everything else."""
+    h = hashlib.sha256()
+    for item in items:
+        update_hash(h, item)
+    return h.hexdigest()
+
+
+def size_of(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, torch.Tensor):
+        return value.nelement() * value.element_size()
+    if isinstance(value, (list, tuple)):
+        return sum(size_of(x) for x in value)
+    if isinstance(value, dict):
+        return sum(size_of(x) for x in value.values())
+    return 0
+
+
+def to_cpu(value):
+    if isinstance(value, torch.Tensor):
+        return value.detach().cpu()
+    if isinstance(value, (list, tuple)):
+        return type(value)(to_cpu(x) for x in value)
+    if isinstance(value, dict):
+        return {k: to_cpu(v) for k, v in value.items()}
+    return value
+
+
+class ContentCache:
+    """
+    A thread-safe LRU cache keyed by content hashes, bounded by the byte size of the stored values.
+
+    With disk enabled, every stored value is also written to a diskcache under the webui cache directory,
+    so entries evicted from RAM (or lost on restart) can be read back instead of being recomputed.
+    """
+
+    def __init__(self, name, max_bytes=512 * 1024 * 1024, disk=False):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.disk = disk
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.lock = threading.Lock()
+        self.disk_cache = None
+
+    def configure(self, max_bytes=None, disk=None):
+        with self.lock:
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if disk is not None:
+                self.disk = disk
+            self.evict()
+
+    def get_disk_cache(self):
+        if self.disk_cache is None:
+            from modules.cache import make_cache
+            self.disk_cache = make_cache(f'content-{self.name}')
+        return self.disk_cache
+
+    def evict(self):
+        while self.entries and self.current_bytes > self.max_bytes:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.current_bytes -= size
+
+    def get(self, key):
+        if key is None:
+            return None
+
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                metrics.cache_hit(self.name)
+                return entry[0]
+
+        value = None
+        if self.disk:
+            value = self.get_disk_cache().get(key, None)
+
+        metrics.cache_hit(self.name, value is not None)
+        if value is not None:
+            self.put(key, value, write_disk=False)
+        return value
+
+    def put(self, key, value, write_disk=True):
+        if key is None or value is None:
+            return value
+
+        value = to_cpu(value)
+        size = size_of(value)
+
+        with self.lock:
+            if size <= self.max_bytes:
+                old = self.entries.pop(key, None)
+                if old is not None:
+                    self.current_bytes -= old[1]
+                self.entries[key] = (value, size)
+                self.current_bytes += size
+                self.evict()
+
+        if self.disk and write_disk:
+            self.get_disk_cache().set(key, value)
+
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.current_bytes, 'max_bytes': self.max_bytes, 'disk': self.disk}
@@ -12,7 +12,9 @@ def apply_controlnet_advanced(
         negative_advanced_weighting=None,
         advanced_frame_weighting=None,
         advanced_sigma_weighting=None,
-        advanced_mask_weighting=None
+        advanced_mask_weighting=None,
+        residual_cache_interval=1,
+        residual_cache_sigma_threshold=0.0
 ):
     """
 
@@ -56,6 +58,15 @@ def apply_controlnet_advanced(
     This should be a tensor with shape B 1 H W where the H and W can be arbitrary.
     This mask will be resized automatically to match the shape of all injection layers.
 
+    # residual_cache_interval and residual_cache_sigma_threshold
+
+    Control residuals change slowly between neighbouring steps, so they can be reused instead of
+    running the control model on every step. With residual_cache_interval = 3 the residuals are
+    computed on one step and reused on the next two. A positive residual_cache_sigma_threshold
+    forces a recompute as soon as sigma moved by more than that fraction since the last compute,
+    e.g. 0.2 recomputes whenever sigma changed by more than 20%.
+    The default residual_cache_interval = 1 computes every step.
+
     """
 
     cnet = controlnet.copy().set_cond_hint(image_bchw, strength, (start_percent, end_percent))
@@ -63,6 +74,8 @@ def apply_controlnet_advanced(
     cnet.negative_advanced_weighting = negative_advanced_weighting
     cnet.advanced_frame_weighting = advanced_frame_weighting
     cnet.advanced_sigma_weighting = advanced_sigma_weighting
+    cnet.residual_cache_interval = max(1, int(residual_cache_interval))
+    cnet.residual_cache_sigma_threshold = float(residual_cache_sigma_threshold)
 
     if advanced_mask_weighting is not None:
         assert isinstance(advanced_mask_weighting, torch.Tensor)
@@ -0,0 +1,57 @@
+"""
+Image embedding cache shared by the IP-Adapter, Revision, PhotoMaker and reference preprocessors.
+
+Entries are keyed on (encoder, settings, image content), where the encoder is a stable name such as the
+CLIP-vision checkpoint filename or the InsightFace model pack, and settings describe everything besides the
+image that changes the result (crops, noise, output kind). Encoders without a stable name are not cached.
+"""
+
+from modules_forge.content_cache import ContentCache, content_hash
+
+
+CLIP_VISION_OUTPUTS = ('last_hidden_state', 'penultimate_hidden_states', 'image_embeds')
+
+cache = ContentCache("image_embedding", max_bytes=256 * 1024 * 1024)
+
+
+def configure():
+    from modules import shared
+
+    size = shared.opts.data.get("control_net_embedding_cache_size", 256)
+    cache.configure(max_bytes=size * 1024 * 1024, disk=shared.opts.data.get("control_net_embedding_cache_disk", False))
+    return size > 0
+
+
+def encoder_name(encoder):
+    return getattr(encoder, 'cache_name', None)
+
+
+def cached(encoder, settings, images, compute):
+    """Returns compute(), reusing an earlier result for the same encoder, settings and image content.
+
+    Results are stored on the CPU, so callers must move them to the device they need.
+    """
+    name = encoder_name(encoder) if not isinstance(encoder, str) else encoder
+    if name is None or not configure():
+        return compute()
+
+    key = content_hash(name, settings, images)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.put(key, value)
+    return value
+
+
+def encode_image(clip_vision, image, settings=None, preprocess=None):
+    """Cached clip_vision.encode_image(preprocess(image)); settings must describe what preprocess does."""
+    from ldm_patched.modules.clip_vision import Output
+
+    def compute():
+        outputs = clip_vision.encode_image(image if preprocess is None else preprocess(image))
+        return {k: outputs[k] for k in CLIP_VISION_OUTPUTS}
+
+    result = Output()
+    for k, v in cached(clip_vision, ('encode_image', settings), image, compute).items():
+        result[k] = v
+    return result
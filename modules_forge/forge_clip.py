@@ -13,6 +13,11 @@ def move_clip_to_gpu():
     return
 
 
+def needs_hidden_states(embedder):
+    """Only ask the transformer for the per-layer outputs when one of them is used instead of the last one."""
+    return opts.CLIP_stop_at_last_layers > embedder.minimal_clip_skip or embedder.wrapped.layer == "hidden"
+
+
 class CLIP_SD_15_L(FrozenCLIPEmbedderWithCustomWords):
     def __init__(self, wrapped, hijack):
         super().__init__(wrapped, hijack)
@@ -21,7 +26,7 @@ class CLIP_SD_15_L(FrozenCLIPEmbedderWithCustomWords):
     def encode_with_transformers(self, tokens):
         move_clip_to_gpu()
         self.wrapped.transformer.text_model.embeddings.to(tokens.device)
-        outputs = self.wrapped.transformer(input_ids=tokens, output_hidden_states=-opts.CLIP_stop_at_last_layers)
+        outputs = self.wrapped.transformer(input_ids=tokens, output_hidden_states=opts.CLIP_stop_at_last_layers > self.minimal_clip_skip)
 
         if opts.CLIP_stop_at_last_layers > self.minimal_clip_skip:
             z = outputs.hidden_states[-opts.CLIP_stop_at_last_layers]
@@ -48,7 +53,7 @@ class CLIP_SD_21_H(FrozenCLIPEmbedderWithCustomWords):
     def encode_with_transformers(self, tokens):
         move_clip_to_gpu()
         self.wrapped.transformer.text_model.embeddings.to(tokens.device)
-        outputs = self.wrapped.transformer(tokens, output_hidden_states=self.wrapped.layer == "hidden")
+        outputs = self.wrapped.transformer(tokens, output_hidden_states=needs_hidden_states(self))
 
         if opts.CLIP_stop_at_last_layers > self.minimal_clip_skip:
             z = outputs.hidden_states[-opts.CLIP_stop_at_last_layers]
@@ -69,7 +74,7 @@ class CLIP_SD_XL_L(FrozenCLIPEmbedderWithCustomWords):
 
     def encode_with_transformers(self, tokens):
         self.wrapped.transformer.text_model.embeddings.to(tokens.device)
-        outputs = self.wrapped.transformer(tokens, output_hidden_states=self.wrapped.layer == "hidden")
+        outputs = self.wrapped.transformer(tokens, output_hidden_states=needs_hidden_states(self))
 
         if opts.CLIP_stop_at_last_layers > self.minimal_clip_skip:
             z = outputs.hidden_states[-opts.CLIP_stop_at_last_layers]
@@ -96,7 +101,7 @@ class CLIP_SD_XL_G(FrozenCLIPEmbedderWithCustomWords):
 
     def encode_with_transformers(self, tokens):
         self.wrapped.transformer.text_model.embeddings.to(tokens.device)
-        outputs = self.wrapped.transformer(tokens, output_hidden_states=self.wrapped.layer == "hidden")
+        outputs = self.wrapped.transformer(tokens, output_hidden_states=needs_hidden_states(self))
 
         if opts.CLIP_stop_at_last_layers > self.minimal_clip_skip:
             z = outputs.hidden_states[-opts.CLIP_stop_at_last_layers]
@@ -23,6 +23,8 @@ class ControlModelPatcher:
         self.advanced_frame_weighting = None
         self.advanced_sigma_weighting = None
         self.advanced_mask_weighting = None
+        self.residual_cache_interval = 1
+        self.residual_cache_sigma_threshold = 0.0
 
     def process_after_running_preprocessors(self, process, params, *args, **kwargs):
         return
@@ -158,7 +160,9 @@ class ControlNetPatcher(ControlModelPatcher):
             negative_advanced_weighting=self.negative_advanced_weighting,
             advanced_frame_weighting=self.advanced_frame_weighting,
             advanced_sigma_weighting=self.advanced_sigma_weighting,
-            advanced_mask_weighting=self.advanced_mask_weighting
+            advanced_mask_weighting=self.advanced_mask_weighting,
+            residual_cache_interval=self.residual_cache_interval,
+            residual_cache_sigma_threshold=self.residual_cache_sigma_threshold
         )
 
         process.sd_model.forge_objects.unet = unet
@@ -8,6 +8,7 @@ from modules_forge.forge_util import resize_image_with_pad
 import ldm_patched.modules.clip_vision
 from modules.modelloader import load_file_from_url
 from modules_forge.forge_util import numpy_to_pytorch
+from modules_forge import embedding_cache
 
 
 class PreprocessorParameter:
@@ -34,6 +35,7 @@ class Preprocessor:
         self.fill_mask_with_one_when_resize_and_fill = False
         self.use_soft_projection_in_hr_fix = False
         self.expand_mask_when_resize_and_fill = False
+        self.cache_outputs = True  # set to False if the output depends on anything besides image, mask, resolution and sliders
 
     def setup_model_patcher(self, model, load_device=None, offload_device=None, dtype=torch.float32, **kwargs):
         if load_device is None:
@@ -77,6 +79,7 @@ class PreprocessorNone(Preprocessor):
         super().__init__()
         self.name = 'None'
         self.sorting_priority = 10
+        self.cache_outputs = False
 
 
 class PreprocessorCanny(Preprocessor):
@@ -128,6 +131,7 @@ class PreprocessorClipVision(Preprocessor):
             self.clipvision = PreprocessorClipVision.global_cache[ckpt_path]
         else:
             self.clipvision = ldm_patched.modules.clip_vision.load(ckpt_path)
+            self.clipvision.cache_name = self.filename
             PreprocessorClipVision.global_cache[ckpt_path] = self.clipvision
 
         return self.clipvision
@@ -135,4 +139,4 @@ class PreprocessorClipVision(Preprocessor):
     @torch.no_grad()
     def __call__(self, input_image, resolution, slider_1=None, slider_2=None, slider_3=None, **kwargs):
         clipvision = self.load_clipvision()
-        return clipvision.encode_image(numpy_to_pytorch(input_image))
+        return embedding_cache.encode_image(clipvision, numpy_to_pytorch(input_image))
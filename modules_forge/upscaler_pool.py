@@ -0,0 +1,89 @@
+"""
+Keeps instantiated upscaler models resident between upscales.
+
+Spandrel model descriptors are kept in an LRU bounded by the upscaler_pool_size option (in MB). Each model is
+wrapped in a ModelPatcher with the CPU as offload device, so it is moved to the GPU through
+model_management.load_models_gpu and gets offloaded like any other model when sampling needs the memory.
+Extras, hires fix and SD upscale all go through the same pool, so a model is read from disk only once.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import torch
+
+from ldm_patched.modules import model_management
+from ldm_patched.modules.model_patcher import ModelPatcher
+
+
+class PooledModel:
+    def __init__(self, model_descriptor, device):
+        self.model_descriptor = model_descriptor
+        self.patcher = ModelPatcher(model=model_descriptor.model, load_device=device, offload_device=torch.device('cpu'))
+        self.size = self.patcher.model_size()
+
+
+pool = OrderedDict()
+pool_lock = threading.Lock()
+
+
+def pool_size_bytes():
+    from modules import shared
+
+    return int(getattr(shared.opts, "upscaler_pool_size", 1024)) * 1024 * 1024
+
+
+def unload(pooled):
+    for i in range(len(model_management.current_loaded_models) - 1, -1, -1):
+        if model_management.current_loaded_models[i].model is pooled.patcher:
+            model_management.current_loaded_models.pop(i).model_unload()
+
+
+def evict(max_bytes):
+    total = sum(x.size for x in pool.values())
+    while pool and total > max_bytes:
+        _, pooled = pool.popitem(last=False)
+        unload(pooled)
+        total -= pooled.size
+
+
+def clear():
+    with pool_lock:
+        evict(0)
+
+
+def load_model(path, *, device, on_load=None, variant=None, **kwargs):
+    """
+    Returns the spandrel model descriptor for the model file at path, moved to device.
+
+    Keyword arguments are passed to modelloader.load_spandrel_model and are part of the pool key, as is the file's
+    modification time. on_load is called with the descriptor once, right after it is read from disk; variant must
+    change whenever on_load would do something different.
+    """
+    from modules import modelloader
+
+    device = torch.device(device)
+    key = (os.path.abspath(path), os.path.getmtime(path), str(device), variant, tuple(sorted((k, str(v)) for k, v in kwargs.items())))
+    max_bytes = pool_size_bytes()
+
+    with pool_lock:
+        pooled = pool.get(key)
+        if pooled is not None:
+            pool.move_to_end(key)
+        else:
+            model_descriptor = modelloader.load_spandrel_model(path, device='cpu', **kwargs)
+            if on_load is not None:
+                on_load(model_descriptor)
+
+            pooled = PooledModel(model_descriptor, device)
+            pool[key] = pooled
+            evict(max_bytes)
+
+        if key not in pool:
+            # larger than the whole pool, or pooling disabled: use it once without registering it
+            pooled.model_descriptor.model.to(device)
+        else:
+            model_management.load_models_gpu([pooled.patcher])
+
+    return pooled.model_descriptor
@@ -1,14 +1,108 @@
 import math
+import time
 
 import modules.scripts as scripts
 import gradio as gr
+import numpy as np
+import torch
 from PIL import Image
 
-from modules import processing, shared, images, devices
+from modules import processing, shared, images, devices, sd_samplers
 from modules.processing import Processed
+from modules.sd_samplers_common import images_tensor_to_samples, approximation_indexes
 from modules.shared import opts, state
 
 
+def pil_to_tensor(tiles):
+    return torch.from_numpy(np.moveaxis(np.stack([np.asarray(tile, dtype=np.float32) / 255.0 for tile in tiles]), 3, 1))
+
+
+class TiledImg2Img(processing.StableDiffusionProcessingImg2Img):
+    """
+    img2img over all tiles of an SD upscale in a single process_images call. Every n_iter iteration is one batch
+    of tiles: init() VAE-encodes all tiles once, in batches, and sample() hands each iteration its slice of the
+    latents, so conditioning, model and script setup happen once per upscale instead of once per batch.
+    """
+
+    tiles = None
+    tile_latents = None
+    tile_color_corrections = None
+
+    @classmethod
+    def from_processing(cls, p, tiles):
+        res = cls.__new__(cls)
+        res.__dict__.update(p.__dict__)
+        res.tiles = tiles
+        res.init_images = tiles
+        return res
+
+    def init(self, all_prompts, all_seeds, all_subseeds):
+        self.extra_generation_params["Denoising strength"] = self.denoising_strength
+        self.image_cfg_scale = self.image_cfg_scale if shared.sd_model.cond_stage_key == "edit" else None
+        self.sampler = sd_samplers.create_sampler(self.sampler_name, self.sd_model)
+
+        if self.scripts is not None:
+            self.scripts.before_process_init_images(self, dict(crop_region=None, image_mask=None))
+            self.tiles = self.init_images
+
+        if opts.img2img_color_correction and self.color_corrections is None:
+            self.tile_color_corrections = [processing.setup_color_correction(tile) for tile in self.tiles]
+
+        if opts.sd_vae_encode_method != 'Full':
+            self.extra_generation_params['VAE Encoder'] = opts.sd_vae_encode_method
+
+        latents = []
+        for start in range(0, len(self.tiles), self.batch_size):
+            image = pil_to_tensor(self.tiles[start:start + self.batch_size]).to(shared.device)
+            latents.append(images_tensor_to_samples(image, approximation_indexes.get(opts.sd_vae_encode_method), self.sd_model).cpu())
+
+        self.tile_latents = torch.cat(latents)
+        devices.torch_gc()
+
+    def sample(self, conditioning, unconditional_conditioning, seeds, subseeds, subseed_strength, prompts):
+        batch = slice(self.iteration * self.batch_size, (self.iteration + 1) * self.batch_size)
+
+        self.init_latent = self.tile_latents[batch].to(shared.device)
+        image = pil_to_tensor(self.tiles[batch]).to(shared.device)
+        self.image_conditioning = self.img2img_image_conditioning(image * 2 - 1, self.init_latent, None, self.mask_round)
+
+        if self.tile_color_corrections is not None:
+            self.color_corrections = self.tile_color_corrections[batch]
+
+        return super().sample(conditioning, unconditional_conditioning, seeds, subseeds, subseed_strength, prompts)
+
+
+def combine_tiles(grid, tiles):
+    """images.combine_grid done on float arrays: same layout and linear overlap masks, one PIL conversion at the end"""
+
+    overlap = grid.overlap
+    mask_w = (np.arange(overlap, dtype=np.float32) / overlap).reshape((1, overlap, 1))
+    mask_h = (np.arange(overlap, dtype=np.float32) / overlap).reshape((overlap, 1, 1))
+
+    combined = np.zeros((grid.image_h, grid.image_w, 3), dtype=np.float32)
+    tiles = iter(tiles)
+
+    for y, h, row in grid.tiles:
+        combined_row = np.zeros((h, grid.image_w, 3), dtype=np.float32)
+        for x, w, _ in row:
+            tile = next(tiles)
+            if x == 0 or overlap == 0:
+                combined_row[:, x:x + w] = tile
+                continue
+
+            combined_row[:, x:x + overlap] = combined_row[:, x:x + overlap] * (1 - mask_w) + tile[:, :overlap] * mask_w
+            combined_row[:, x + overlap:x + w] = tile[:, overlap:]
+
+        if y == 0 or overlap == 0:
+            combined[y:y + h] = combined_row
+            continue
+
+        combined[y:y + overlap] = combined[y:y + overlap] * (1 - mask_h) + combined_row[:overlap] * mask_h
+        combined[y + overlap:y + h] = combined_row[overlap:]
+
+    return Image.fromarray(np.clip(combined + 0.5, 0, 255).astype(np.uint8))
+
+
 class Script(scripts.Script):
     def title(self):
         return "SD upscale"
@@ -33,7 +127,6 @@ class Script(scripts.Script):
         p.extra_generation_params["SD upscale overlap"] = overlap
         p.extra_generation_params["SD upscale upscaler"] = upscaler.name
 
-        initial_info = None
         seed = p.seed
 
         init_img = p.init_images[0]
@@ -65,6 +158,50 @@ class Script(scripts.Script):
 
         print(f"SD upscaling will process a total of {len(work)} images tiled as {len(grid.tiles[0][2])}x{len(grid.tiles)} per upscale in a total of {state.job_count} batches.")
 
+        if not opts.sd_upscale_batched_tiles or p.image_mask is not None or img.width < p.width or img.height < p.height:
+            return self.run_per_batch(p, grid, work, seed, batch_size, batch_count, upscale_count)
+
+        return self.run_tiled(p, grid, work, seed, batch_size, batch_count, upscale_count)
+
+    def run_tiled(self, p, grid, work, seed, batch_size, batch_count, upscale_count):
+        # the last batch is padded with copies of the last tile
+        tiles = work + work[-1:] * (batch_size * batch_count - len(work))
+
+        initial_info = None
+        tiled = None
+        result_images = []
+        for n in range(upscale_count):
+            start_seed = seed + n
+
+            tiled = TiledImg2Img.from_processing(p, tiles)
+            tiled.batch_size = batch_size
+            tiled.n_iter = batch_count
+
+            # the seeds the per-batch loop uses: every batch starts one above the previous one
+            tiled.seed = [start_seed + i + (j if p.subseed_strength == 0 else 0) for i in range(batch_count) for j in range(batch_size)]
+            tiled.subseed = [p.subseed + j for _ in range(batch_count) for j in range(batch_size)]
+
+            start = time.perf_counter()
+            processed = processing.process_images(tiled)
+            elapsed = time.perf_counter() - start
+            print(f"SD upscale: {len(work)} tiles in {elapsed:.1f}s ({len(work) / elapsed:.2f} tiles/s, {batch_count} batches of {batch_size})")
+
+            if initial_info is None:
+                initial_info = processed.info
+
+            tile_images = [np.asarray(x.convert("RGB"), dtype=np.float32) for x in processed.images[:len(work)]]
+            tile_images += [np.zeros((p.height, p.width, 3), dtype=np.float32)] * (len(work) - len(tile_images))
+
+            combined_image = combine_tiles(grid, tile_images)
+            result_images.append(combined_image)
+
+            if opts.samples_save:
+                images.save_image(combined_image, p.outpath_samples, "", start_seed, p.prompt, opts.samples_format, info=initial_info, p=p)
+
+        return Processed(tiled, result_images, seed, initial_info)
+
+    def run_per_batch(self, p, grid, work, seed, batch_size, batch_count, upscale_count):
+        initial_info = None
         result_images = []
         for n in range(upscale_count):
             start_seed = seed + n
@@ -0,0 +1,37 @@
+import torch
+
+from ldm_patched.contrib.external_deepcache import DeepCache
+
+
+def run_step(deep_cache, sigma, x, cond_or_uncond=(0, 1)):
+    options = {"sigmas": torch.tensor([sigma]), "cond_or_uncond": list(cond_or_uncond)}
+    feature = deep_cache.begin(x, options)
+    if feature is None:
+        deep_cache.store(torch.full_like(x, sigma))
+    return feature
+
+
+def test_full_pass_every_interval_steps():
+    deep_cache = DeepCache(interval=3, depth=0, sigma_start=100.0, sigma_end=0.0)
+    x = torch.zeros(2, 4, 8, 8)
+    reused = [run_step(deep_cache, sigma, x) is not None for sigma in [10.0, 9.0, 8.0, 7.0, 6.0, 5.0, 4.0]]
+    assert reused == [False, True, True, False, True, True, False]
+    assert deep_cache.full_calls == 3 and deep_cache.cached_calls == 4
+
+
+def test_no_reuse_outside_sigma_range_or_for_other_batches():
+    deep_cache = DeepCache(interval=4, depth=0, sigma_start=8.0, sigma_end=2.0)
+    x = torch.zeros(2, 4, 8, 8)
+    assert run_step(deep_cache, 10.0, x) is None
+    assert run_step(deep_cache, 9.0, x) is None  # above sigma_start
+    assert run_step(deep_cache, 8.0, x) is not None
+    assert run_step(deep_cache, 8.0, torch.zeros(1, 4, 8, 8), cond_or_uncond=(0,)) is None
+    assert run_step(deep_cache, 1.0, x) is None  # below sigma_end
+
+
+def test_new_pass_resets_cache():
+    deep_cache = DeepCache(interval=10, depth=0, sigma_start=100.0, sigma_end=0.0)
+    x = torch.zeros(2, 4, 8, 8)
+    run_step(deep_cache, 2.0, x)
+    assert run_step(deep_cache, 1.0, x) is not None
+    assert run_step(deep_cache, 14.0, x) is None
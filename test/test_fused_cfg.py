@@ -0,0 +1,162 @@
+import importlib.util
+import os
+import time
+import types
+
+import pytest
+import torch
+
+from ldm_patched.modules import samplers
+from ldm_patched.modules.model_sampling import ModelSamplingDiscrete, EPS
+
+extensions_path = os.path.join(os.path.dirname(__file__), "..", "extensions-builtin")
+
+
+def load_node(*path):
+    spec = importlib.util.spec_from_file_location(os.path.splitext(path[-1])[0], os.path.join(extensions_path, *path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class ModelSampling(ModelSamplingDiscrete, EPS):
+    pass
+
+
+class Patcher:
+    """just enough of ModelPatcher for the nodes' patch()"""
+
+    def __init__(self):
+        self.model_options = {}
+
+    def clone(self):
+        return self
+
+    def set_model_sampler_cfg_function(self, function, disable_cfg1_optimization=False):
+        self.model_options["sampler_cfg_function"] = function
+
+    def set_model_sampler_post_cfg_function(self, function, disable_cfg1_optimization=False):
+        self.model_options["sampler_post_cfg_function"] = self.model_options.get("sampler_post_cfg_function", []) + [function]
+
+
+def make_args(seed=0, shape=(2, 4, 32, 24), sigma=3.0, cond_scale=7.0):
+    generator = torch.Generator().manual_seed(seed)
+    x = torch.randn(shape, generator=generator) * sigma
+    cond_denoised = torch.randn(shape, generator=generator)
+    uncond_denoised = torch.randn(shape, generator=generator) * 0.8 + cond_denoised * 0.2
+    return {
+        "cond_scale": cond_scale,
+        "sigma": torch.full((shape[0],), sigma),
+        "timestep": torch.full((shape[0],), sigma),
+        "input": x,
+        "cond_denoised": cond_denoised,
+        "uncond_denoised": uncond_denoised,
+        "model": types.SimpleNamespace(model_sampling=ModelSampling()),
+        "model_options": {},
+    }
+
+
+def unfused_cfg(function, args):
+    x = args["input"]
+    return x - function(dict(args, cond=x - args["cond_denoised"], uncond=x - args["uncond_denoised"]))
+
+
+def rescale_cfg_patch(node_file, node_class, multiplier=0.7):
+    return getattr(load_node("reForge-RescaleCFG", "RescaleCFG", node_file), node_class)().patch(Patcher(), multiplier)[0]
+
+
+@pytest.mark.parametrize("node_file,node_class", [("nodes_RescaleCFG.py", "RescaleCFG"), ("nodes_AltRescaleCFG.py", "AltRescaleCFG")])
+def test_rescale_cfg(node_file, node_class):
+    function = rescale_cfg_patch(node_file, node_class).model_options["sampler_cfg_function"]
+    args = make_args()
+    inputs = {k: v.clone() for k, v in args.items() if torch.is_tensor(v)}
+
+    expected = unfused_cfg(function, args)
+    actual = samplers.fused_variant(function)(args)
+
+    torch.testing.assert_close(actual, expected, rtol=1e-4, atol=1e-4)
+    for k, v in inputs.items():
+        assert torch.equal(args[k], v)
+
+
+@pytest.mark.parametrize("norm_threshold", [0.0, 15.0])
+def test_apg_over_several_steps(norm_threshold):
+    node = load_node("reForge-APGIsYourCFG", "APGIsYourCFG", "nodes_APGImYourCFGNow.py").APG_ImYourCFGNow()
+    function = node.patch(Patcher(), momentum=0.5, norm_threshold=norm_threshold).model_options["sampler_cfg_function"]
+    fused = samplers.fused_variant(node.patch(Patcher(), momentum=0.5, norm_threshold=norm_threshold).model_options["sampler_cfg_function"])
+
+    for step, sigma in enumerate([14.6, 8.0, 3.0, 1.0]):
+        args = make_args(seed=step, sigma=sigma)
+        torch.testing.assert_close(fused(args), unfused_cfg(function, args), rtol=1e-4, atol=1e-4)
+
+
+def test_mahiro():
+    function = load_node("mahiro_reforge", "mahiro", "nodes_mahiro.py").Mahiro().patch(Patcher())[0].model_options["sampler_post_cfg_function"][0]
+    args = make_args()
+    args["denoised"] = torch.lerp(args["uncond_denoised"], args["cond_denoised"], args["cond_scale"])
+
+    expected = function(args)
+    actual = samplers.fused_variant(function)(dict(args, denoised=args["denoised"].clone()))
+
+    torch.testing.assert_close(actual, expected, rtol=1e-4, atol=1e-4)
+
+
+@pytest.mark.parametrize("post_cfg", [False, True])
+def test_sampling_function(monkeypatch, post_cfg):
+    args = make_args()
+    model_options = {}
+    if post_cfg:
+        model_options["sampler_post_cfg_function"] = [lambda a: a["denoised"] * 0.5 + a["cond_denoised"] * 0.5]
+
+    monkeypatch.setattr(samplers, "calc_cond_uncond_batch", lambda *_: (args["cond_denoised"].clone(), args["uncond_denoised"].clone()))
+
+    def run(fused_cfg):
+        monkeypatch.setattr(samplers.shared, "opts", types.SimpleNamespace(fused_cfg=fused_cfg))
+        return samplers.sampling_function(None, args["input"], args["sigma"], [{}], [{}], args["cond_scale"], model_options=model_options)
+
+    torch.testing.assert_close(run(True), run(False), rtol=1e-5, atol=1e-5)
+
+
+def allocated_bytes(function, *args):
+    with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], profile_memory=True) as prof:
+        function(*args)
+    return sum(max(event.self_cpu_memory_usage, 0) for event in prof.events())
+
+
+def benchmark(size=2048, repeats=5):
+    """python -m test.test_fused_cfg: bytes allocated and time per CFG step for a size x size image (latent size / 8) on the CPU."""
+    args = make_args(shape=(1, 4, size // 8, size // 8))
+    rescale = rescale_cfg_patch("nodes_RescaleCFG.py", "RescaleCFG").model_options["sampler_cfg_function"]
+    mahiro = load_node("mahiro_reforge", "mahiro", "nodes_mahiro.py").Mahiro().patch(Patcher())[0].model_options["sampler_post_cfg_function"][0]
+
+    def cfg(fused):
+        cond, uncond, scale = args["cond_denoised"].clone(), args["uncond_denoised"], args["cond_scale"]
+        if fused:
+            return lambda: torch.lerp(uncond, cond, scale, out=cond)
+        return lambda: uncond + (cond - uncond) * scale
+
+    def post(function):
+        denoised = torch.lerp(args["uncond_denoised"], args["cond_denoised"], args["cond_scale"])
+        return lambda: function(dict(args, denoised=denoised.clone()))
+
+    cases = {
+        "CFG": (cfg(False), cfg(True)),
+        "RescaleCFG": (lambda: unfused_cfg(rescale, args), lambda: samplers.fused_variant(rescale)(args)),
+        "Mahiro": (post(mahiro), post(samplers.fused_variant(mahiro))),
+    }
+
+    for name, functions in cases.items():
+        results = []
+        for function in functions:
+            function()
+            start = time.perf_counter()
+            for _ in range(repeats):
+                function()
+            elapsed = (time.perf_counter() - start) / repeats
+            results.append(f"{allocated_bytes(function) / 2 ** 20:.1f} MB, {elapsed * 1000:.1f} ms")
+
+        print(f"{name} at {size}x{size}: unfused {results[0]}; fused {results[1]}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,62 @@
+import gc
+
+import pytest
+import torch
+
+from ldm_patched.modules import offload_planner
+
+
+def entry(name, size_mb, executions=1.0):
+    return offload_planner.OffloadEntry(name, size_mb * 1024 * 1024, executions)
+
+
+def test_plan_fits_everything_under_large_budget():
+    entries = [entry("input_blocks.1.0.in_layers.2", 10), entry("middle_block.1.transformer_blocks.0.attn1.to_q", 5)]
+    plan = offload_planner.make_plan(entries, 100 * 1024 * 1024)
+    assert plan.keep == {e.name for e in entries}
+    assert plan.transfer_per_step == 0
+
+
+@pytest.mark.parametrize("budget_mb", [0, 7, 15, 31, 64])
+def test_plan_respects_budget(budget_mb):
+    entries = [entry(f"output_blocks.{i}.0.out_layers.3", 1 + (i * 7) % 13, executions=1 + i % 3) for i in range(32)]
+    plan = offload_planner.make_plan(entries, budget_mb * 1024 * 1024)
+    assert plan.kept_memory <= budget_mb * 1024 * 1024
+    assert plan.kept_memory + plan.offloaded_memory == sum(e.size for e in entries)
+
+
+def test_plan_prefers_frequently_executed_modules():
+    # first-fit in module order would keep "a" and offload the module that runs 4 times per step
+    entries = [entry("a", 6), entry("b", 6, executions=4.0), entry("c", 4)]
+    plan = offload_planner.make_plan(entries, 10 * 1024 * 1024)
+    assert plan.keep == {"b", "c"}
+    assert plan.transfer_per_step == 6 * 1024 * 1024
+
+
+def test_execution_profiler_counts_per_step():
+    model = torch.nn.Sequential(torch.nn.Linear(4, 4), torch.nn.Linear(4, 4))
+    is_castable = lambda m: isinstance(m, torch.nn.Linear)
+    profiler = offload_planner.ExecutionProfiler(model, is_castable, steps=2)
+    for _ in range(3):
+        model(torch.zeros(1, 4))
+
+    key = offload_planner.profile_key(model)
+    assert offload_planner.execution_profiles[key] == {"0": 1.0, "1": 1.0}
+    assert profiler.handles == []
+
+
+def test_plan_cache_is_bounded_and_dropped_with_model(monkeypatch):
+    monkeypatch.setattr(offload_planner, "PLANS_PER_MODEL", 2)
+    model = torch.nn.Sequential(torch.nn.Linear(4, 4))
+    entries = [entry("0", 1)]
+
+    plan = offload_planner.get_plan(model, entries, 1024)
+    assert offload_planner.get_plan(model, entries, 1024) is plan
+
+    for budget in [2048, 4096]:
+        offload_planner.get_plan(model, entries, budget)
+    assert len(offload_planner.plan_cache[model]) == 2
+
+    del model
+    gc.collect()
+    assert len(offload_planner.plan_cache) == 0
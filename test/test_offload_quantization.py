@@ -0,0 +1,40 @@
+import pytest
+import torch
+
+from ldm_patched.modules import ops
+
+
+@pytest.mark.parametrize("storage", sorted(ops.QUANTIZED_STORAGE_DTYPES.keys()))
+def test_quantized_linear_matches_reference(storage):
+    torch.manual_seed(0)
+    layer = ops.manual_cast.Linear(64, 32)
+    torch.nn.init.normal_(layer.weight)
+    torch.nn.init.normal_(layer.bias)
+    x = torch.randn(4, 64)
+    reference = layer(x)
+    original = layer.weight.detach().clone()
+
+    before, after = ops.quantize_module(layer, storage)
+    assert after < before / 2
+
+    out = layer(x)
+    assert torch.allclose(out, reference, rtol=0.1, atol=0.1 * reference.abs().max().item())
+
+    ops.dequantize_module(layer)
+    assert layer.weight.dtype == torch.float32
+    assert torch.equal(layer.weight, original)
+    assert getattr(layer, "weight_scale", None) is None
+    assert "weight_quantized" not in layer.state_dict()
+    assert torch.equal(layer(x), reference)
+
+
+def test_quantized_conv_matches_reference():
+    torch.manual_seed(0)
+    layer = ops.manual_cast.Conv2d(8, 16, 3, padding=1)
+    torch.nn.init.normal_(layer.weight)
+    x = torch.randn(1, 8, 16, 16)
+    reference = layer(x)
+
+    ops.quantize_module(layer, "int8")
+    assert layer.weight_quantized.dtype == torch.int8
+    assert torch.allclose(layer(x), reference, atol=0.02 * reference.abs().max().item())
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from modules import output_catalog
+
+
+def make_record(path, prompt, seed, model="sd_xl_base", loras=""):
+    return {"path": str(path), "mtime": 1.0, "size": 10, "sha256": f"hash-{seed}", "width": 64, "height": 64, "prompt": prompt, "negative_prompt": "blurry", "seed": seed, "model": model, "model_hash": "31e35c80fc", "loras": loras, "infotext": f"{prompt}\nSeed: {seed}"}
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return output_catalog.OutputCatalog(str(tmp_path / "catalog.db"))
+
+
+def test_search(catalog, tmp_path):
+    catalog.insert([
+        make_record(tmp_path / "1.png", "a red fox in the snow", 1),
+        make_record(tmp_path / "2.png", "a blue bird <lora:feathers:0.8>", 2, loras="feathers"),
+        make_record(tmp_path / "3.png", "a red car", 3, model="anime"),
+    ])
+
+    assert [item["seed"] for item in catalog.search(query="red")[1]] == [3, 1]
+    assert [item["seed"] for item in catalog.search(query="red", model="sd_xl_base")[1]] == [1]
+    assert [item["seed"] for item in catalog.search(lora="feathers")[1]] == [2]
+    assert [item["seed"] for item in catalog.search(seed=2)[1]] == [2]
+    assert [item["seed"] for item in catalog.search(sha256="hash-3")[1]] == [3]
+    assert catalog.search(model="31e35c80fc")[0] == 3
+
+
+def test_paging(catalog, tmp_path):
+    catalog.insert([make_record(tmp_path / f"{i}.png", f"image number {i}", i) for i in range(25)])
+
+    total, items = catalog.search(query="image", offset=20, limit=10)
+    assert total == 25
+    assert [item["seed"] for item in items] == [4, 3, 2, 1, 0]
+
+
+def test_insert_replaces_same_path(catalog, tmp_path):
+    catalog.insert([make_record(tmp_path / "1.png", "old prompt", 1)])
+    catalog.insert([make_record(tmp_path / "1.png", "new prompt", 1)])
+
+    assert catalog.search()[0] == 1
+    assert catalog.search(query="old")[0] == 0
+    assert catalog.search(query="new")[0] == 1
+
+
+def test_import_directory_skips_unchanged(catalog, tmp_path, monkeypatch):
+    images = tmp_path / "outputs"
+    (images / "sub").mkdir(parents=True)
+    for name in ["a.png", "b.jpg", "sub/c.webp", "notes.txt"]:
+        (images / name).write_bytes(b"x")
+
+    read = []
+
+    def record_from_file(path):
+        read.append(path)
+        stat = os.stat(path)
+        return dict(make_record(path, f"prompt of {os.path.basename(path)}", len(read)), mtime=stat.st_mtime, size=stat.st_size)
+
+    monkeypatch.setattr(output_catalog, "record_from_file", record_from_file)
+
+    assert catalog.import_directory(str(images), workers=2, batch_size=2) == {"scanned": 3, "added": 3, "unchanged": 0, "failed": 0}
+    assert catalog.import_directory(str(images), workers=2) == {"scanned": 3, "added": 0, "unchanged": 3, "failed": 0}
+    assert catalog.import_directory(str(images), recursive=False)["scanned"] == 2
+    assert len(read) == 3
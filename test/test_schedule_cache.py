@@ -0,0 +1,69 @@
+import types
+
+import pytest
+import torch
+
+from ldm_patched.modules import samplers
+from ldm_patched.modules.model_sampling import ModelSamplingDiscrete, EPS
+
+
+class ModelSampling(ModelSamplingDiscrete, EPS):
+    pass
+
+
+def make_model():
+    return types.SimpleNamespace(model_sampling=ModelSampling())
+
+
+@pytest.fixture(autouse=True)
+def options(monkeypatch):
+    opts = types.SimpleNamespace(reforge_normal_sgm=False, reforge_karras_rho=7.0, reforge_exponential_shrink_factor=0.0)
+    monkeypatch.setattr(samplers.shared, "opts", opts)
+    return opts
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    samplers.clear_schedules()
+    yield
+    samplers.clear_schedules()
+
+
+def test_cached_schedule_matches_computed():
+    model = make_model()
+    for scheduler_name in ["normal", "karras", "exponential", "simple"]:
+        expected = samplers.compute_sigmas_scheduler(model, scheduler_name, 20)
+        torch.testing.assert_close(samplers.calculate_sigmas_scheduler(model, scheduler_name, 20), expected)
+        torch.testing.assert_close(samplers.calculate_sigmas_scheduler(model, scheduler_name, 20), expected)
+    assert len(samplers.list_schedules()) == 4
+
+
+def test_returned_sigmas_are_copies():
+    model = make_model()
+    sigmas = samplers.calculate_sigmas_scheduler(model, "karras", 10)
+    first = sigmas[0].item()
+    sigmas[0] = 0
+    assert samplers.calculate_sigmas_scheduler(model, "karras", 10)[0].item() == first
+
+
+def test_shared_between_models_and_invalidated_by_sigmas():
+    a, b = make_model(), make_model()
+    samplers.calculate_sigmas_scheduler(a, "normal", 10)
+    samplers.calculate_sigmas_scheduler(b, "normal", 10)
+    assert len(samplers.list_schedules()) == 1
+
+    b.model_sampling.set_sigmas(b.model_sampling.sigmas * 0.5)
+    assert samplers.calculate_sigmas_scheduler(b, "normal", 10)[0] < samplers.calculate_sigmas_scheduler(a, "normal", 10)[0]
+    assert len(samplers.list_schedules()) == 2
+
+
+def test_invalidated_by_scheduler_options(options):
+    model = make_model()
+    default = samplers.calculate_sigmas_scheduler(model, "karras", 10)
+    options.reforge_karras_rho = 3.0
+    assert not torch.equal(samplers.calculate_sigmas_scheduler(model, "karras", 10), default)
+
+
+def test_precompute():
+    samplers.precompute_schedules(make_model(), ["normal", "karras"], steps=(10, 20))
+    assert sorted(samplers.list_schedules()) == [("karras", 10, False), ("karras", 20, False), ("normal", 10, False), ("normal", 20, False)]
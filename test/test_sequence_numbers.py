@@ -0,0 +1,77 @@
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from modules import sequence_numbers
+
+
+@pytest.fixture(autouse=True)
+def fresh_indexes():
+    sequence_numbers.clear()
+    yield
+    sequence_numbers.clear()
+
+
+def touch(path, name):
+    open(os.path.join(path, name), "w").close()
+
+
+def test_matches_scan_and_counts_up(tmp_path):
+    for name in ["00007-123.png", "00003-456.png", "grid-0010.png", "notes.txt"]:
+        touch(tmp_path, name)
+
+    assert sequence_numbers.scan(tmp_path, "") == 8
+    assert [sequence_numbers.allocate(tmp_path, "") for _ in range(3)] == [8, 9, 10]
+    assert sequence_numbers.allocate(tmp_path, "grid") == 11
+
+
+def test_mark_used(tmp_path):
+    assert sequence_numbers.allocate(tmp_path, "") == 0
+    sequence_numbers.mark_used(tmp_path, "", 5)
+    sequence_numbers.mark_used(tmp_path, "", 2)
+    assert sequence_numbers.allocate(tmp_path, "") == 6
+
+
+@pytest.mark.parametrize("persist", [False, True])
+def test_threads_get_distinct_numbers(tmp_path, persist):
+    results = []
+
+    def worker():
+        for _ in range(50):
+            results.append(sequence_numbers.allocate(tmp_path, "", persist=persist))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == list(range(400))
+
+
+def test_persisted_index_survives_restart(tmp_path):
+    touch(tmp_path, "00041-1.png")
+    assert sequence_numbers.allocate(tmp_path, "", persist=True) == 42
+
+    sequence_numbers.clear()
+    os.remove(os.path.join(tmp_path, "00041-1.png"))
+    assert sequence_numbers.allocate(tmp_path, "", persist=True) == 43
+
+
+def allocate_many(path, count, queue):
+    queue.put([sequence_numbers.allocate(path, "", persist=True) for _ in range(count)])
+
+
+def test_processes_get_distinct_numbers(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    processes = [context.Process(target=allocate_many, args=(str(tmp_path), 25, queue)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    results = sum((queue.get(timeout=60) for _ in processes), [])
+    for process in processes:
+        process.join()
+
+    assert sorted(results) == list(range(100))
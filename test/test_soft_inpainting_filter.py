@@ -0,0 +1,125 @@
+import importlib.util
+import os
+import time
+
+import numpy as np
+import pytest
+
+script_path = os.path.join(os.path.dirname(__file__), "..", "extensions-builtin", "soft-inpainting", "scripts", "soft_inpainting.py")
+
+
+def load_soft_inpainting():
+    spec = importlib.util.spec_from_file_location("soft_inpainting", script_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="module")
+def soft_inpainting():
+    return load_soft_inpainting()
+
+
+def reference_filter(img, kernel, kernel_center, percentile_min=0.0, percentile_max=1.0, min_width=1.0):
+    """The original per-pixel implementation of weighted_histogram_filter."""
+    kernel_min = -np.array(kernel_center)
+    kernel_max = np.array(kernel.shape) - kernel_center
+
+    def single(idx):
+        idx = np.array(idx)
+        min_index = np.maximum(0, idx + kernel_min)
+        max_index = np.minimum(np.array(img.shape), idx + kernel_max)
+
+        values = []
+        for window_index in np.ndindex(tuple(max_index - min_index)):
+            image_index = np.array(window_index) + min_index
+            kernel_index = image_index - idx + kernel_center
+            values.append([img[tuple(image_index)], kernel[tuple(kernel_index)], 0.0, 0.0])
+        values.sort(key=lambda x: x[0])
+
+        total = 0
+        for v in values:
+            v[2] = total
+            total += v[1]
+            v[3] = total
+
+        window_min = total * percentile_min
+        window_max = total * percentile_max
+        if window_max - window_min < min_width:
+            window_center = (window_min + window_max) / 2
+            window_min = window_center - min_width / 2
+            window_max = window_center + min_width / 2
+            if window_max > total:
+                window_max = total
+                window_min = total - min_width
+            if window_min < 0:
+                window_min = 0
+                window_max = min_width
+
+        value = 0
+        value_weight = 0
+        for v in values:
+            if window_min >= v[3]:
+                continue
+            if window_max <= v[2]:
+                break
+            w = min(window_max, v[3]) - max(window_min, v[2])
+            value += v[0] * w
+            value_weight += w
+
+        return value / value_weight if value_weight != 0 else 0
+
+    img_out = img.copy()
+    for index in np.ndindex(img.shape):
+        img_out[index] = single(index)
+    return img_out
+
+
+@pytest.mark.parametrize("percentiles", [(0.9, 1.0), (0.25, 0.75), (0.0, 0.0), (0.5, 0.5)])
+def test_matches_reference(soft_inpainting, percentiles):
+    rng = np.random.default_rng(0)
+    img = rng.random((19, 23)).astype(np.float32)
+    img[3:6, 4:9] = 0.5  # ties
+    kernel, kernel_center = soft_inpainting.get_gaussian_kernel(stddev_radius=1.5, max_radius=2)
+
+    expected = reference_filter(img, kernel, kernel_center, *percentiles, min_width=1)
+    actual = soft_inpainting.weighted_histogram_filter(img, kernel, kernel_center, *percentiles, min_width=1)
+
+    assert actual.dtype == img.dtype
+    np.testing.assert_allclose(actual, expected, rtol=1e-6, atol=1e-6)
+
+
+def test_asymmetric_kernel_and_chunking(soft_inpainting, monkeypatch):
+    monkeypatch.setattr(soft_inpainting, "histogram_filter_chunk_elements", 7 * 12 * 16)
+    rng = np.random.default_rng(1)
+    img = rng.random((300, 7))
+    kernel = rng.random((3, 4))
+    kernel_center = np.array([0, 2])
+
+    expected = reference_filter(img, kernel, kernel_center, 0.1, 0.6, min_width=0.5)
+    actual = soft_inpainting.weighted_histogram_filter(img, kernel, kernel_center, 0.1, 0.6, min_width=0.5)
+
+    np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-12)
+
+
+def benchmark(size=1024):
+    """python -m test.test_soft_inpainting_filter: times the filter on a size x size map and the reference on a crop."""
+    module = load_soft_inpainting()
+
+    img = np.random.default_rng(0).random((size, size)).astype(np.float32)
+    kernel, kernel_center = module.get_gaussian_kernel(stddev_radius=1.5, max_radius=2)
+
+    start = time.perf_counter()
+    module.weighted_histogram_filter(img, kernel, kernel_center, percentile_min=0.25, percentile_max=0.75, min_width=1)
+    vectorized = time.perf_counter() - start
+
+    crop = img[:64, :64]
+    start = time.perf_counter()
+    reference_filter(crop, kernel, kernel_center, percentile_min=0.25, percentile_max=0.75, min_width=1)
+    reference = (time.perf_counter() - start) * img.size / crop.size
+
+    print(f"{size}x{size}: vectorized {vectorized:.2f}s, per-pixel loop ~{reference:.1f}s (extrapolated from 64x64)")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,43 @@
+import torch
+
+from ldm_patched.contrib import external_tomesd
+
+
+def test_merge_roundtrip_shapes():
+    torch.manual_seed(0)
+    x = torch.randn(2, 64 * 64, 32)
+    plan = external_tomesd.compute_merge_plan(x, 64, 64, 2, 2, r=1024)
+    merge, unmerge = external_tomesd.plan_functions(plan, x.device)
+    merged = merge(x)
+    assert merged.shape == (2, 64 * 64 - 1024, 32)
+    assert unmerge(merged).shape == x.shape
+
+
+def test_plan_reused_across_blocks_and_refreshed_after_interval():
+    torch.manual_seed(0)
+    plans = external_tomesd.MergePlanCache(refresh_interval=2)
+    original_shape = (2, 4, 32, 32)
+    x = torch.randn(2, 32 * 32, 16)
+
+    plans.update_step(torch.tensor([10.0]))
+    external_tomesd.get_functions(x, 0.5, original_shape, plans)
+    first = plans.plans.copy()
+    assert len(first) == 1
+
+    # another block with different channels at the same resolution reuses the plan
+    external_tomesd.get_functions(torch.randn(2, 32 * 32, 64), 0.5, original_shape, plans)
+    plans.update_step(torch.tensor([9.0]))
+    external_tomesd.get_functions(x, 0.5, original_shape, plans)
+    assert plans.plans == first
+
+    plans.update_step(torch.tensor([8.0]))
+    external_tomesd.get_functions(x, 0.5, original_shape, plans)
+    assert plans.plans != first
+
+
+def test_plan_cache_resets_on_new_pass():
+    plans = external_tomesd.MergePlanCache(refresh_interval=100)
+    plans.update_step(torch.tensor([1.0]))
+    plans.put("key", "plan")
+    plans.update_step(torch.tensor([14.6]))
+    assert plans.get("key") is None
@@ -39,10 +39,15 @@ def api_only_worker():
     initialize_util.setup_middleware(app)
     api = create_api(app)
 
-    from modules import script_callbacks
-    script_callbacks.before_ui_callback()
-    script_callbacks.app_started_callback(None, app)
+    if cmd_opts.api_fast_startup:
+        # scripts, upscalers and face restoration load while the server is already accepting requests
+        Thread(target=api.ensure_initialized, daemon=True).start()
+    else:
+        from modules import script_callbacks
+        script_callbacks.before_ui_callback()
+        script_callbacks.app_started_callback(None, app)
 
+    timer.startup_record = startup_timer.dump()
     print(f"Startup time: {startup_timer.summary()}.")
     api.launch(
         server_name=initialize_util.gradio_server_name(),